@@ -6,14 +6,16 @@ sys.path.append('../../../python_parser')
 
 import copy
 import torch
+from torch.utils.data import TensorDataset
 import random
 from model import Model
 from run import TextDataset, InputFeatures
-from utils import select_parents, crossover, map_chromesome, mutate, is_valid_variable_name, _tokenize, get_identifier_posistions_from_code, get_masked_code_by_position, get_substitues, is_valid_substitue, set_seed
+from utils import select_parents, crossover, map_chromesome, mutate, is_valid_variable_name, _tokenize, get_identifier_posistions_from_code, TokenPositions, get_substitues, is_valid_substitue, set_seed, cached_tokenize, RenameTokens, MaskedTokens, get_masked_inputs, importance_chunk_size
+from utils import run_attack_steps, count_queries
 
 from utils import CodeDataset
-from utils import getUID, isUID, getTensor, build_vocab
-from run_parser import get_identifiers, get_example
+from utils import getUID, mhm_uid_policy, getTensor, build_vocab
+from run_parser import get_identifiers, get_example, get_rename_segments, apply_rename
 from transformers import (RobertaForMaskedLM, RobertaConfig, RobertaForSequenceClassification, RobertaTokenizer)
 
 def compute_fitness(chromesome, codebert_tgt, tokenizer_tgt, orig_prob, orig_label, true_label ,code, names_positions_dict, args):
@@ -22,14 +24,14 @@ def compute_fitness(chromesome, codebert_tgt, tokenizer_tgt, orig_prob, orig_lab
     temp_code = map_chromesome(chromesome, code, "python")
     new_feature = convert_code_to_features(temp_code, tokenizer_tgt, true_label, args)
     new_dataset = CodeDataset([new_feature])
-    new_logits, preds = codebert_tgt.get_results(new_dataset, args.eval_batch_size)
+    new_logits, preds = yield new_dataset
     # 计算fitness function
     fitness_value = orig_prob - new_logits[0][orig_label]
     return fitness_value, preds[0]
 
 
 def convert_code_to_features(code, tokenizer, label, args):
-    code_tokens=tokenizer.tokenize(code)[:args.block_size-2]
+    code_tokens=cached_tokenize(code, tokenizer)[:args.block_size-2]
     source_tokens =[tokenizer.cls_token]+code_tokens+[tokenizer.sep_token]
     source_ids =  tokenizer.convert_tokens_to_ids(source_tokens)
     padding_length = args.block_size - len(source_ids)
@@ -37,6 +39,23 @@ def convert_code_to_features(code, tokenizer, label, args):
     return InputFeatures(source_tokens,source_ids, 0, label)
 
 
+def convert_renames_to_features(code, tgt_word, substitutes, tokenizer, label, args):
+    '''
+    Same as convert_code_to_features(get_example(code, tgt_word, substitute, "python"), ...)
+    for every substitute, but only the words around tgt_word are tokenized again.
+    '''
+    renames = RenameTokens(get_rename_segments(code, tgt_word, "python"), tokenizer, args.block_size-2, normalize=False)
+    features = []
+    for substitute in substitutes:
+        code_tokens, code_ids = renames.get(substitute)
+        source_tokens =[tokenizer.cls_token]+code_tokens+[tokenizer.sep_token]
+        source_ids = [tokenizer.cls_token_id]+code_ids+[tokenizer.sep_token_id]
+        padding_length = args.block_size - len(source_ids)
+        source_ids+=[tokenizer.pad_token_id]*padding_length
+        features.append(InputFeatures(source_tokens,source_ids, 0, label))
+    return features
+
+
 def get_importance_score(args, example, code, words_list: list, sub_words: list, variable_names: list, tgt_model, tokenizer, label_list, batch_size=16, max_length=512, model_type='classification'):
     '''Compute the importance score of each variable'''
     # label: example[1] tensor(1)
@@ -47,20 +66,26 @@ def get_importance_score(args, example, code, words_list: list, sub_words: list,
         ## 没有提取出可以mutate的position
         return None, None, None
 
-    new_example = []
-
-    # 2. 得到Masked_tokens
-    masked_token_list, replace_token_positions = get_masked_code_by_position(words_list, positions)
-    # replace_token_positions 表示着，哪一个位置的token被替换了.
-
-
-    for index, tokens in enumerate([words_list] + masked_token_list):
-        new_code = ' '.join(tokens)
-        new_feature = convert_code_to_features(new_code, tokenizer, example[1].item(), args)
-        new_example.append(new_feature)
-    new_dataset = CodeDataset(new_example)
-    # 3. 将他们转化成features
-    logits, preds = tgt_model.get_results(new_dataset, args.eval_batch_size)
+    # 2. 每个位置mask一次; variable模式下每个变量的所有位置一起mask一次, 只需要V+1次query
+    if args.importance_mode == 'variable':
+        replace_token_positions = None
+        masked_positions = [positions[name] for name in positions.keys()]
+    else:
+        replace_token_positions = [pos for name in positions.keys() for pos in positions[name]]
+        # replace_token_positions 表示着，哪一个位置的token被替换了.
+        masked_positions = replace_token_positions
+
+    # 3. masked code直接构造成ids, 按chunk送进模型. 第一个是original code.
+    masked = MaskedTokens(words_list, tokenizer, args.block_size-2, normalize=False)
+    rows = [None] + masked_positions
+    logits = []
+    preds = []
+    for start in range(0, len(rows), importance_chunk_size):
+        inputs = get_masked_inputs(masked, rows[start:start+importance_chunk_size], tokenizer, args.block_size)
+        labels = torch.full((inputs.size(0),), example[1].item(), dtype=torch.long)
+        chunk_logits, chunk_preds = yield TensorDataset(inputs, labels)
+        logits += list(chunk_logits)
+        preds += list(chunk_preds)
     orig_probs = logits[0]
     orig_label = preds[0]
     # 第一个是original code的数据.
@@ -83,9 +108,15 @@ class Attacker():
         self.tokenizer_mlm = tokenizer_mlm
         self.use_bpe = use_bpe
         self.threshold_pred_score = threshold_pred_score
+        self.importance_queries = 0 # get_importance_score里query的次数
 
 
     def ga_attack(self, example, code, subs, initial_replace=None):
+        '''ga_attack_steps按顺序跑完, 预测直接交给model_tgt.get_results'''
+        return run_attack_steps(self.ga_attack_steps(example, code, subs, initial_replace),
+                                self.model_tgt, self.args.eval_batch_size)
+
+    def ga_attack_steps(self, example, code, subs, initial_replace=None, rng=random):
         '''
         return
             original program: code
@@ -103,7 +134,7 @@ class Attacker():
         '''
             # 先得到tgt_model针对原始Example的预测信息.
 
-        logits, preds = self.model_tgt.get_results([example], self.args.eval_batch_size)
+        logits, preds = yield [example]
         orig_prob = logits[0]
         orig_label = preds[0]
         current_prob = max(orig_prob)
@@ -165,13 +196,12 @@ class Attacker():
                 tgt_positions = names_positions_dict[tgt_word]
                 
                 # 原来是随机选择的，现在要找到改变最大的.
-                for a_substitue in variable_substitue_dict[tgt_word]:
+                temp_features = convert_renames_to_features(code, tgt_word, variable_substitue_dict[tgt_word], self.tokenizer_tgt, example[1].item(), self.args)
+                for a_substitue, new_feature in zip(variable_substitue_dict[tgt_word], temp_features):
                     # a_substitue = a_substitue.strip()
                     
                     substitute_list.append(a_substitue)
                     # 记录下这次换的是哪个substitue
-                    temp_code = get_example(code, tgt_word, a_substitue, "python") 
-                    new_feature = convert_code_to_features(temp_code, self.tokenizer_tgt, example[1].item(), self.args)
                     replace_examples.append(new_feature)
 
                 if len(replace_examples) == 0:
@@ -179,7 +209,7 @@ class Attacker():
                     continue
                 new_dataset = CodeDataset(replace_examples)
                     # 3. 将他们转化成features
-                logits, preds = self.model_tgt.get_results(new_dataset, self.args.eval_batch_size)
+                logits, preds = yield new_dataset
 
                 _the_best_candidate = -1
                 for index, temp_prob in enumerate(logits):
@@ -199,7 +229,7 @@ class Attacker():
             temp_chromesome = copy.deepcopy(base_chromesome)
             temp_chromesome[tgt_word] = initial_candidate
             population.append(temp_chromesome)
-            temp_fitness, temp_label = compute_fitness(temp_chromesome, self.model_tgt, self.tokenizer_tgt, max(orig_prob), orig_label, true_label ,code, names_positions_dict, self.args)
+            temp_fitness, temp_label = yield from compute_fitness(temp_chromesome, self.model_tgt, self.tokenizer_tgt, max(orig_prob), orig_label, true_label ,code, names_positions_dict, self.args)
             fitness_values.append(temp_fitness)
 
         cross_probability = 0.7
@@ -210,17 +240,17 @@ class Attacker():
         for i in range(max_iter):
             _temp_mutants = []
             for j in range(self.args.eval_batch_size):
-                p = random.random()
-                chromesome_1, index_1, chromesome_2, index_2 = select_parents(population)
+                p = rng.random()
+                chromesome_1, index_1, chromesome_2, index_2 = select_parents(population, rng)
                 if p < cross_probability: # 进行crossover
                     if chromesome_1 == chromesome_2:
-                        child_1 = mutate(chromesome_1, variable_substitue_dict)
+                        child_1 = mutate(chromesome_1, variable_substitue_dict, rng)
                         continue
-                    child_1, child_2 = crossover(chromesome_1, chromesome_2)
+                    child_1, child_2 = crossover(chromesome_1, chromesome_2, rng=rng)
                     if child_1 == chromesome_1 or child_1 == chromesome_2:
-                        child_1 = mutate(chromesome_1, variable_substitue_dict)
+                        child_1 = mutate(chromesome_1, variable_substitue_dict, rng)
                 else: # 进行mutates
-                    child_1 = mutate(chromesome_1, variable_substitue_dict)
+                    child_1 = mutate(chromesome_1, variable_substitue_dict, rng)
                 _temp_mutants.append(child_1)
             
             # compute fitness in batch
@@ -232,7 +262,7 @@ class Attacker():
             if len(feature_list) == 0:
                 continue
             new_dataset = CodeDataset(feature_list)
-            mutate_logits, mutate_preds = self.model_tgt.get_results(new_dataset, self.args.eval_batch_size)
+            mutate_logits, mutate_preds = yield new_dataset
             mutate_fitness_values = []
             for index, logits in enumerate(mutate_logits):
                 if mutate_preds[index] != orig_label:
@@ -259,6 +289,12 @@ class Attacker():
         
 
     def greedy_attack(self, example, code, subs):
+        '''greedy_attack_steps按顺序跑完, 预测直接交给model_tgt.get_results'''
+        result, self.importance_queries = run_attack_steps(self.greedy_attack_steps(example, code, subs),
+                                                           self.model_tgt, self.args.eval_batch_size)
+        return result
+
+    def greedy_attack_steps(self, example, code, subs):
         '''
         return
             original program: code
@@ -274,9 +310,10 @@ class Attacker():
             number of changed positions: nb_changed_pos
             substitues for variables: replaced_words
         '''
+        importance_queries = 0
             # 先得到tgt_model针对原始Example的预测信息.
 
-        logits, preds = self.model_tgt.get_results([example], self.args.eval_batch_size)
+        logits, preds = yield [example]
         orig_prob = logits[0]
         orig_label = preds[0]
         current_prob = max(orig_prob)
@@ -300,18 +337,18 @@ class Attacker():
         if not orig_label == true_label:
             # 说明原来就是错的
             is_success = -4
-            return code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, None, None, None, None
+            return (code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, None, None, None, None), importance_queries
             
         if len(variable_names) == 0:
             # 没有提取到identifier，直接退出
             is_success = -3
-            return code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, None, None, None, None
+            return (code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, None, None, None, None), importance_queries
 
         sub_words = [self.tokenizer_tgt.cls_token] + sub_words[:self.args.block_size - 2] + [self.tokenizer_tgt.sep_token]
 
         # 计算importance_score.
 
-        importance_score, replace_token_positions, names_positions_dict = get_importance_score(self.args, example, 
+        (importance_score, replace_token_positions, names_positions_dict), importance_queries = yield from count_queries(get_importance_score(self.args, example, 
                                                 processed_code,
                                                 words,
                                                 sub_words,
@@ -321,28 +358,32 @@ class Attacker():
                                                 [0,1], 
                                                 batch_size=self.args.eval_batch_size, 
                                                 max_length=self.args.block_size, 
-                                                model_type='classification')
+                                                model_type='classification'))
 
         if importance_score is None:
-            return code, prog_length, adv_code, true_label, orig_label, temp_label, -3, variable_names, None, None, None, None
+            return (code, prog_length, adv_code, true_label, orig_label, temp_label, -3, variable_names, None, None, None, None), importance_queries
 
 
-        token_pos_to_score_pos = {}
-
-        for i, token_pos in enumerate(replace_token_positions):
-            token_pos_to_score_pos[token_pos] = i
-        # 重新计算Importance score，将所有出现的位置加起来（而不是取平均）.
-        names_to_importance_score = {}
-
-        for name in names_positions_dict.keys():
-            total_score = 0.0
-            positions = names_positions_dict[name]
-            for token_pos in positions:
-                # 这个token在code中对应的位置
-                # importance_score中的位置：token_pos_to_score_pos[token_pos]
-                total_score += importance_score[token_pos_to_score_pos[token_pos]]
-            
-            names_to_importance_score[name] = total_score
+        if self.args.importance_mode == 'variable':
+            # 每个变量只mask了一次(所有出现的位置一起), importance_score就是变量的score.
+            names_to_importance_score = dict(zip(names_positions_dict.keys(), importance_score))
+        else:
+            token_pos_to_score_pos = {}
+
+            for i, token_pos in enumerate(replace_token_positions):
+                token_pos_to_score_pos[token_pos] = i
+            # 重新计算Importance score，将所有出现的位置加起来（而不是取平均）.
+            names_to_importance_score = {}
+
+            for name in names_positions_dict.keys():
+                total_score = 0.0
+                positions = names_positions_dict[name]
+                for token_pos in positions:
+                    # 这个token在code中对应的位置
+                    # importance_score中的位置：token_pos_to_score_pos[token_pos]
+                    total_score += importance_score[token_pos_to_score_pos[token_pos]]
+                
+                names_to_importance_score[name] = total_score
 
         sorted_list_of_names = sorted(names_to_importance_score.items(), key=lambda x: x[1], reverse=True)
         # 根据importance_score进行排序
@@ -365,22 +406,21 @@ class Attacker():
             substitute_list = []
             # 依次记录了被加进来的substitue
             # 即，每个temp_replace对应的substitue.
-            for substitute in all_substitues:
+            temp_features = convert_renames_to_features(final_code, tgt_word, all_substitues, self.tokenizer_tgt, example[1].item(), self.args)
+            for substitute, new_feature in zip(all_substitues, temp_features):
                 
                 substitute_list.append(substitute)
                 # 记录了替换的顺序
 
                 # 需要将几个位置都替换成sustitue_
-                temp_code = get_example(final_code, tgt_word, substitute, "python")
                                                 
-                new_feature = convert_code_to_features(temp_code, self.tokenizer_tgt, example[1].item(), self.args)
                 replace_examples.append(new_feature)
             if len(replace_examples) == 0:
                 # 并没有生成新的mutants，直接跳去下一个token
                 continue
             new_dataset = CodeDataset(replace_examples)
                 # 3. 将他们转化成features
-            logits, preds = self.model_tgt.get_results(new_dataset, self.args.eval_batch_size)
+            logits, preds = yield new_dataset
             assert(len(logits) == len(substitute_list))
 
 
@@ -398,7 +438,7 @@ class Attacker():
                         ('>>', tgt_word, candidate,
                         current_prob,
                         temp_prob[orig_label]), flush=True)
-                    return code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, names_to_importance_score, nb_changed_var, nb_changed_pos, replaced_words
+                    return (code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, names_to_importance_score, nb_changed_var, nb_changed_pos, replaced_words), importance_queries
                 else:
                     # 如果没有攻击成功，我们看probability的修改
                     gap = current_prob - temp_prob[temp_label]
@@ -412,7 +452,7 @@ class Attacker():
                 nb_changed_var += 1
                 nb_changed_pos += len(names_positions_dict[tgt_word])
                 current_prob = current_prob - most_gap
-                final_code = get_example(final_code, tgt_word, candidate, "python")
+                final_code = apply_rename(final_code, tgt_word, candidate, "python")
                 replaced_words[tgt_word] = candidate
                 print("%s ACC! %s => %s (%.5f => %.5f)" % \
                     ('>>', tgt_word, candidate,
@@ -423,7 +463,7 @@ class Attacker():
             
             adv_code = final_code
 
-        return code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, names_to_importance_score, nb_changed_var, nb_changed_pos, replaced_words
+        return (code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, names_to_importance_score, nb_changed_var, nb_changed_pos, replaced_words), importance_queries
 
 
 
@@ -438,15 +478,22 @@ class MHM_Attacker():
     
     def mcmc(self, tokenizer, code=None, _label=None, _n_candi=30,
              _max_iter=100, _prob_threshold=0.95, subs = {}):
+        '''mcmc_steps按顺序跑完, 预测直接交给classifier.get_results'''
+        return run_attack_steps(self.mcmc_steps(tokenizer, code, _label, _n_candi, _max_iter, _prob_threshold, subs),
+                                self.classifier, self.args.eval_batch_size)
+
+    def mcmc_steps(self, tokenizer, code=None, _label=None, _n_candi=30,
+             _max_iter=100, _prob_threshold=0.95, subs = {}, rng=random):
         identifiers, code_tokens = get_identifiers(code, 'python')
         prog_length = len(code_tokens)
         processed_code = " ".join(code_tokens)
 
         words, sub_words, keys = _tokenize(processed_code, tokenizer)
         raw_tokens = copy.deepcopy(words)
+        raw_positions = TokenPositions(raw_tokens)
         variable_names = list(subs.keys())
         
-        uid = get_identifier_posistions_from_code(words, variable_names)
+        uid = raw_positions.get_positions(variable_names)
 
         if len(uid) <= 0: # 是有可能存在找不到变量名的情况的.
             return {'succ': None, 'tokens': None, 'raw_tokens': None}
@@ -462,10 +509,10 @@ class MHM_Attacker():
         old_uid = ""
         for iteration in range(1, 1+_max_iter):
             # 这个函数需要tokens
-            res = self.__replaceUID(_tokens=code, _label=_label, _uid=uid,
+            res = yield from self.__replaceUID(_tokens=code, _label=_label, _uid=uid,
                                     substitute_dict=variable_substitue_dict,
                                     _n_candi=_n_candi,
-                                    _prob_threshold=_prob_threshold)
+                                    _prob_threshold=_prob_threshold, rng=rng)
             self.__printRes(_iter=iteration, _res=res, _prefix="  >> ")
             
             if res['status'].lower() in ['s', 'a']:
@@ -486,12 +533,11 @@ class MHM_Attacker():
                     old_uids[res["old_uid"]].append(res["new_uid"])
                     old_uid = res["old_uid"]
 
-                code = res['tokens']
+                # accepted rename: reparse incrementally from the current tree
+                code = res['tokens'] if res['new_uid'] == res['old_uid'] else apply_rename(code, res['old_uid'], res['new_uid'], "python")
                 uid[res['new_uid']] = uid.pop(res['old_uid']) # 替换key，但保留value.
                 variable_substitue_dict[res['new_uid']] = variable_substitue_dict.pop(res['old_uid'])
-                for i in range(len(raw_tokens)):
-                    if raw_tokens[i] == res['old_uid']:
-                        raw_tokens[i] = res['new_uid']
+                raw_positions.rename(res['old_uid'], res['new_uid'])
                 if res['status'].lower() == 's':
                     replace_info = {}
                     nb_changed_pos = 0
@@ -509,14 +555,21 @@ class MHM_Attacker():
 
     def mcmc_random(self, tokenizer, code=None, _label=None, _n_candi=30,
              _max_iter=100, _prob_threshold=0.95, subs = {}):
+        '''mcmc_random_steps按顺序跑完, 预测直接交给classifier.get_results'''
+        return run_attack_steps(self.mcmc_random_steps(tokenizer, code, _label, _n_candi, _max_iter, _prob_threshold, subs),
+                                self.classifier, self.args.eval_batch_size)
+
+    def mcmc_random_steps(self, tokenizer, code=None, _label=None, _n_candi=30,
+             _max_iter=100, _prob_threshold=0.95, subs = {}, rng=random):
         identifiers, code_tokens = get_identifiers(code, 'python')
         processed_code = " ".join(code_tokens)
         prog_length = len(code_tokens)
         words, sub_words, keys = _tokenize(processed_code, tokenizer)
         raw_tokens = copy.deepcopy(words)
+        raw_positions = TokenPositions(raw_tokens)
         variable_names = list(subs.keys())
         
-        uid = get_identifier_posistions_from_code(words, variable_names)
+        uid = raw_positions.get_positions(variable_names)
 
         if len(uid) <= 0: # 是有可能存在找不到变量名的情况的.
             return {'succ': None, 'tokens': None, 'raw_tokens': None}
@@ -531,10 +584,10 @@ class MHM_Attacker():
         old_uid = ""
         for iteration in range(1, 1+_max_iter):
             # 这个函数需要tokens
-            res = self.__replaceUID_random(_tokens=code, _label=_label, _uid=uid,
+            res = yield from self.__replaceUID_random(_tokens=code, _label=_label, _uid=uid,
                                     substitute_dict=variable_substitue_dict,
                                     _n_candi=_n_candi,
-                                    _prob_threshold=_prob_threshold)
+                                    _prob_threshold=_prob_threshold, rng=rng)
             self.__printRes(_iter=iteration, _res=res, _prefix="  >> ")
             
             if res['status'].lower() in ['s', 'a']:
@@ -554,12 +607,11 @@ class MHM_Attacker():
                     old_uids[res["old_uid"]].append(res["new_uid"])
                     old_uid = res["old_uid"]
                     
-                code = res['tokens']
+                # accepted rename: reparse incrementally from the current tree
+                code = res['tokens'] if res['new_uid'] == res['old_uid'] else apply_rename(code, res['old_uid'], res['new_uid'], "python")
                 uid[res['new_uid']] = uid.pop(res['old_uid']) # 替换key，但保留value.
                 variable_substitue_dict[res['new_uid']] = variable_substitue_dict.pop(res['old_uid'])
-                for i in range(len(raw_tokens)):
-                    if raw_tokens[i] == res['old_uid']:
-                        raw_tokens[i] = res['new_uid']
+                raw_positions.rename(res['old_uid'], res['new_uid'])
                 if res['status'].lower() == 's':
                     replace_info = {}
                     nb_changed_pos = 0
@@ -576,33 +628,28 @@ class MHM_Attacker():
         return {'succ': False, 'tokens': res['tokens'], 'raw_tokens': None, "prog_length": prog_length, "new_pred": res["new_pred"], "is_success": -1, "old_uid": old_uid, "score_info": res["old_prob"][0]-res["new_prob"][0], "nb_changed_var": len(old_uids), "nb_changed_pos": nb_changed_pos, "replace_info": replace_info, "attack_type": "MHM-Origin"}
     
     def __replaceUID(self, _tokens, _label=None, _uid={}, substitute_dict={},
-                     _n_candi=30, _prob_threshold=0.95, _candi_mode="random"):
+                     _n_candi=30, _prob_threshold=0.95, _candi_mode="random", rng=random):
         
         assert _candi_mode.lower() in ["random", "nearby"]
         
-        selected_uid = random.sample(substitute_dict.keys(), 1)[0] # 选择需要被替换的变量名
+        selected_uid = rng.sample(list(substitute_dict.keys()), 1)[0] # 选择需要被替换的变量名
         if _candi_mode == "random":
             # First, generate candidate set.
             # The transition probabilities of all candidate are the same.
             candi_token = [selected_uid]
             candi_tokens = [copy.deepcopy(_tokens)]
             candi_labels = [_label]
-            for c in random.sample(substitute_dict[selected_uid], min(_n_candi, len(substitute_dict[selected_uid]))): # 选出_n_candi数量的候选.
+            for c in mhm_uid_policy.filter(rng.sample(substitute_dict[selected_uid], min(_n_candi, len(substitute_dict[selected_uid])))): # 选出_n_candi数量的候选, 只保留变量名.
                 if c in _uid.keys():
                     continue
-                if isUID(c): # 判断是否是变量名.
-                    candi_token.append(c)
-                    candi_tokens.append(copy.deepcopy(_tokens))
-                    candi_labels.append(_label)
-                    candi_tokens[-1] = get_example(candi_tokens[-1], selected_uid, c, "python")
-
-            new_example = []
-            for tmp_tokens in candi_tokens:
-                tmp_code = tmp_tokens
-                new_feature = convert_code_to_features(tmp_code, self.tokenizer_mlm, _label, self.args)
-                new_example.append(new_feature)
+                candi_token.append(c)
+                candi_tokens.append(copy.deepcopy(_tokens))
+                candi_labels.append(_label)
+                candi_tokens[-1] = get_example(candi_tokens[-1], selected_uid, c, "python")
+
+            new_example = convert_renames_to_features(_tokens, selected_uid, candi_token, self.tokenizer_mlm, _label, self.args)
             new_dataset = CodeDataset(new_example)
-            prob, pred = self.classifier.get_results(new_dataset, self.args.eval_batch_size)
+            prob, pred = yield new_dataset
 
             for i in range(len(candi_token)):   # Find a valid example
                 if pred[i] != _label: # 如果有样本攻击成功
@@ -623,7 +670,7 @@ class MHM_Attacker():
             # At last, compute acceptance rate.
             alpha = (1-prob[candi_idx][_label]+1e-10) / (1-prob[0][_label]+1e-10)
             # 计算这个id对应的alpha值.
-            if random.uniform(0, 1) > alpha or alpha < _prob_threshold:
+            if rng.uniform(0, 1) > alpha or alpha < _prob_threshold:
                 return {"status": "r", "alpha": alpha, "tokens": candi_tokens[i],
                         "old_uid": selected_uid, "new_uid": candi_token[i],
                         "old_prob": prob[0], "new_prob": prob[i],
@@ -638,32 +685,27 @@ class MHM_Attacker():
 
 
     def __replaceUID_random(self, _tokens, _label=None, _uid={}, substitute_dict={},
-                     _n_candi=30, _prob_threshold=0.95, _candi_mode="random"):
+                     _n_candi=30, _prob_threshold=0.95, _candi_mode="random", rng=random):
         
         assert _candi_mode.lower() in ["random", "nearby"]
         
-        selected_uid = random.sample(substitute_dict.keys(), 1)[0] # 选择需要被替换的变量名
+        selected_uid = rng.sample(list(substitute_dict.keys()), 1)[0] # 选择需要被替换的变量名
         if _candi_mode == "random":
             # First, generate candidate set.
             # The transition probabilities of all candidate are the same.
             candi_token = [selected_uid]
             candi_tokens = [copy.deepcopy(_tokens)]
             candi_labels = [_label]
-            for c in random.sample(self.idx2token, _n_candi): # 选出_n_candi数量的候选.
-                if isUID(c): # 判断是否是变量名.
-                    candi_token.append(c)
-                    candi_tokens.append(copy.deepcopy(_tokens))
-                    candi_labels.append(_label)
-                    candi_tokens[-1] = get_example(candi_tokens[-1], selected_uid, c, "python")
-                    # for i in _uid[selected_uid]: # 依次进行替换.
-
-            new_example = []
-            for tmp_tokens in candi_tokens:
-                tmp_code = tmp_tokens
-                new_feature = convert_code_to_features(tmp_code, self.tokenizer_mlm, _label, self.args)
-                new_example.append(new_feature)
+            for c in mhm_uid_policy.filter(rng.sample(self.idx2token, _n_candi)): # 选出_n_candi数量的候选, 只保留变量名.
+                candi_token.append(c)
+                candi_tokens.append(copy.deepcopy(_tokens))
+                candi_labels.append(_label)
+                candi_tokens[-1] = get_example(candi_tokens[-1], selected_uid, c, "python")
+                # for i in _uid[selected_uid]: # 依次进行替换.
+
+            new_example = convert_renames_to_features(_tokens, selected_uid, candi_token, self.tokenizer_mlm, _label, self.args)
             new_dataset = CodeDataset(new_example)
-            prob, pred = self.classifier.get_results(new_dataset, self.args.eval_batch_size)
+            prob, pred = yield new_dataset
 
             for i in range(len(candi_token)):   # Find a valid example
                 if pred[i] != _label: # 如果有样本攻击成功
@@ -684,7 +726,7 @@ class MHM_Attacker():
             # At last, compute acceptance rate.
             alpha = (1-prob[candi_idx][_label]+1e-10) / (1-prob[0][_label]+1e-10)
             # 计算这个id对应的alpha值.
-            if random.uniform(0, 1) > alpha or alpha < _prob_threshold:
+            if rng.uniform(0, 1) > alpha or alpha < _prob_threshold:
                 return {"status": "r", "alpha": alpha, "tokens": candi_tokens[i],
                         "old_uid": selected_uid, "new_uid": candi_token[i],
                         "old_prob": prob[0], "new_prob": prob[i],
@@ -9,6 +9,7 @@ import torch.nn.functional as F
 from torch.nn import CrossEntropyLoss, MSELoss
 from torch.utils.data import SequentialSampler, DataLoader
 import numpy as np
+from utils import BatchPredictor, model_device, input_length, trim_padding
 
 class RobertaClassificationHead(nn.Module):
     """Head for sentence-level classification tasks."""
@@ -38,10 +39,12 @@ class Model(nn.Module):
         self.classifier=RobertaClassificationHead(config)
         self.args=args
         self.query = 0
+        self.predictor = BatchPredictor(cache_size=getattr(args, 'prediction_cache_size', 0), length_fn=input_length)
     
         
     def forward(self, input_ids=None,labels=None): 
-        input_ids=input_ids.view(-1,self.args.block_size)
+        # get_results给的batch裁掉了padding, 不一定是block_size长
+        input_ids=input_ids.view(-1,input_ids.size(-1))
         outputs = self.encoder(input_ids= input_ids,attention_mask=input_ids.ne(1))[0]
         logits=self.classifier(outputs)
         prob=F.softmax(logits)
@@ -53,35 +56,36 @@ class Model(nn.Module):
         else:
             return prob
       
+    def train(self, mode=True):
+        # 训练会改变参数, 缓存的预测就不对了 (get_results里的eval()不清空)
+        if mode:
+            self.predictor.cache.clear()
+        return super(Model, self).train(mode)
+
+    def load_state_dict(self, *args, **kwargs):
+        self.predictor.cache.clear()
+        return super(Model, self).load_state_dict(*args, **kwargs)
+
+    def predict_batch(self, batch):
+        inputs, label = batch
+        # 只算到这个batch里最长的代码
+        inputs = trim_padding(inputs)
+        with torch.no_grad():
+            lm_loss,logit = self.forward(inputs,label)
+            # 调用这个模型. 重写了反前向传播模型.
+        return logit.float().cpu().numpy()
+
     def get_results(self, dataset, batch_size):
         '''
         给定example和tgt model，返回预测的label和probability
         '''
         self.query += len(dataset)
-        eval_sampler = SequentialSampler(dataset)
-        eval_dataloader = DataLoader(dataset, sampler=eval_sampler, batch_size=batch_size,num_workers=4,pin_memory=False)
 
         ## Evaluate Model
 
-        eval_loss = 0.0
-        nb_eval_steps = 0
         self.eval()
-        logits=[] 
-        labels=[]
-        for batch in eval_dataloader:
-            inputs = batch[0].to("cuda")       
-            label=batch[1].to("cuda") 
-            with torch.no_grad():
-                lm_loss,logit = self.forward(inputs,label)
-                # 调用这个模型. 重写了反前向传播模型.
-                eval_loss += lm_loss.mean().item()
-                logits.append(logit.cpu().numpy())
-                labels.append(label.cpu().numpy())
-                
-
-            nb_eval_steps += 1
-        logits=np.concatenate(logits,0)
-        labels=np.concatenate(labels,0)
+        # 缓存里没有的样本才会调用predict_batch
+        logits = self.predictor.predict(dataset, batch_size, self.predict_batch, model_device(self))
 
         probs = logits
         pred_labels = []
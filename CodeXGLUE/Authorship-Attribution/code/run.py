@@ -42,6 +42,9 @@ except:
 
 from tqdm import tqdm, trange
 import multiprocessing
+import sys
+sys.path.append('../../../')
+sys.path.append('../../../python_parser')
 from model import Model
 
 cpu_cont = 16
@@ -2,7 +2,7 @@ import os
 import sys
 sys.path.append('../../../')
 sys.path.append('../../../python_parser')
-from run_parser import get_identifiers, get_code_tokens
+from run_parser import get_identifiers, get_identifiers_batch, get_code_tokens
 from parser_folder import remove_comments_and_docstrings
 
 def preprocess_gcjpy(split_portion):
@@ -77,13 +77,14 @@ def preprocess_java40(split_portion = 0.8):
 
     train_example = []
     valid_example = []
+    repo_contents = []
     for index, name in enumerate(authors):
         if name[0] == '.':
             continue
         repos = os.listdir(os.path.join(folder, name))
         for repo in repos:
             files = os.listdir(os.path.join(folder, name, repo))
-            tmp_example = []
+            contents = []
             for file_name in files:
                 with open(os.path.join(folder, name, repo, file_name), encoding="utf8", errors='ignore') as code_file:
                     lines_after_removal = []
@@ -92,16 +93,25 @@ def preprocess_java40(split_portion = 0.8):
                             continue
                         lines_after_removal.append(a_line)
 
-                    content = "\n".join(lines_after_removal)
-                    identifiers, code_tokens = get_identifiers(content, 'java')
-                    content = " ".join(code_tokens)
-                    new_content = content + ' <CODESPLIT> ' + str(index) + '\n'
-                    tmp_example.append(new_content)
-            split_pos = int(len(tmp_example) * split_portion)
-            train_example += tmp_example[0:split_pos]
-            valid_example += tmp_example[split_pos:]
+                    contents.append("\n".join(lines_after_removal))
+            repo_contents.append((index, contents))
 
-            # 8 for train and 2 for validation
+    # parse all the files at once on a process pool
+    all_identifiers = get_identifiers_batch([content for _, contents in repo_contents for content in contents], 'java')
+    pos = 0
+    for index, contents in repo_contents:
+        tmp_example = []
+        for _ in contents:
+            identifiers, code_tokens = all_identifiers[pos]
+            pos += 1
+            content = " ".join(code_tokens)
+            new_content = content + ' <CODESPLIT> ' + str(index) + '\n'
+            tmp_example.append(new_content)
+        split_pos = int(len(tmp_example) * split_portion)
+        train_example += tmp_example[0:split_pos]
+        valid_example += tmp_example[split_pos:]
+
+        # 8 for train and 2 for validation
 
     with open(os.path.join(output_dir, "train.txt"), 'w') as f:
         for example in train_example:
@@ -9,6 +9,7 @@ import torch.nn.functional as F
 from torch.nn import CrossEntropyLoss, MSELoss
 from torch.utils.data import SequentialSampler, DataLoader
 import numpy as np
+from utils import BatchPredictor, model_device, input_length, trim_padding
 
 class RobertaClassificationHead(nn.Module):
     """Head for sentence-level classification tasks."""
@@ -38,10 +39,12 @@ class Model(nn.Module):
         self.classifier=RobertaClassificationHead(config)
         self.args=args
         self.query = 0
+        self.predictor = BatchPredictor(cache_size=getattr(args, 'prediction_cache_size', 0), length_fn=input_length)
     
         
     def forward(self, input_ids=None,labels=None): 
-        input_ids=input_ids.view(-1,self.args.block_size)
+        # (batch, 2*block_size), 或者get_results裁掉padding后的(batch, 2, length)
+        input_ids=input_ids.view(-1,input_ids.size(-1) if input_ids.dim()==3 else self.args.block_size)
         outputs = self.encoder(input_ids= input_ids,attention_mask=input_ids.ne(1))[0]
         logits=self.classifier(outputs)
         prob=F.softmax(logits)
@@ -53,30 +56,35 @@ class Model(nn.Module):
             return prob
 
 
+    def train(self, mode=True):
+        # 训练会改变参数, 缓存的预测就不对了 (get_results里的eval()不清空)
+        if mode:
+            self.predictor.cache.clear()
+        return super(Model, self).train(mode)
+
+    def load_state_dict(self, *args, **kwargs):
+        self.predictor.cache.clear()
+        return super(Model, self).load_state_dict(*args, **kwargs)
+
+    def predict_batch(self, batch):
+        inputs, label = batch
+        # 两段代码都只算到这个batch里最长的代码
+        inputs = trim_padding(inputs.view(inputs.size(0), 2, self.args.block_size))
+        with torch.no_grad():
+            lm_loss,logit = self.forward(inputs,label)
+            # 调用这个模型. 重写了反前向传播模型.
+        # 和defect detection任务不一样，这个的输出就是softmax值，而非sigmoid值
+        return logit.float().cpu().numpy()
+
     def get_results(self, dataset, batch_size, threshold=0.5):
         '''Given a dataset, return probabilities and labels.'''
         self.query += len(dataset)
-        eval_sampler = SequentialSampler(dataset)
-        eval_dataloader = DataLoader(dataset, sampler=eval_sampler, batch_size=batch_size,num_workers=4,pin_memory=False)
 
         ## Evaluate Model
 
-        eval_loss = 0.0
         self.eval()
-        logits=[] 
-        labels=[]
-        for batch in eval_dataloader:
-            inputs = batch[0].to("cuda")       
-            label=batch[1].to("cuda") 
-            with torch.no_grad():
-                lm_loss,logit = self.forward(inputs,label)
-                # 调用这个模型. 重写了反前向传播模型.
-                eval_loss += lm_loss.mean().item()
-                logits.append(logit.cpu().numpy())
-                # 和defect detection任务不一样，这个的输出就是softmax值，而非sigmoid值
-                labels.append(label.cpu().numpy())
-        logits=np.concatenate(logits,0)
-        labels=np.concatenate(labels,0)
+        # 缓存里没有的样本才会调用predict_batch
+        logits = self.predictor.predict(dataset, batch_size, self.predict_batch, model_device(self))
 
         probs = logits
         pred_labels = [0 if first_softmax  > threshold else 1 for first_softmax in logits[:,0]]
@@ -11,8 +11,9 @@ sys.path.append('../../../')
 sys.path.append('../../../python_parser')
 
 # from attacker import 
-from python_parser.run_parser import get_identifiers, remove_comments_and_docstrings
-from utils import is_valid_variable_name, _tokenize, get_identifier_posistions_from_code, get_masked_code_by_position, get_substitues, is_valid_substitue
+from python_parser.run_parser import get_identifiers, get_identifiers_batch, remove_comments_and_docstrings
+from utils import is_valid_variable_name, _tokenize, get_identifier_posistions_from_code, get_masked_code_by_position, get_batch_substitues, is_valid_substitue, subword_cache, mask_invalid_substitutes, get_identifier_policy
+from utils import add_device_args, setup_device
 from transformers import (RobertaForMaskedLM, RobertaConfig, RobertaForSequenceClassification, RobertaTokenizer)
 
 def main():
@@ -28,13 +29,19 @@ def main():
                         help="Optional input sequence length after tokenization.")
     parser.add_argument("--index", nargs='+',
                         help="Optional input sequence length after tokenization.")
+    parser.add_argument("--num_workers", default=None, type=int,
+                        help="Number of processes used to parse the codes. Default: all the cores.")
+    parser.add_argument("--parse_chunksize", default=16, type=int,
+                        help="Number of codes sent to a parsing process at a time.")
+    add_device_args(parser)
     args = parser.parse_args()
+    setup_device(args)
 
     eval_data = []
 
     codebert_mlm = RobertaForMaskedLM.from_pretrained(args.base_model)
     tokenizer_mlm = RobertaTokenizer.from_pretrained(args.base_model)
-    codebert_mlm.to('cuda')
+    codebert_mlm.to(args.device, args.dtype)
 
     url_to_code={}
 
@@ -70,12 +77,13 @@ def main():
                 item["label"] = label
                 eval_data.append(item)
     print(len(eval_data))
+    all_identifiers = get_identifiers_batch([item["code1"] for item in eval_data], "java",
+                                            num_workers=args.num_workers,
+                                            chunksize=args.parse_chunksize,
+                                            remove_comments=True)
+    identifier_policy = get_identifier_policy('java')
     with open(args.store_path, "w") as wf:
-        for item in tqdm(eval_data):
-            try:
-                identifiers, code_tokens = get_identifiers(remove_comments_and_docstrings(item["code1"], "java"), "java")
-            except:
-                identifiers, code_tokens = get_identifiers(item["code1"], "java")
+        for item, (identifiers, code_tokens) in tqdm(zip(eval_data, all_identifiers), total=len(eval_data)):
             processed_code = " ".join(code_tokens)
             
             words, sub_words, keys = _tokenize(processed_code, tokenizer_mlm)
@@ -90,7 +98,9 @@ def main():
             
             input_ids_ = torch.tensor([tokenizer_mlm.convert_tokens_to_ids(sub_words)])
 
-            word_predictions = codebert_mlm(input_ids_.to('cuda'))[0].squeeze()  # seq-len(sub) vocab
+            word_predictions = codebert_mlm(input_ids_.to(args.device))[0].squeeze()  # seq-len(sub) vocab
+            # 不能组成合法变量名的subwords不进top-k
+            word_predictions = mask_invalid_substitutes(word_predictions, keys, tokenizer_mlm, 'java')
             word_pred_scores_all, word_predictions = torch.topk(word_predictions, 60, -1)  # seq-len k
             # 得到前k个结果.
 
@@ -102,8 +112,12 @@ def main():
             variable_substitue_dict = {}
 
             with torch.no_grad():
-                orig_embeddings = codebert_mlm.roberta(input_ids_.to('cuda'))[0]
+                orig_embeddings = codebert_mlm.roberta(input_ids_.to(args.device))[0]
             cos = torch.nn.CosineSimilarity(dim=1, eps=1e-6)
+            # 所有变量所有位置的substitutes先收集起来, 被分解成多个subwords的位置一起算perplexity
+            substitutes_list = []
+            substitutes_score_list = []
+            substitutes_names = []
             for tgt_word in names_positions_dict.keys():
                 tgt_positions = names_positions_dict[tgt_word] # the positions of tgt_word in code
                 if not is_valid_variable_name(tgt_word, lang='java'):
@@ -111,7 +125,6 @@ def main():
                     continue   
 
                 ## 得到(所有位置的)substitues
-                all_substitues = []
                 for one_pos in tgt_positions:
                     ## 一个变量名会出现很多次
                     if keys[one_pos][0] >= word_predictions.size()[0]:
@@ -133,7 +146,7 @@ def main():
                         # 替换词得到新embeddings
 
                         with torch.no_grad():
-                            new_embeddings = codebert_mlm.roberta(new_ids_.to('cuda'))[0]
+                            new_embeddings = codebert_mlm.roberta(new_ids_.to(args.device))[0]
                         new_word_embed = new_embeddings[0][keys[one_pos][0]+1:keys[one_pos][1]+1]
 
                         sims.append((i, sum(cos(orig_word_embed, new_word_embed))/subwords_leng))
@@ -148,26 +161,28 @@ def main():
                     similar_substitutes = torch.cat(similar_substitutes, 1)
                     similar_word_pred_scores = torch.cat(similar_word_pred_scores, 1)
 
-                    substitutes = get_substitues(similar_substitutes, 
-                                                tokenizer_mlm, 
-                                                codebert_mlm, 
-                                                1, 
-                                                similar_word_pred_scores, 
-                                                0)
-                    all_substitues += substitutes
-                all_substitues = set(all_substitues)
+                    substitutes_names.append(tgt_word)
+                    substitutes_list.append(similar_substitutes)
+                    substitutes_score_list.append(similar_word_pred_scores)
 
-                for tmp_substitue in all_substitues:
+            all_substitues = {}
+            for tgt_word, substitutes in zip(substitutes_names, get_batch_substitues(substitutes_list, tokenizer_mlm, codebert_mlm, 1, substitutes_score_list, 0)):
+                try:
+                    all_substitues[tgt_word] += substitutes
+                except:
+                    all_substitues[tgt_word] = substitutes
+
+            for tgt_word in all_substitues.keys():
+                for tmp_substitue in identifier_policy.filter(set(all_substitues[tgt_word]), key=str.strip):
                     if tmp_substitue.strip() in variable_names:
                         continue
-                    if not is_valid_substitue(tmp_substitue.strip(), tgt_word, 'java'):
-                        continue
                     try:
                         variable_substitue_dict[tgt_word].append(tmp_substitue)
                     except:
                         variable_substitue_dict[tgt_word] = [tmp_substitue]
             item["substitutes"] = variable_substitue_dict
             wf.write(json.dumps(item)+'\n')
+    print(subword_cache.report())
             
 
 if __name__ == "__main__":
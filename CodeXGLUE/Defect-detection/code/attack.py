@@ -24,13 +24,14 @@ from model import Model
 from run import set_seed
 from run import TextDataset
 from run import InputFeatures
-from utils import is_valid_variable_name, _tokenize
+from utils import is_valid_variable_name, _tokenize, cached_tokenize
+from utils import add_device_args, setup_device
 from utils import get_identifier_posistions_from_code
-from utils import get_masked_code_by_position, get_substitues
+from utils import MaskedTokens, get_masked_inputs, importance_chunk_size, get_batch_substitues
 from run_parser import get_identifiers
 
 from torch.utils.data.dataset import Dataset
-from torch.utils.data import SequentialSampler, DataLoader
+from torch.utils.data import SequentialSampler, DataLoader, TensorDataset
 from transformers import RobertaForMaskedLM
 from transformers import (RobertaConfig, RobertaForSequenceClassification, RobertaTokenizer)
 
@@ -67,13 +68,14 @@ def get_results(dataset, model, batch_size):
     model.eval()
     logits=[] 
     labels=[]
+    device = next(model.parameters()).device
     for batch in eval_dataloader:
-        inputs = batch[0].to("cuda")       
-        label=batch[1].to("cuda") 
+        inputs = batch[0].to(device)       
+        label=batch[1].to(device) 
         with torch.no_grad():
             lm_loss,logit = model(inputs,label)
             # 调用这个模型. 重写了反前向传播模型.
-            logits.append(logit.cpu().numpy())
+            logits.append(logit.float().cpu().numpy())
             labels.append(label.cpu().numpy())
             
 
@@ -87,7 +89,7 @@ def get_results(dataset, model, batch_size):
     return probs, pred_labels
 
 def convert_code_to_features(code, tokenizer, label, args):
-    code_tokens=tokenizer.tokenize(code)[:args.block_size-2]
+    code_tokens=cached_tokenize(code, tokenizer)[:args.block_size-2]
     source_tokens =[tokenizer.cls_token]+code_tokens+[tokenizer.sep_token]
     source_ids =  tokenizer.convert_tokens_to_ids(source_tokens)
     padding_length = args.block_size - len(source_ids)
@@ -106,20 +108,21 @@ def get_importance_score(args, example, code, words_list: list, sub_words: list,
         ## 没有提取出可以mutate的position
         return None, None, None
 
-    new_example = []
-
-    # 2. 得到Masked_tokens
-    masked_token_list, replace_token_positions = get_masked_code_by_position(words_list, positions)
+    # 2. 每个位置mask一次
+    replace_token_positions = [pos for name in positions.keys() for pos in positions[name]]
     # replace_token_positions 表示着，哪一个位置的token被替换了.
 
-
-    for index, tokens in enumerate([words_list] + masked_token_list):
-        new_code = ' '.join(tokens)
-        new_feature = convert_code_to_features(new_code, tokenizer, example[1].item(), args)
-        new_example.append(new_feature)
-    new_dataset = CodeDataset(new_example)
-    # 3. 将他们转化成features
-    logits, preds = get_results(new_dataset, tgt_model, args.eval_batch_size)
+    # 3. masked code直接构造成ids, 按chunk送进模型. 第一个是original code.
+    masked = MaskedTokens(words_list, tokenizer, args.block_size-2, normalize=False)
+    rows = [None] + replace_token_positions
+    logits = []
+    preds = []
+    for start in range(0, len(rows), importance_chunk_size):
+        inputs = get_masked_inputs(masked, rows[start:start+importance_chunk_size], tokenizer, args.block_size)
+        labels = torch.full((inputs.size(0),), example[1].item(), dtype=torch.long)
+        chunk_logits, chunk_preds = get_results(TensorDataset(inputs, labels), tgt_model, args.eval_batch_size)
+        logits += list(chunk_logits)
+        preds += list(chunk_preds)
     orig_probs = logits[0]
     orig_label = preds[0]
     # 第一个是original code的数据.
@@ -191,7 +194,7 @@ def attack(args, example, code, codebert_tgt, tokenizer_tgt, codebert_mlm, token
     sub_words = [tokenizer_tgt.cls_token] + sub_words[:args.block_size - 2] + [tokenizer_tgt.sep_token]
     # 如果长度超了，就截断；这里的block_size是CodeBERT能接受的输入长度
     input_ids_ = torch.tensor([tokenizer_mlm.convert_tokens_to_ids(sub_words)])
-    word_predictions = codebert_mlm(input_ids_.to('cuda'))[0].squeeze()  # seq-len(sub) vocab
+    word_predictions = codebert_mlm(input_ids_.to(args.device))[0].squeeze()  # seq-len(sub) vocab
     word_pred_scores_all, word_predictions = torch.topk(word_predictions, 30, -1)  # seq-len k
     # 得到前k个结果.
 
@@ -251,18 +254,21 @@ def attack(args, example, code, codebert_tgt, tokenizer_tgt, codebert_mlm, token
             continue
 
         ## 得到substitues
-        all_substitues = []
+        substitutes_list = []
+        substitutes_score_list = []
         for one_pos in tgt_positions:
             ## 一个变量名会出现很多次
-            substitutes = word_predictions[keys[one_pos][0]:keys[one_pos][1]]  # L, k
-            word_pred_scores = word_pred_scores_all[keys[one_pos][0]:keys[one_pos][1]]
-
-            substitutes = get_substitues(substitutes, 
-                                        tokenizer_mlm, 
-                                        codebert_mlm, 
-                                        use_bpe, 
-                                        word_pred_scores, 
-                                        threshold_pred_score)
+            substitutes_list.append(word_predictions[keys[one_pos][0]:keys[one_pos][1]])  # L, k
+            substitutes_score_list.append(word_pred_scores_all[keys[one_pos][0]:keys[one_pos][1]])
+
+        # 所有位置的BPE组合一起算perplexity
+        all_substitues = []
+        for substitutes in get_batch_substitues(substitutes_list, 
+                                                tokenizer_mlm, 
+                                                codebert_mlm, 
+                                                use_bpe, 
+                                                substitutes_score_list, 
+                                                threshold_pred_score):
             all_substitues += substitutes
         all_substitues = set(all_substitues)
         # 得到了所有位置的substitue，并使用set来去重
@@ -457,10 +463,11 @@ def main():
     parser.add_argument('--server_port', type=str, default='', help="For distant debugging.")
 
 
+    add_device_args(parser)
     args = parser.parse_args()
 
 
-    args.device = torch.device("cuda")
+    setup_device(args)
     # Set seed
     set_seed(args.seed)
 
@@ -509,15 +516,15 @@ def main():
 
     checkpoint_prefix = 'checkpoint-best-acc/model.bin'
     output_dir = os.path.join(args.output_dir, '{}'.format(checkpoint_prefix))  
-    model.load_state_dict(torch.load(output_dir))      
-    model.to(args.device)
+    model.load_state_dict(torch.load(output_dir, map_location=args.device))      
+    model.to(args.device, args.dtype)
     # 会是因为模型不同吗？我看evaluate的时候模型是重新导入的.
 
 
     ## Load CodeBERT (MLM) model
     codebert_mlm = RobertaForMaskedLM.from_pretrained(args.base_model)
     tokenizer_mlm = RobertaTokenizer.from_pretrained(args.base_model)
-    codebert_mlm.to('cuda') 
+    codebert_mlm.to(args.device, args.dtype) 
 
     ## Load Dataset
     test_dataset = TextDataset(tokenizer, args,args.eval_data_file)
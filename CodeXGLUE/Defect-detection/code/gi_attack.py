@@ -19,8 +19,10 @@ import time
 from model import Model
 from run import TextDataset
 from utils import set_seed
+from utils import add_device_args, setup_device
 from python_parser.parser_folder import remove_comments_and_docstrings
 from utils import Recorder
+from utils import AttackScheduler, example_rng
 from attacker import Attacker
 from transformers import (RobertaForMaskedLM, RobertaConfig, RobertaForSequenceClassification, RobertaTokenizer)
 
@@ -77,23 +79,30 @@ def main():
                         help="Whether to run training.")
     parser.add_argument("--use_ga", action='store_true',
                         help="Whether to GA-Attack.")
+    parser.add_argument("--importance_mode", default="occurrence", type=str, choices=["occurrence", "variable"],
+                        help="Mask every occurrence of a variable separately (N+1 queries) or all of them at once (V+1 queries) to compute the importance scores.")
     parser.add_argument("--do_eval", action='store_true',
                         help="Whether to run eval on the dev set.")
     parser.add_argument("--do_test", action='store_true',
                         help="Whether to run eval on the dev set.")    
     parser.add_argument("--eval_batch_size", default=4, type=int,
                         help="Batch size per GPU/CPU for evaluation.")
+    parser.add_argument("--attack_concurrency", default=1, type=int,
+                        help="Number of examples attacked at the same time, their queries are predicted in shared batches. "
+                             "The time cost of an example only counts its own steps and its share of the predictions.")
     parser.add_argument('--seed', type=int, default=42,
-                        help="random seed for initialization")
+                        help="random seed for initialization. GA and MHM draw from a generator seeded with it and the index "
+                             "of the example, so their results differ from the versions before --attack_concurrency.")
     parser.add_argument("--cache_dir", default="", type=str,
                         help="Optional directory to store the pre-trained models downloaded from s3 (instread of the default one)")
 
 
 
+    add_device_args(parser)
     args = parser.parse_args()
 
 
-    args.device = torch.device("cuda")
+    setup_device(args)
     # Set seed
     set_seed(args.seed)
 
@@ -142,14 +151,14 @@ def main():
 
     checkpoint_prefix = 'checkpoint-best-acc/model.bin'
     output_dir = os.path.join(args.output_dir, '{}'.format(checkpoint_prefix))  
-    model.load_state_dict(torch.load(output_dir))      
-    model.to(args.device)
+    model.load_state_dict(torch.load(output_dir, map_location=args.device))      
+    model.to(args.device, args.dtype)
 
 
     ## Load CodeBERT (MLM) model
     codebert_mlm = RobertaForMaskedLM.from_pretrained(args.base_model)
     tokenizer_mlm = RobertaTokenizer.from_pretrained(args.base_model)
-    codebert_mlm.to('cuda') 
+    codebert_mlm.to(args.device, args.dtype) 
 
     ## Load Dataset
     eval_dataset = TextDataset(tokenizer, args,args.eval_data_file)
@@ -173,19 +182,24 @@ def main():
     
     attacker = Attacker(args, model, tokenizer, codebert_mlm, tokenizer_mlm, use_bpe=1, threshold_pred_score=0)
     start_time = time.time()
-    query_times = 0
-    for index, example in enumerate(eval_dataset):
-        example_start_time = time.time()
+    importance_query_times = 0
+    def attack_steps(index, example):
+        # 一个example的greedy(+GA)攻击, 预测请求交给AttackScheduler
         code = source_codes[index]
         substituions = generated_substitutions[index]
-        code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, names_to_importance_score, nb_changed_var, nb_changed_pos, replaced_words = attacker.greedy_attack(example, code, substituions)
+        (code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, names_to_importance_score, nb_changed_var, nb_changed_pos, replaced_words), importance_queries = yield from attacker.greedy_attack_steps(example, code, substituions)
         attack_type = "Greedy"
         if is_success == -1 and args.use_ga:
             # 如果不成功，则使用gi_attack
-            code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, names_to_importance_score, nb_changed_var, nb_changed_pos, replaced_words = attacker.ga_attack(example, code, substituions, initial_replace=replaced_words)
+            code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, names_to_importance_score, nb_changed_var, nb_changed_pos, replaced_words = yield from attacker.ga_attack_steps(example, code, substituions, initial_replace=replaced_words, rng=example_rng(args.seed, index))
             attack_type = "GA"
+        return (code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, names_to_importance_score, nb_changed_var, nb_changed_pos, replaced_words), attack_type, importance_queries
 
-        example_end_time = (time.time()-example_start_time)/60
+    scheduler = AttackScheduler(model, args.eval_batch_size, args.attack_concurrency)
+    jobs = (attack_steps(index, example) for index, example in enumerate(eval_dataset))
+    for index, (result, nb_queries, seconds) in enumerate(scheduler.run(jobs)):
+        (code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, names_to_importance_score, nb_changed_var, nb_changed_pos, replaced_words), attack_type, importance_queries = result
+        example_end_time = seconds/60
         
         print("Example time cost: ", round(example_end_time, 2), "min")
         print("ALL examples time cost: ", round((time.time()-start_time)/60, 2), "min")
@@ -198,10 +212,13 @@ def main():
         if replaced_words is not None:
             for key in replaced_words.keys():
                 replace_info += key + ':' + replaced_words[key] + ','
-        print("Query times in this attack: ", model.query - query_times)
+        print("Query times in this attack: ", nb_queries)
         print("All Query times: ", model.query)
-        recoder.write(index, code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, score_info, nb_changed_var, nb_changed_pos, replace_info, attack_type, model.query - query_times, example_end_time)
-        query_times = model.query
+        print(model.predictor.report())
+        importance_query_times += importance_queries
+        print("Importance query times in this attack: ", importance_queries)
+        print("All Importance query times: ", importance_query_times)
+        recoder.write(index, code, prog_length, adv_code, true_label, orig_label, temp_label, is_success, variable_names, score_info, nb_changed_var, nb_changed_pos, replace_info, attack_type, nb_queries, example_end_time)
         
         if is_success >= -1 :
             # 如果原来正确
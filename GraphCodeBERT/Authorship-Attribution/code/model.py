@@ -9,6 +9,8 @@ import numpy as np
 import torch.nn.functional as F
 from torch.nn import CrossEntropyLoss, MSELoss
 from torch.utils.data import SequentialSampler, DataLoader
+from utils import collate_graph_batch, expand_graph_attn_mask, BatchPredictor, model_device
+from utils import graph_input_length, trim_graph_padding
 
 class RobertaClassificationHead(nn.Module):
     """Head for sentence-level classification tasks."""
@@ -38,9 +40,15 @@ class Model(nn.Module):
         self.classifier=RobertaClassificationHead(config)
         self.args=args
         self.query = 0
+        self.predictor = BatchPredictor(collate_fn=collate_graph_batch,
+                                        cache_size=getattr(args, 'prediction_cache_size', 0),
+                                        length_fn=graph_input_length)
     
         
     def forward(self, inputs_ids=None, attn_mask=None, position_idx=None, labels=None): 
+        if isinstance(attn_mask, tuple):
+            # compact graph of GraphCodeDataset, expanded on this device
+            attn_mask=expand_graph_attn_mask(attn_mask, inputs_ids.size(1))
 
         nodes_mask=position_idx.eq(0)
         token_mask=position_idx.ge(2)
@@ -48,7 +56,7 @@ class Model(nn.Module):
         inputs_embeddings=self.encoder.roberta.embeddings.word_embeddings(inputs_ids)
         nodes_to_token_mask=nodes_mask[:,:,None]&token_mask[:,None,:]&attn_mask
         nodes_to_token_mask=nodes_to_token_mask/(nodes_to_token_mask.sum(-1)+1e-10)[:,:,None]
-        avg_embeddings=torch.einsum("abc,acd->abd",nodes_to_token_mask,inputs_embeddings)
+        avg_embeddings=torch.einsum("abc,acd->abd",nodes_to_token_mask.to(inputs_embeddings.dtype),inputs_embeddings)
         inputs_embeddings=inputs_embeddings*(~nodes_mask)[:,:,None]+avg_embeddings*nodes_mask[:,:,None]
 
         outputs = self.encoder.roberta(inputs_embeds=inputs_embeddings,attention_mask=attn_mask,position_ids=position_idx)[0]
@@ -63,27 +71,31 @@ class Model(nn.Module):
         else:
             return prob
       
+    def train(self, mode=True):
+        # 训练会改变参数, 缓存的预测就不对了 (get_results里的eval()不清空)
+        if mode:
+            self.predictor.cache.clear()
+        return super(Model, self).train(mode)
+
+    def load_state_dict(self, *args, **kwargs):
+        self.predictor.cache.clear()
+        return super(Model, self).load_state_dict(*args, **kwargs)
+
+    def predict_batch(self, batch):
+        inputs_ids, attn_mask, position_idx, label = batch
+        # 只算到这个batch里最长的输入
+        inputs_ids, attn_mask, position_idx = trim_graph_padding(inputs_ids, attn_mask, position_idx)
+        with torch.no_grad():
+            lm_loss,logit = self.forward(inputs_ids, attn_mask, position_idx, label)
+        return logit.float().cpu().numpy()
+
     def get_results(self, dataset, batch_size):
         '''Given a dataset, return probabilities and labels.'''
         self.query += len(dataset)
-        eval_sampler = SequentialSampler(dataset)
-        eval_dataloader = DataLoader(dataset, sampler=eval_sampler, batch_size=batch_size,num_workers=4,pin_memory=False)
 
         self.eval()
-        logits=[] 
-        labels=[]
-        for batch in eval_dataloader:
-            inputs_ids = batch[0].to("cuda")       
-            attn_mask = batch[1].to("cuda") 
-            position_idx = batch[2].to("cuda") 
-            label=batch[3].to("cuda")  
-            with torch.no_grad():
-                lm_loss,logit = self.forward(inputs_ids, attn_mask, position_idx, label)
-                logits.append(logit.cpu().numpy())
-                labels.append(label.cpu().numpy())
-                
-        logits=np.concatenate(logits,0)
-        labels=np.concatenate(labels,0)
+        # 缓存里没有的样本才会调用predict_batch
+        logits = self.predictor.predict(dataset, batch_size, self.predict_batch, model_device(self))
 
         probs = logits
         pred_labels = []
@@ -21,6 +21,7 @@ using a masked language modeling (MLM) loss.
 
 from __future__ import absolute_import, division, print_function
 
+import sys
 import argparse
 import glob
 import logging
@@ -38,7 +39,10 @@ from transformers import (WEIGHTS_NAME, AdamW, get_linear_schedule_with_warmup,
                           RobertaConfig, RobertaForSequenceClassification, RobertaTokenizer)
 from tqdm import tqdm, trange
 import multiprocessing
+sys.path.append('../../../')
+sys.path.append('../../../python_parser')
 from model import Model
+from utils import get_graph_attn_index, get_graph_attn_mask_from_index
 
 cpu_cont = 16
 logger = logging.getLogger(__name__)
@@ -92,6 +96,7 @@ def extract_dataflow(code, parser,lang):
             DFG,_=parser[1](root_node,index_to_code,{}) 
         except:
             DFG=[]
+        #the DFG functions leave the edges in traversal order, sort them once here
         DFG=sorted(DFG,key=lambda x:x[1])
         indexs=set()
         for d in DFG:
@@ -207,37 +212,19 @@ class TextDataset(Dataset):
                     logger.info("label: {}".format(example.label))
                     logger.info("input_tokens: {}".format([x.replace('\u0120','_') for x in example.input_tokens]))
                     logger.info("input_ids: {}".format(' '.join(map(str, example.input_ids))))
+        #the graph of every example is indexed once, not on every access
+        self.attn_index=[get_graph_attn_index(x.input_ids, x.position_idx, x.dfg_to_code, x.dfg_to_dfg) for x in self.examples]
 
     def __len__(self):
         return len(self.examples)
 
     def __getitem__(self, item):
         #calculate graph-guided masked function
-        attn_mask=np.zeros((self.args.code_length+self.args.data_flow_length,
-                            self.args.code_length+self.args.data_flow_length),dtype=np.bool)
-        #calculate begin index of node and max length of input
-        
-        node_index=sum([i>1 for i in self.examples[item].position_idx])
-        max_length=sum([i!=1 for i in self.examples[item].position_idx])
-        #sequence can attend to sequence
-        attn_mask[:node_index,:node_index]=True
-        #special tokens attend to all tokens
-        for idx,i in enumerate(self.examples[item].input_ids):
-            if i in [0,2]:
-                attn_mask[idx,:max_length]=True
-        #nodes attend to code tokens that are identified from
-        for idx,(a,b) in enumerate(self.examples[item].dfg_to_code):
-            if a<node_index and b<node_index:
-                attn_mask[idx+node_index,a:b]=True
-                attn_mask[a:b,idx+node_index]=True
-        #nodes attend to adjacent nodes 
-        for idx,nodes in enumerate(self.examples[item].dfg_to_dfg):
-            for a in nodes:
-                if a+node_index<len(self.examples[item].position_idx):
-                    attn_mask[idx+node_index,a+node_index]=True
+        attn_mask=get_graph_attn_mask_from_index(self.attn_index[item],
+                                                 self.args.code_length+self.args.data_flow_length)
               
         return (torch.tensor(self.examples[item].input_ids),
-              torch.tensor(attn_mask),
+              torch.from_numpy(attn_mask),
               torch.tensor(self.examples[item].position_idx),
               torch.tensor(self.examples[item].label))
             
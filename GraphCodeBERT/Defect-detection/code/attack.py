@@ -23,9 +23,10 @@ from model import Model
 from run import set_seed
 from run import TextDataset
 from run import InputFeatures
-from utils import python_keywords, is_valid_substitue, _tokenize
+from utils import python_keywords, is_valid_substitue, _tokenize, cached_tokenize
+from utils import add_device_args, setup_device
 from utils import get_identifier_posistions_from_code
-from utils import get_masked_code_by_position, get_substitues
+from utils import get_masked_code_by_position, get_batch_substitues, get_graph_attn_index, get_graph_attn_mask_from_index
 from python_parser.run_parser import get_identifiers, extract_dataflow
 
 from torch.utils.data.dataset import Dataset
@@ -46,37 +47,19 @@ class CodeDataset(Dataset):
     def __init__(self, examples, args):
         self.examples = examples
         self.args=args
-    
+        #the graph of every example is indexed once, not on every access
+        self.attn_index=[get_graph_attn_index(x.input_ids, x.position_idx, x.dfg_to_code, x.dfg_to_dfg) for x in self.examples]
+
     def __len__(self):
         return len(self.examples)
 
     def __getitem__(self, item):
         #calculate graph-guided masked function
-        attn_mask=np.zeros((self.args.code_length+self.args.data_flow_length,
-                            self.args.code_length+self.args.data_flow_length),dtype=np.bool)
-        #calculate begin index of node and max length of input
-        
-        node_index=sum([i>1 for i in self.examples[item].position_idx])
-        max_length=sum([i!=1 for i in self.examples[item].position_idx])
-        #sequence can attend to sequence
-        attn_mask[:node_index,:node_index]=True
-        #special tokens attend to all tokens
-        for idx,i in enumerate(self.examples[item].input_ids):
-            if i in [0,2]:
-                attn_mask[idx,:max_length]=True
-        #nodes attend to code tokens that are identified from
-        for idx,(a,b) in enumerate(self.examples[item].dfg_to_code):
-            if a<node_index and b<node_index:
-                attn_mask[idx+node_index,a:b]=True
-                attn_mask[a:b,idx+node_index]=True
-        #nodes attend to adjacent nodes 
-        for idx,nodes in enumerate(self.examples[item].dfg_to_dfg):
-            for a in nodes:
-                if a+node_index<len(self.examples[item].position_idx):
-                    attn_mask[idx+node_index,a+node_index]=True
+        attn_mask=get_graph_attn_mask_from_index(self.attn_index[item],
+                                                 self.args.code_length+self.args.data_flow_length)
               
         return (torch.tensor(self.examples[item].input_ids),
-              torch.tensor(attn_mask),
+              torch.from_numpy(attn_mask),
               torch.tensor(self.examples[item].position_idx),
               torch.tensor(self.examples[item].label))
 
@@ -97,16 +80,17 @@ def get_results(dataset, model, batch_size):
     model.eval()
     logits=[] 
     labels=[]
+    device = next(model.parameters()).device
     for batch in eval_dataloader:
-        inputs_ids = batch[0].to("cuda")       
-        attn_mask = batch[1].to("cuda") 
-        position_idx = batch[2].to("cuda") 
-        label=batch[3].to("cuda") 
+        inputs_ids = batch[0].to(device)       
+        attn_mask = batch[1].to(device) 
+        position_idx = batch[2].to(device) 
+        label=batch[3].to(device) 
         with torch.no_grad():
             lm_loss,logit = model(inputs_ids, attn_mask, position_idx, label)
             # 调用这个模型. 重写了反前向传播模型.
             eval_loss += lm_loss.mean().item()
-            logits.append(logit.cpu().numpy())
+            logits.append(logit.float().cpu().numpy())
             labels.append(label.cpu().numpy())
             
 
@@ -122,7 +106,7 @@ def get_results(dataset, model, batch_size):
 def convert_code_to_features(code, tokenizer, label, args):
     # 这里要被修改..
     dfg, index_table, code_tokens = extract_dataflow(code, "c")
-    code_tokens=[tokenizer.tokenize('@ '+x)[1:] if idx!=0 else tokenizer.tokenize(x) for idx,x in enumerate(code_tokens)]
+    code_tokens=[cached_tokenize('@ '+x, tokenizer)[1:] if idx!=0 else cached_tokenize(x, tokenizer) for idx,x in enumerate(code_tokens)]
     ori2cur_pos={}
     ori2cur_pos[-1]=(0,0)
     for i in range(len(code_tokens)):
@@ -253,7 +237,7 @@ def attack(args, example, code, codebert_tgt, tokenizer_tgt, codebert_mlm, token
     sub_words = [tokenizer_tgt.cls_token] + sub_words[:args.block_size - 2] + [tokenizer_tgt.sep_token]
     # 如果长度超了，就截断；这里的block_size是CodeBERT能接受的输入长度
     input_ids_ = torch.tensor([tokenizer_mlm.convert_tokens_to_ids(sub_words)])
-    word_predictions = codebert_mlm(input_ids_.to('cuda'))[0].squeeze()  # seq-len(sub) vocab
+    word_predictions = codebert_mlm(input_ids_.to(args.device))[0].squeeze()  # seq-len(sub) vocab
     word_pred_scores_all, word_predictions = torch.topk(word_predictions, 30, -1)  # seq-len k
     # 得到前k个结果.
 
@@ -312,18 +296,21 @@ def attack(args, example, code, codebert_tgt, tokenizer_tgt, codebert_mlm, token
             continue   
 
         ## 得到substitues
-        all_substitues = []
+        substitutes_list = []
+        substitutes_score_list = []
         for one_pos in tgt_positions:
             ## 一个变量名会出现很多次
-            substitutes = word_predictions[keys[one_pos][0]:keys[one_pos][1]]  # L, k
-            word_pred_scores = word_pred_scores_all[keys[one_pos][0]:keys[one_pos][1]]
-
-            substitutes = get_substitues(substitutes, 
-                                        tokenizer_mlm, 
-                                        codebert_mlm, 
-                                        use_bpe, 
-                                        word_pred_scores, 
-                                        threshold_pred_score)
+            substitutes_list.append(word_predictions[keys[one_pos][0]:keys[one_pos][1]])  # L, k
+            substitutes_score_list.append(word_pred_scores_all[keys[one_pos][0]:keys[one_pos][1]])
+
+        # 所有位置的BPE组合一起算perplexity
+        all_substitues = []
+        for substitutes in get_batch_substitues(substitutes_list, 
+                                                tokenizer_mlm, 
+                                                codebert_mlm, 
+                                                use_bpe, 
+                                                substitutes_score_list, 
+                                                threshold_pred_score):
             all_substitues += substitutes
         all_substitues = set(all_substitues)
         # 得到了所有位置的substitue，并使用set来去重
@@ -473,10 +460,11 @@ def main():
                         help="For distributed training: local_rank")
 
 
+    add_device_args(parser)
     args = parser.parse_args()
 
 
-    args.device = torch.device("cuda")
+    setup_device(args)
     # Set seed
     set_seed(args.seed)
 
@@ -525,15 +513,15 @@ def main():
 
     checkpoint_prefix = 'checkpoint-best-acc/model.bin'
     output_dir = os.path.join(args.output_dir, '{}'.format(checkpoint_prefix))  
-    model.load_state_dict(torch.load(output_dir))      
-    model.to(args.device)
+    model.load_state_dict(torch.load(output_dir, map_location=args.device))      
+    model.to(args.device, args.dtype)
     # 会是因为模型不同吗？我看evaluate的时候模型是重新导入的.
 
 
     ## Load CodeBERT (MLM) model
     codebert_mlm = RobertaForMaskedLM.from_pretrained("microsoft/graphcodebert-base")
     tokenizer_mlm = RobertaTokenizer.from_pretrained("microsoft/graphcodebert-base")
-    codebert_mlm.to('cuda') 
+    codebert_mlm.to(args.device, args.dtype) 
 
     ## Load Dataset
     eval_dataset = TextDataset(tokenizer, args,args.eval_data_file)
@@ -31,7 +31,8 @@ import re
 import shutil
 sys.path.append('../../../')
 sys.path.append('../../../python_parser')
-from run_parser import extract_dataflow
+from run_parser import extract_dataflow, extract_dataflow_batch
+from utils import get_graph_attn_index, get_graph_attn_mask_from_index
 import numpy as np
 import torch
 from torch.utils.data import DataLoader, Dataset, SequentialSampler, RandomSampler,TensorDataset
@@ -86,10 +87,12 @@ class InputFeatures(object):
         self.label=label
 
         
-def convert_examples_to_features(js,tokenizer,args):
+def convert_examples_to_features(js,tokenizer,args,dataflow=None):
     #source
     code=' '.join(js['func'].split())
-    dfg, index_table, code_tokens = extract_dataflow(code, "c")
+    if dataflow is None:
+        dataflow = extract_dataflow(code, "c")
+    dfg, index_table, code_tokens = dataflow
 
     code_tokens=[tokenizer.tokenize('@ '+x)[1:] if idx!=0 else tokenizer.tokenize(x) for idx,x in enumerate(code_tokens)]
     ori2cur_pos={}
@@ -141,10 +144,12 @@ class TextDataset(Dataset):
         except:
             logger.info("Creating features from dataset file at %s", file_path)
             with open(file_path) as f:
-                for line in tqdm(f):
-                    js=json.loads(line.strip())
-                    self.examples.append(convert_examples_to_features(js,tokenizer,args))
-                    # 这里每次都是重新读取并处理数据集，能否cache然后load
+                data=[json.loads(line.strip()) for line in f]
+            # parse all the functions on a process pool first
+            dataflows=extract_dataflow_batch([' '.join(js['func'].split()) for js in data], "c")
+            for js,dataflow in tqdm(zip(data,dataflows),total=len(data)):
+                self.examples.append(convert_examples_to_features(js,tokenizer,args,dataflow))
+                # 这里每次都是重新读取并处理数据集，能否cache然后load
             logger.info("Saving features into cached file %s", cache_file_path)
             torch.save(self.examples, cache_file_path)
         if 'train' in file_path:
@@ -154,37 +159,19 @@ class TextDataset(Dataset):
                     logger.info("label: {}".format(example.label))
                     logger.info("input_tokens: {}".format([x.replace('\u0120','_') for x in example.input_tokens]))
                     logger.info("input_ids: {}".format(' '.join(map(str, example.input_ids))))
+        #the graph of every example is indexed once, not on every access
+        self.attn_index=[get_graph_attn_index(x.input_ids, x.position_idx, x.dfg_to_code, x.dfg_to_dfg) for x in self.examples]
 
     def __len__(self):
         return len(self.examples)
 
     def __getitem__(self, item):
         #calculate graph-guided masked function
-        attn_mask=np.zeros((self.args.code_length+self.args.data_flow_length,
-                            self.args.code_length+self.args.data_flow_length),dtype=np.bool)
-        #calculate begin index of node and max length of input
-        
-        node_index=sum([i>1 for i in self.examples[item].position_idx])
-        max_length=sum([i!=1 for i in self.examples[item].position_idx])
-        #sequence can attend to sequence
-        attn_mask[:node_index,:node_index]=True
-        #special tokens attend to all tokens
-        for idx,i in enumerate(self.examples[item].input_ids):
-            if i in [0,2]:
-                attn_mask[idx,:max_length]=True
-        #nodes attend to code tokens that are identified from
-        for idx,(a,b) in enumerate(self.examples[item].dfg_to_code):
-            if a<node_index and b<node_index:
-                attn_mask[idx+node_index,a:b]=True
-                attn_mask[a:b,idx+node_index]=True
-        #nodes attend to adjacent nodes 
-        for idx,nodes in enumerate(self.examples[item].dfg_to_dfg):
-            for a in nodes:
-                if a+node_index<len(self.examples[item].position_idx):
-                    attn_mask[idx+node_index,a+node_index]=True
+        attn_mask=get_graph_attn_mask_from_index(self.attn_index[item],
+                                                 self.args.code_length+self.args.data_flow_length)
               
         return (torch.tensor(self.examples[item].input_ids),
-              torch.tensor(attn_mask),
+              torch.from_numpy(attn_mask),
               torch.tensor(self.examples[item].position_idx),
               torch.tensor(self.examples[item].label))
             
@@ -0,0 +1,151 @@
+'''
+Benchmark of the graph-guided attention masks built by GraphCodeDataset and
+CodePairDataset: the python loops they used to run on every access against
+the vectorized get_graph_attn_mask of utils.py. Everything runs on CPU, only
+the tokenizer is needed.
+
+Examples:
+    python GraphCodeBERT/bench_attn_mask.py --task defect --tokenizer_name microsoft/graphcodebert-base \
+        --data_file CodeXGLUE/Defect-detection/preprocess/dataset/test_subs_0_400.jsonl --limit 200
+    python GraphCodeBERT/bench_attn_mask.py --task clone --tokenizer_name microsoft/graphcodebert-base \
+        --data_file CodeXGLUE/Clone-detection-BigCloneBench/dataset/test_subs_0_500.jsonl --limit 100
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# the attacker of each task builds the features of its datasets
+task_dirs = {
+    'defect': 'Defect-detection',
+    'authorship': 'Authorship-Attribution',
+    'clone': 'clonedetection',
+}
+
+
+def loop_attn_mask(input_ids, position_idx, dfg_to_code, dfg_to_dfg, length):
+    # the loops GraphCodeDataset.__getitem__ ran before, kept as reference
+    attn_mask=np.zeros((length,length),dtype=bool)
+    node_index=sum([i>1 for i in position_idx])
+    max_length=sum([i!=1 for i in position_idx])
+    attn_mask[:node_index,:node_index]=True
+    for idx,i in enumerate(input_ids):
+        if i in [0,2]:
+            attn_mask[idx,:max_length]=True
+    for idx,(a,b) in enumerate(dfg_to_code):
+        if a<node_index and b<node_index:
+            attn_mask[idx+node_index,a:b]=True
+            attn_mask[a:b,idx+node_index]=True
+    for idx,nodes in enumerate(dfg_to_dfg):
+        for a in nodes:
+            if a+node_index<len(position_idx):
+                attn_mask[idx+node_index,a+node_index]=True
+    return attn_mask
+
+
+def load_codes(data_file, limit):
+    result = []
+    with open(data_file) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if 'func' in item:
+                result.append((item['func'],))
+            elif 'code1' in item:
+                result.append((item['code1'], item['code2']))
+            else:
+                result.append((item['code'].replace("\\n", "\n"),))
+            if limit is not None and len(result) >= limit:
+                break
+    return result
+
+
+def build_features(task, codes, tokenizer, args):
+    # attacker.py appends '../../../' to sys.path, so it is imported from its folder
+    code_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), task_dirs[task], 'code')
+    cwd = os.getcwd()
+    os.chdir(code_dir)
+    sys.path.insert(0, code_dir)
+    try:
+        from attacker import convert_code_to_features
+    finally:
+        os.chdir(cwd)
+    if task == 'clone':
+        return [convert_code_to_features(code[0], code[1], tokenizer, 0, args) for code in codes]
+    return [convert_code_to_features(code[0], tokenizer, 0, args) for code in codes]
+
+
+def masks_of(feature, length, build):
+    if hasattr(feature, 'input_ids_1'):
+        return [build(feature.input_ids_1, feature.position_idx_1, feature.dfg_to_code_1, feature.dfg_to_dfg_1, length),
+                build(feature.input_ids_2, feature.position_idx_2, feature.dfg_to_code_2, feature.dfg_to_dfg_2, length)]
+    return [build(feature.input_ids, feature.position_idx, feature.dfg_to_code, feature.dfg_to_dfg, length)]
+
+
+def bench(features, length, repeat):
+    '''
+    Items/s of the masks of every feature built by
+    loop: the python loops, on every access (before)
+    vectorized: get_graph_attn_mask, for datasets read once, like the candidates of an attack
+    indexed: get_graph_attn_mask_from_index of the index the datasets compute in __init__,
+             for datasets read every epoch
+    '''
+    from utils import get_graph_attn_mask, get_graph_attn_index, get_graph_attn_mask_from_index
+    index = [masks_of(feature, None, lambda *x: get_graph_attn_index(*x[:4])) for feature in features]
+    for feature, feature_index in zip(features, index):
+        for loop_mask, mask, attn_index in zip(masks_of(feature, length, loop_attn_mask),
+                                               masks_of(feature, length, get_graph_attn_mask), feature_index):
+            assert (loop_mask == mask).all()
+            assert (loop_mask == get_graph_attn_mask_from_index(attn_index, length)).all()
+    results = {}
+    for name, build in [('loop', loop_attn_mask), ('vectorized', get_graph_attn_mask)]:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for feature in features:
+                masks_of(feature, length, build)
+        results[name] = repeat * len(features) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for feature_index in index:
+            for attn_index in feature_index:
+                get_graph_attn_mask_from_index(attn_index, length)
+    results['indexed'] = repeat * len(features) / (time.perf_counter() - start)
+    print("attn_mask: %d items, loop %.1f items/s, vectorized %.1f items/s (x%.2f), indexed %.1f items/s (x%.2f)" % \
+        (len(features), results['loop'],
+        results['vectorized'], results['vectorized'] / results['loop'],
+        results['indexed'], results['indexed'] / results['loop']), flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--task", default="defect", type=str, choices=list(task_dirs.keys()),
+                        help="Task whose features are built.")
+    parser.add_argument("--tokenizer_name", default="microsoft/graphcodebert-base", type=str,
+                        help="Tokenizer of the GraphCodeBERT model.")
+    parser.add_argument("--data_file", required=True, type=str,
+                        help="jsonl file with a \"func\", \"code1\"/\"code2\" or \"code\" field.")
+    parser.add_argument("--limit", default=200, type=int,
+                        help="Maximum number of codes read from data_file.")
+    parser.add_argument("--repeat", default=3, type=int,
+                        help="Number of timed passes over the items.")
+    parser.add_argument("--code_length", default=512, type=int,
+                        help="Maximum number of code tokens.")
+    parser.add_argument("--data_flow_length", default=128, type=int,
+                        help="Maximum number of data flow nodes.")
+    args = parser.parse_args()
+
+    from transformers import RobertaTokenizer
+    tokenizer = RobertaTokenizer.from_pretrained(args.tokenizer_name)
+    codes = load_codes(os.path.abspath(args.data_file), args.limit)
+    features = build_features(args.task, codes, tokenizer, args)
+    bench(features, args.code_length + args.data_flow_length, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
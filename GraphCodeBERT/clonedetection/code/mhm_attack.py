@@ -10,8 +10,10 @@ import warnings
 import torch
 from model import Model
 from utils import set_seed
+from utils import add_device_args, setup_device
 from run import TextDataset
 from utils import Recorder
+from utils import AttackScheduler, example_rng
 from attacker import MHM_Attacker
 from attack import get_code_pairs
 from run_parser import get_identifiers
@@ -77,16 +79,21 @@ if __name__ == "__main__":
                         help="Whether to MHM original.")    
     parser.add_argument("--eval_batch_size", default=4, type=int,
                         help="Batch size per GPU/CPU for evaluation.")
+    parser.add_argument("--attack_concurrency", default=1, type=int,
+                        help="Number of examples attacked at the same time, their queries are predicted in shared batches. "
+                             "The time cost of an example only counts its own steps and its share of the predictions.")
     parser.add_argument('--seed', type=int, default=42,
-                        help="random seed for initialization")
+                        help="random seed for initialization. GA and MHM draw from a generator seeded with it and the index "
+                             "of the example, so their results differ from the versions before --attack_concurrency.")
     parser.add_argument("--cache_dir", default="", type=str,
                         help="Optional directory to store the pre-trained models downloaded from s3 (instread of the default one)")
 
 
+    add_device_args(parser)
     args = parser.parse_args()
 
 
-    args.device = torch.device("cuda")
+    setup_device(args)
     # Set seed
     set_seed(args.seed)
 
@@ -130,13 +137,13 @@ if __name__ == "__main__":
 
     checkpoint_prefix = 'checkpoint-best-f1/model.bin'
     output_dir = os.path.join(args.output_dir, '{}'.format(checkpoint_prefix))  
-    model.load_state_dict(torch.load(output_dir))
-    model.to(args.device)
+    model.load_state_dict(torch.load(output_dir, map_location=args.device))
+    model.to(args.device, args.dtype)
     print ("MODEL LOADED!")
 
     codebert_mlm = RobertaForMaskedLM.from_pretrained(args.base_model)
     tokenizer_mlm = RobertaTokenizer.from_pretrained(args.base_model)
-    codebert_mlm.to('cuda') 
+    codebert_mlm.to(args.device, args.dtype) 
 
 
     # Load Dataset
@@ -176,32 +183,38 @@ if __name__ == "__main__":
            'ori_tokens': [], "label": [], }
     n_succ = 0.0
     total_cnt = 0
-    query_times = 0
     all_start_time = time.time()
-    for index, example in enumerate(eval_dataset):
+    def attack_steps(index, example):
+        # 一个example的MHM攻击, 预测请求交给AttackScheduler
         code_pair = source_codes[index]
         substitute = substitutes[index]
         ground_truth = example[6].item()
         
-        orig_prob, orig_label = model.get_results([example], args.eval_batch_size)
+        orig_prob, orig_label = yield [example]
         orig_prob = orig_prob[0]
         orig_label = orig_label[0]
         
         if orig_label != ground_truth:
-            continue
-        start_time = time.time()
+            return None
         
         # 这里需要进行修改.
         if args.original:
-            _res = attacker.mcmc_random(example, tokenizer, code_pair,
+            _res = yield from attacker.mcmc_random_steps(example, tokenizer, code_pair,
                              _label=ground_truth, _n_candi=30,
-                             _max_iter=400, _prob_threshold=1)
+                             _max_iter=400, _prob_threshold=1, rng=example_rng(args.seed, index))
         else:
-            _res = attacker.mcmc(example, tokenizer, code_pair,
+            _res = yield from attacker.mcmc_steps(example, tokenizer, code_pair,
                              _label=ground_truth, _n_candi=30,
-                             _max_iter=400, _prob_threshold=1)
-                            
-    
+                             _max_iter=400, _prob_threshold=1, rng=example_rng(args.seed, index))
+        return _res, ground_truth, orig_label
+
+    scheduler = AttackScheduler(model, args.eval_batch_size, args.attack_concurrency)
+    jobs = (attack_steps(index, example) for index, example in enumerate(eval_dataset))
+    for index, (result, nb_queries, seconds) in enumerate(scheduler.run(jobs)):
+        if result is None:
+            continue
+        _res, ground_truth, orig_label = result
+        code_pair = source_codes[index]
         if _res['succ'] is None:
             continue
         if _res['succ'] == True:
@@ -212,12 +225,12 @@ if __name__ == "__main__":
         else:
             print ("EXAMPLE "+str(index)+" FAILED.")
         total_cnt += 1
-        print ("  time cost = %.2f min" % ((time.time()-start_time)/60))
-        time_cost = (time.time()-start_time)/60
+        print ("  time cost = %.2f min" % (seconds/60))
+        time_cost = seconds/60
         print ("  ALL EXAMPLE time cost = %.2f min" % ((time.time()-all_start_time)/60))
         print ("  curr succ rate = "+str(n_succ/total_cnt))
-        print("Query times in this attack: ", model.query - query_times)
+        print("Query times in this attack: ", nb_queries)
         print("All Query times: ", model.query)
-        recoder.writemhm(index, code, _res["prog_length"], " ".join(_res['tokens']), ground_truth, orig_label, _res["new_pred"], _res["is_success"], _res["old_uid"], _res["score_info"], _res["nb_changed_var"], _res["nb_changed_pos"], _res["replace_info"], _res["attack_type"], model.query - query_times, time_cost)
-        query_times = model.query
+        print(model.predictor.report())
+        recoder.writemhm(index, code, _res["prog_length"], " ".join(_res['tokens']), ground_truth, orig_label, _res["new_pred"], _res["is_success"], _res["old_uid"], _res["score_info"], _res["nb_changed_var"], _res["nb_changed_pos"], _res["replace_info"], _res["attack_type"], nb_queries, time_cost)
 
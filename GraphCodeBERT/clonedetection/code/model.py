@@ -6,6 +6,8 @@ import copy
 import torch.nn.functional as F
 from torch.nn import CrossEntropyLoss, MSELoss
 from torch.utils.data import SequentialSampler, DataLoader
+from utils import collate_graph_batch, expand_graph_attn_mask, BatchPredictor, model_device
+from utils import graph_input_length, graph_padding_length, trim_graph_padding
 import numpy as np
 
 class RobertaClassificationHead(nn.Module):
@@ -36,10 +38,17 @@ class Model(nn.Module):
         self.classifier=RobertaClassificationHead(config)
         self.args=args
         self.query = 0
+        self.predictor = BatchPredictor(collate_fn=collate_graph_batch,
+                                        cache_size=getattr(args, 'prediction_cache_size', 0),
+                                        length_fn=graph_input_length)
     
         
     def forward(self, inputs_ids_1,position_idx_1,attn_mask_1,inputs_ids_2,position_idx_2,attn_mask_2,labels=None): 
         bs,l=inputs_ids_1.size()
+        if isinstance(attn_mask_1, tuple):
+            # compact graphs of CodePairDataset, expanded on this device
+            attn_mask_1=expand_graph_attn_mask(attn_mask_1, l)
+            attn_mask_2=expand_graph_attn_mask(attn_mask_2, l)
         inputs_ids=torch.cat((inputs_ids_1.unsqueeze(1),inputs_ids_2.unsqueeze(1)),1).view(bs*2,l)
         position_idx=torch.cat((position_idx_1.unsqueeze(1),position_idx_2.unsqueeze(1)),1).view(bs*2,l)
         attn_mask=torch.cat((attn_mask_1.unsqueeze(1),attn_mask_2.unsqueeze(1)),1).view(bs*2,l,l)
@@ -50,7 +59,7 @@ class Model(nn.Module):
         inputs_embeddings=self.encoder.roberta.embeddings.word_embeddings(inputs_ids)
         nodes_to_token_mask=nodes_mask[:,:,None]&token_mask[:,None,:]&attn_mask
         nodes_to_token_mask=nodes_to_token_mask/(nodes_to_token_mask.sum(-1)+1e-10)[:,:,None]
-        avg_embeddings=torch.einsum("abc,acd->abd",nodes_to_token_mask,inputs_embeddings)
+        avg_embeddings=torch.einsum("abc,acd->abd",nodes_to_token_mask.to(inputs_embeddings.dtype),inputs_embeddings)
         inputs_embeddings=inputs_embeddings*(~nodes_mask)[:,:,None]+avg_embeddings*nodes_mask[:,:,None]    
         
         outputs = self.encoder.roberta(inputs_embeds=inputs_embeddings,attention_mask=attn_mask,position_ids=position_idx)[0]
@@ -63,27 +72,36 @@ class Model(nn.Module):
         else:
             return prob
     
+    def train(self, mode=True):
+        # 训练会改变参数, 缓存的预测就不对了 (get_results里的eval()不清空)
+        if mode:
+            self.predictor.cache.clear()
+        return super(Model, self).train(mode)
+
+    def load_state_dict(self, *args, **kwargs):
+        self.predictor.cache.clear()
+        return super(Model, self).load_state_dict(*args, **kwargs)
+
+    def predict_batch(self, batch):
+        (inputs_ids_1,position_idx_1,attn_mask_1,
+            inputs_ids_2,position_idx_2,attn_mask_2,
+            label) = batch
+        # 两段代码都只算到这个batch里最长的输入, forward里它们要一样长
+        length = max(graph_padding_length(attn_mask_1, position_idx_1), graph_padding_length(attn_mask_2, position_idx_2))
+        inputs_ids_1, attn_mask_1, position_idx_1 = trim_graph_padding(inputs_ids_1, attn_mask_1, position_idx_1, length)
+        inputs_ids_2, attn_mask_2, position_idx_2 = trim_graph_padding(inputs_ids_2, attn_mask_2, position_idx_2, length)
+        with torch.no_grad():
+            logit = self.forward(inputs_ids_1,position_idx_1,attn_mask_1,inputs_ids_2,position_idx_2,attn_mask_2)
+        # 和defect detection任务不一样，这个的输出就是softmax值，而非sigmoid值
+        return logit.float().cpu().numpy()
+
     def get_results(self, dataset, batch_size, threshold=0.5):
         '''Given a dataset, return probabilities and labels.'''
         self.query += len(dataset)
-        eval_sampler = SequentialSampler(dataset)
-        eval_dataloader = DataLoader(dataset, sampler=eval_sampler, batch_size=batch_size,num_workers=4,pin_memory=False)
 
         self.eval()
-        logits=[] 
-        labels=[]
-        for batch in eval_dataloader:
-            (inputs_ids_1,position_idx_1,attn_mask_1,
-            inputs_ids_2,position_idx_2,attn_mask_2,
-            label)=[x.to("cuda")  for x in batch]
-            with torch.no_grad():
-                logit = self.forward(inputs_ids_1,position_idx_1,attn_mask_1,inputs_ids_2,position_idx_2,attn_mask_2)
-                logits.append(logit.cpu().numpy())
-                # 和defect detection任务不一样，这个的输出就是softmax值，而非sigmoid值
-                labels.append(label.cpu().numpy())
-
-        logits=np.concatenate(logits,0)
-        labels=np.concatenate(labels,0)
+        # 缓存里没有的样本才会调用predict_batch
+        logits = self.predictor.predict(dataset, batch_size, self.predict_batch, model_device(self))
 
         probs = logits
         pred_labels = [0 if first_softmax  > threshold else 1 for first_softmax in logits[:,0]]
@@ -15,7 +15,7 @@ def DFG_python(root_node,index_to_code,states):
     while_statement=['while_statement']
     do_first_statement=['for_in_clause'] 
     def_statement=['default_parameter']
-    states=states.copy() 
+    # states may be shared with the caller, it is copied before being written to
     if (len(root_node.children)==0 or root_node.type=='string') and root_node.type!='comment':        
         idx,code=index_to_code[(root_node.start_point,root_node.end_point)]
         if root_node.type==code:
@@ -24,6 +24,7 @@ def DFG_python(root_node,index_to_code,states):
             return [(code,idx,'comesFrom',[code],states[code].copy())],states
         else:
             if root_node.type=='identifier':
+                states=states.copy()
                 states[code]=[idx]
             return [(code,idx,'comesFrom',[],[])],states
     elif root_node.type in def_statement:
@@ -32,23 +33,25 @@ def DFG_python(root_node,index_to_code,states):
         DFG=[]
         if value is None:
             indexs=tree_to_variable_index(name,index_to_code)
+            states=states.copy()
             for index in indexs:
                 idx,code=index_to_code[index]
                 DFG.append((code,idx,'comesFrom',[],[]))
                 states[code]=[idx]
-            return sorted(DFG,key=lambda x:x[1]),states
+            return DFG,states
         else:
             name_indexs=tree_to_variable_index(name,index_to_code)
             value_indexs=tree_to_variable_index(value,index_to_code)
             temp,states=DFG_python(value,index_to_code,states)
             DFG+=temp            
+            states=states.copy()
             for index1 in name_indexs:
                 idx1,code1=index_to_code[index1]
                 for index2 in value_indexs:
                     idx2,code2=index_to_code[index2]
                     DFG.append((code1,idx1,'comesFrom',[code2],[idx2]))
                 states[code1]=[idx1]   
-            return sorted(DFG,key=lambda x:x[1]),states        
+            return DFG,states        
     elif root_node.type in assignment:
         if root_node.type=='for_in_clause':
             right_nodes=[root_node.children[-1]]
@@ -70,6 +73,7 @@ def DFG_python(root_node,index_to_code,states):
             temp,states=DFG_python(node,index_to_code,states)
             DFG+=temp
             
+        states=states.copy()
         for left_node,right_node in zip(left_nodes,right_nodes):
             left_tokens_index=tree_to_variable_index(left_node,index_to_code)
             right_tokens_index=tree_to_variable_index(right_node,index_to_code)
@@ -80,10 +84,10 @@ def DFG_python(root_node,index_to_code,states):
                              [index_to_code[x][0] for x in right_tokens_index]))
                 states[code1]=[idx1]
             DFG+=temp        
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in if_statement:
         DFG=[]
-        current_states=states.copy()
+        current_states=states
         others_states=[]
         tag=False
         if 'else' in root_node.type:
@@ -110,7 +114,7 @@ def DFG_python(root_node,index_to_code,states):
                     new_states[key]+=dic[key]
         for key in new_states:
             new_states[key]=sorted(list(set(new_states[key])))
-        return sorted(DFG,key=lambda x:x[1]),new_states
+        return DFG,new_states
     elif root_node.type in for_statement:
         DFG=[]
         for i in range(2):
@@ -126,6 +130,7 @@ def DFG_python(root_node,index_to_code,states):
             for node in right_nodes:
                 temp,states=DFG_python(node,index_to_code,states)
                 DFG+=temp
+            states=states.copy()
             for left_node,right_node in zip(left_nodes,right_nodes):
                 left_tokens_index=tree_to_variable_index(left_node,index_to_code)
                 right_tokens_index=tree_to_variable_index(right_node,index_to_code)
@@ -147,7 +152,7 @@ def DFG_python(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in while_statement:  
         DFG=[]
         for i in range(2):
@@ -162,7 +167,7 @@ def DFG_python(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states        
+        return DFG,states        
     else:
         DFG=[]
         for child in root_node.children:
@@ -174,7 +179,7 @@ def DFG_python(root_node,index_to_code,states):
                 temp,states=DFG_python(child,index_to_code,states)
                 DFG+=temp
         
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
         
 
 def DFG_java(root_node,index_to_code,states):
@@ -186,7 +191,7 @@ def DFG_java(root_node,index_to_code,states):
     enhanced_for_statement=['enhanced_for_statement']
     while_statement=['while_statement']
     do_first_statement=[]    
-    states=states.copy()
+    # states may be shared with the caller, it is copied before being written to
     if (len(root_node.children)==0 or root_node.type=='string') and root_node.type!='comment':
         idx,code=index_to_code[(root_node.start_point,root_node.end_point)]
         if root_node.type==code:
@@ -195,6 +200,7 @@ def DFG_java(root_node,index_to_code,states):
             return [(code,idx,'comesFrom',[code],states[code].copy())],states
         else:
             if root_node.type=='identifier':
+                states=states.copy()
                 states[code]=[idx]
             return [(code,idx,'comesFrom',[],[])],states
     elif root_node.type in def_statement:
@@ -203,23 +209,25 @@ def DFG_java(root_node,index_to_code,states):
         DFG=[]
         if value is None:
             indexs=tree_to_variable_index(name,index_to_code)
+            states=states.copy()
             for index in indexs:
                 idx,code=index_to_code[index]
                 DFG.append((code,idx,'comesFrom',[],[]))
                 states[code]=[idx]
-            return sorted(DFG,key=lambda x:x[1]),states
+            return DFG,states
         else:
             name_indexs=tree_to_variable_index(name,index_to_code)
             value_indexs=tree_to_variable_index(value,index_to_code)
             temp,states=DFG_java(value,index_to_code,states)
             DFG+=temp            
+            states=states.copy()
             for index1 in name_indexs:
                 idx1,code1=index_to_code[index1]
                 for index2 in value_indexs:
                     idx2,code2=index_to_code[index2]
                     DFG.append((code1,idx1,'comesFrom',[code2],[idx2]))
                 states[code1]=[idx1]   
-            return sorted(DFG,key=lambda x:x[1]),states
+            return DFG,states
     elif root_node.type in assignment:
         left_nodes=root_node.child_by_field_name('left')
         right_nodes=root_node.child_by_field_name('right')
@@ -228,26 +236,28 @@ def DFG_java(root_node,index_to_code,states):
         DFG+=temp            
         name_indexs=tree_to_variable_index(left_nodes,index_to_code)
         value_indexs=tree_to_variable_index(right_nodes,index_to_code)        
+        states=states.copy()
         for index1 in name_indexs:
             idx1,code1=index_to_code[index1]
             for index2 in value_indexs:
                 idx2,code2=index_to_code[index2]
                 DFG.append((code1,idx1,'computedFrom',[code2],[idx2]))
             states[code1]=[idx1]   
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in increment_statement:
         DFG=[]
         indexs=tree_to_variable_index(root_node,index_to_code)
+        states=states.copy()
         for index1 in indexs:
             idx1,code1=index_to_code[index1]
             for index2 in indexs:
                 idx2,code2=index_to_code[index2]
                 DFG.append((code1,idx1,'computedFrom',[code2],[idx2]))
             states[code1]=[idx1]
-        return sorted(DFG,key=lambda x:x[1]),states   
+        return DFG,states   
     elif root_node.type in if_statement:
         DFG=[]
-        current_states=states.copy()
+        current_states=states
         others_states=[]
         flag=False
         tag=False
@@ -276,7 +286,7 @@ def DFG_java(root_node,index_to_code,states):
                     new_states[key]+=dic[key]
         for key in new_states:
             new_states[key]=sorted(list(set(new_states[key])))
-        return sorted(DFG,key=lambda x:x[1]),new_states
+        return DFG,new_states
     elif root_node.type in for_statement:
         DFG=[]
         for child in root_node.children:
@@ -297,7 +307,7 @@ def DFG_java(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in enhanced_for_statement:
         name=root_node.child_by_field_name('name')
         value=root_node.child_by_field_name('value')
@@ -308,6 +318,7 @@ def DFG_java(root_node,index_to_code,states):
             DFG+=temp       
             name_indexs=tree_to_variable_index(name,index_to_code)
             value_indexs=tree_to_variable_index(value,index_to_code)        
+            states=states.copy()
             for index1 in name_indexs:
                 idx1,code1=index_to_code[index1]
                 for index2 in value_indexs:
@@ -324,7 +335,7 @@ def DFG_java(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in while_statement:  
         DFG=[]
         for i in range(2):
@@ -339,7 +350,7 @@ def DFG_java(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states        
+        return DFG,states        
     else:
         DFG=[]
         for child in root_node.children:
@@ -351,7 +362,7 @@ def DFG_java(root_node,index_to_code,states):
                 temp,states=DFG_java(child,index_to_code,states)
                 DFG+=temp
         
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
 
 def DFG_csharp(root_node,index_to_code,states):
     assignment=['assignment_expression']
@@ -362,7 +373,7 @@ def DFG_csharp(root_node,index_to_code,states):
     enhanced_for_statement=['for_each_statement']
     while_statement=['while_statement']
     do_first_statement=[]    
-    states=states.copy()
+    # states may be shared with the caller, it is copied before being written to
     if (len(root_node.children)==0 or root_node.type=='string') and root_node.type!='comment':
         idx,code=index_to_code[(root_node.start_point,root_node.end_point)]
         if root_node.type==code:
@@ -371,6 +382,7 @@ def DFG_csharp(root_node,index_to_code,states):
             return [(code,idx,'comesFrom',[code],states[code].copy())],states
         else:
             if root_node.type=='identifier':
+                states=states.copy()
                 states[code]=[idx]
             return [(code,idx,'comesFrom',[],[])],states
     elif root_node.type in def_statement:
@@ -383,23 +395,25 @@ def DFG_csharp(root_node,index_to_code,states):
         DFG=[]
         if value is None:
             indexs=tree_to_variable_index(name,index_to_code)
+            states=states.copy()
             for index in indexs:
                 idx,code=index_to_code[index]
                 DFG.append((code,idx,'comesFrom',[],[]))
                 states[code]=[idx]
-            return sorted(DFG,key=lambda x:x[1]),states
+            return DFG,states
         else:
             name_indexs=tree_to_variable_index(name,index_to_code)
             value_indexs=tree_to_variable_index(value,index_to_code)
             temp,states=DFG_csharp(value,index_to_code,states)
             DFG+=temp            
+            states=states.copy()
             for index1 in name_indexs:
                 idx1,code1=index_to_code[index1]
                 for index2 in value_indexs:
                     idx2,code2=index_to_code[index2]
                     DFG.append((code1,idx1,'comesFrom',[code2],[idx2]))
                 states[code1]=[idx1]   
-            return sorted(DFG,key=lambda x:x[1]),states
+            return DFG,states
     elif root_node.type in assignment:
         left_nodes=root_node.child_by_field_name('left')
         right_nodes=root_node.child_by_field_name('right')
@@ -408,26 +422,28 @@ def DFG_csharp(root_node,index_to_code,states):
         DFG+=temp            
         name_indexs=tree_to_variable_index(left_nodes,index_to_code)
         value_indexs=tree_to_variable_index(right_nodes,index_to_code)        
+        states=states.copy()
         for index1 in name_indexs:
             idx1,code1=index_to_code[index1]
             for index2 in value_indexs:
                 idx2,code2=index_to_code[index2]
                 DFG.append((code1,idx1,'computedFrom',[code2],[idx2]))
             states[code1]=[idx1]   
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in increment_statement:
         DFG=[]
         indexs=tree_to_variable_index(root_node,index_to_code)
+        states=states.copy()
         for index1 in indexs:
             idx1,code1=index_to_code[index1]
             for index2 in indexs:
                 idx2,code2=index_to_code[index2]
                 DFG.append((code1,idx1,'computedFrom',[code2],[idx2]))
             states[code1]=[idx1]
-        return sorted(DFG,key=lambda x:x[1]),states   
+        return DFG,states   
     elif root_node.type in if_statement:
         DFG=[]
-        current_states=states.copy()
+        current_states=states
         others_states=[]
         flag=False
         tag=False
@@ -456,7 +472,7 @@ def DFG_csharp(root_node,index_to_code,states):
                     new_states[key]+=dic[key]
         for key in new_states:
             new_states[key]=sorted(list(set(new_states[key])))
-        return sorted(DFG,key=lambda x:x[1]),new_states
+        return DFG,new_states
     elif root_node.type in for_statement:
         DFG=[]
         for child in root_node.children:
@@ -477,7 +493,7 @@ def DFG_csharp(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in enhanced_for_statement:
         name=root_node.child_by_field_name('left')
         value=root_node.child_by_field_name('right')
@@ -488,6 +504,7 @@ def DFG_csharp(root_node,index_to_code,states):
             DFG+=temp       
             name_indexs=tree_to_variable_index(name,index_to_code)
             value_indexs=tree_to_variable_index(value,index_to_code)        
+            states=states.copy()
             for index1 in name_indexs:
                 idx1,code1=index_to_code[index1]
                 for index2 in value_indexs:
@@ -504,7 +521,7 @@ def DFG_csharp(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in while_statement:  
         DFG=[]
         for i in range(2):
@@ -519,7 +536,7 @@ def DFG_csharp(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states        
+        return DFG,states        
     else:
         DFG=[]
         for child in root_node.children:
@@ -531,7 +548,7 @@ def DFG_csharp(root_node,index_to_code,states):
                 temp,states=DFG_csharp(child,index_to_code,states)
                 DFG+=temp
         
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
 
 
     
@@ -564,7 +581,7 @@ def DFG_ruby(root_node,index_to_code,states):
                 idx,code=index_to_code[index]
                 DFG.append((code,idx,'comesFrom',[],[]))
                 states[code]=[idx]
-            return sorted(DFG,key=lambda x:x[1]),states
+            return DFG,states
         else:
             name_indexs=tree_to_variable_index(name,index_to_code)
             value_indexs=tree_to_variable_index(value,index_to_code)
@@ -576,7 +593,7 @@ def DFG_ruby(root_node,index_to_code,states):
                     idx2,code2=index_to_code[index2]
                     DFG.append((code1,idx1,'comesFrom',[code2],[idx2]))
                 states[code1]=[idx1]   
-            return sorted(DFG,key=lambda x:x[1]),states        
+            return DFG,states        
     elif root_node.type in assignment:
         left_nodes=[x for x in root_node.child_by_field_name('left').children if x.type!=',']
         right_nodes=[x for x in root_node.child_by_field_name('right').children if x.type!=',']
@@ -606,7 +623,7 @@ def DFG_ruby(root_node,index_to_code,states):
                              [index_to_code[x][0] for x in right_tokens_index]))
                 states[code1]=[idx1]
             DFG+=temp        
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in if_statement:
         DFG=[]
         current_states=states.copy()
@@ -636,7 +653,7 @@ def DFG_ruby(root_node,index_to_code,states):
                     new_states[key]+=dic[key]
         for key in new_states:
             new_states[key]=sorted(list(set(new_states[key])))
-        return sorted(DFG,key=lambda x:x[1]),new_states
+        return DFG,new_states
     elif root_node.type in for_statement:
         DFG=[]
         for i in range(2):
@@ -666,7 +683,7 @@ def DFG_ruby(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in while_statement:  
         DFG=[]
         for i in range(2):
@@ -681,7 +698,7 @@ def DFG_ruby(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states        
+        return DFG,states        
     else:
         DFG=[]
         for child in root_node.children:
@@ -693,7 +710,7 @@ def DFG_ruby(root_node,index_to_code,states):
                 temp,states=DFG_ruby(child,index_to_code,states)
                 DFG+=temp
         
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
 
 def DFG_go(root_node,index_to_code,states):
     assignment=['assignment_statement',]
@@ -704,7 +721,7 @@ def DFG_go(root_node,index_to_code,states):
     enhanced_for_statement=[]
     while_statement=[]
     do_first_statement=[]    
-    states=states.copy()
+    # states may be shared with the caller, it is copied before being written to
     if (len(root_node.children)==0 or root_node.type=='string') and root_node.type!='comment':
         idx,code=index_to_code[(root_node.start_point,root_node.end_point)]
         if root_node.type==code:
@@ -713,6 +730,7 @@ def DFG_go(root_node,index_to_code,states):
             return [(code,idx,'comesFrom',[code],states[code].copy())],states
         else:
             if root_node.type=='identifier':
+                states=states.copy()
                 states[code]=[idx]
             return [(code,idx,'comesFrom',[],[])],states
     elif root_node.type in def_statement:
@@ -721,23 +739,25 @@ def DFG_go(root_node,index_to_code,states):
         DFG=[]
         if value is None:
             indexs=tree_to_variable_index(name,index_to_code)
+            states=states.copy()
             for index in indexs:
                 idx,code=index_to_code[index]
                 DFG.append((code,idx,'comesFrom',[],[]))
                 states[code]=[idx]
-            return sorted(DFG,key=lambda x:x[1]),states
+            return DFG,states
         else:
             name_indexs=tree_to_variable_index(name,index_to_code)
             value_indexs=tree_to_variable_index(value,index_to_code)
             temp,states=DFG_go(value,index_to_code,states)
             DFG+=temp            
+            states=states.copy()
             for index1 in name_indexs:
                 idx1,code1=index_to_code[index1]
                 for index2 in value_indexs:
                     idx2,code2=index_to_code[index2]
                     DFG.append((code1,idx1,'comesFrom',[code2],[idx2]))
                 states[code1]=[idx1]   
-            return sorted(DFG,key=lambda x:x[1]),states
+            return DFG,states
     elif root_node.type in assignment:
         left_nodes=root_node.child_by_field_name('left')
         right_nodes=root_node.child_by_field_name('right')
@@ -746,26 +766,28 @@ def DFG_go(root_node,index_to_code,states):
         DFG+=temp            
         name_indexs=tree_to_variable_index(left_nodes,index_to_code)
         value_indexs=tree_to_variable_index(right_nodes,index_to_code)        
+        states=states.copy()
         for index1 in name_indexs:
             idx1,code1=index_to_code[index1]
             for index2 in value_indexs:
                 idx2,code2=index_to_code[index2]
                 DFG.append((code1,idx1,'computedFrom',[code2],[idx2]))
             states[code1]=[idx1]   
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in increment_statement:
         DFG=[]
         indexs=tree_to_variable_index(root_node,index_to_code)
+        states=states.copy()
         for index1 in indexs:
             idx1,code1=index_to_code[index1]
             for index2 in indexs:
                 idx2,code2=index_to_code[index2]
                 DFG.append((code1,idx1,'computedFrom',[code2],[idx2]))
             states[code1]=[idx1]
-        return sorted(DFG,key=lambda x:x[1]),states   
+        return DFG,states   
     elif root_node.type in if_statement:
         DFG=[]
-        current_states=states.copy()
+        current_states=states
         others_states=[]
         flag=False
         tag=False
@@ -799,7 +821,7 @@ def DFG_go(root_node,index_to_code,states):
                 new_states[key]+=states[key]
         for key in new_states:
             new_states[key]=sorted(list(set(new_states[key])))
-        return sorted(DFG,key=lambda x:x[1]),new_states
+        return DFG,new_states
     elif root_node.type in for_statement:
         DFG=[]
         for child in root_node.children:
@@ -823,7 +845,7 @@ def DFG_go(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     else:
         DFG=[]
         for child in root_node.children:
@@ -835,7 +857,7 @@ def DFG_go(root_node,index_to_code,states):
                 temp,states=DFG_go(child,index_to_code,states)
                 DFG+=temp
         
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
 
     
     
@@ -849,7 +871,7 @@ def DFG_php(root_node,index_to_code,states):
     enhanced_for_statement=['foreach_statement']
     while_statement=['while_statement']
     do_first_statement=[]    
-    states=states.copy()
+    # states may be shared with the caller, it is copied before being written to
     if (len(root_node.children)==0 or root_node.type=='string') and root_node.type!='comment':
         idx,code=index_to_code[(root_node.start_point,root_node.end_point)]
         if root_node.type==code:
@@ -858,6 +880,7 @@ def DFG_php(root_node,index_to_code,states):
             return [(code,idx,'comesFrom',[code],states[code].copy())],states
         else:
             if root_node.type=='identifier':
+                states=states.copy()
                 states[code]=[idx]
             return [(code,idx,'comesFrom',[],[])],states
     elif root_node.type in def_statement:
@@ -866,23 +889,25 @@ def DFG_php(root_node,index_to_code,states):
         DFG=[]
         if value is None:
             indexs=tree_to_variable_index(name,index_to_code)
+            states=states.copy()
             for index in indexs:
                 idx,code=index_to_code[index]
                 DFG.append((code,idx,'comesFrom',[],[]))
                 states[code]=[idx]
-            return sorted(DFG,key=lambda x:x[1]),states
+            return DFG,states
         else:
             name_indexs=tree_to_variable_index(name,index_to_code)
             value_indexs=tree_to_variable_index(value,index_to_code)
             temp,states=DFG_php(value,index_to_code,states)
             DFG+=temp            
+            states=states.copy()
             for index1 in name_indexs:
                 idx1,code1=index_to_code[index1]
                 for index2 in value_indexs:
                     idx2,code2=index_to_code[index2]
                     DFG.append((code1,idx1,'comesFrom',[code2],[idx2]))
                 states[code1]=[idx1]   
-            return sorted(DFG,key=lambda x:x[1]),states
+            return DFG,states
     elif root_node.type in assignment:
         left_nodes=root_node.child_by_field_name('left')
         right_nodes=root_node.child_by_field_name('right')
@@ -891,26 +916,28 @@ def DFG_php(root_node,index_to_code,states):
         DFG+=temp            
         name_indexs=tree_to_variable_index(left_nodes,index_to_code)
         value_indexs=tree_to_variable_index(right_nodes,index_to_code)        
+        states=states.copy()
         for index1 in name_indexs:
             idx1,code1=index_to_code[index1]
             for index2 in value_indexs:
                 idx2,code2=index_to_code[index2]
                 DFG.append((code1,idx1,'computedFrom',[code2],[idx2]))
             states[code1]=[idx1]   
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in increment_statement:
         DFG=[]
         indexs=tree_to_variable_index(root_node,index_to_code)
+        states=states.copy()
         for index1 in indexs:
             idx1,code1=index_to_code[index1]
             for index2 in indexs:
                 idx2,code2=index_to_code[index2]
                 DFG.append((code1,idx1,'computedFrom',[code2],[idx2]))
             states[code1]=[idx1]
-        return sorted(DFG,key=lambda x:x[1]),states   
+        return DFG,states   
     elif root_node.type in if_statement:
         DFG=[]
-        current_states=states.copy()
+        current_states=states
         others_states=[]
         flag=False
         tag=False
@@ -942,7 +969,7 @@ def DFG_php(root_node,index_to_code,states):
                 new_states[key]+=states[key]
         for key in new_states:
             new_states[key]=sorted(list(set(new_states[key])))
-        return sorted(DFG,key=lambda x:x[1]),new_states
+        return DFG,new_states
     elif root_node.type in for_statement:
         DFG=[]
         for child in root_node.children:
@@ -963,7 +990,7 @@ def DFG_php(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in enhanced_for_statement:
         name=None
         value=None
@@ -980,6 +1007,7 @@ def DFG_php(root_node,index_to_code,states):
             DFG+=temp       
             name_indexs=tree_to_variable_index(name,index_to_code)
             value_indexs=tree_to_variable_index(value,index_to_code)        
+            states=states.copy()
             for index1 in name_indexs:
                 idx1,code1=index_to_code[index1]
                 for index2 in value_indexs:
@@ -996,7 +1024,7 @@ def DFG_php(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in while_statement:  
         DFG=[]
         for i in range(2):
@@ -1011,7 +1039,7 @@ def DFG_php(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states        
+        return DFG,states        
     else:
         DFG=[]
         for child in root_node.children:
@@ -1023,7 +1051,7 @@ def DFG_php(root_node,index_to_code,states):
                 temp,states=DFG_php(child,index_to_code,states)
                 DFG+=temp
         
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
 
 
 def DFG_javascript(root_node,index_to_code,states):
@@ -1035,7 +1063,7 @@ def DFG_javascript(root_node,index_to_code,states):
     enhanced_for_statement=[]
     while_statement=['while_statement']
     do_first_statement=[]    
-    states=states.copy()
+    # states may be shared with the caller, it is copied before being written to
     if (len(root_node.children)==0 or root_node.type=='string') and root_node.type!='comment':
         idx,code=index_to_code[(root_node.start_point,root_node.end_point)]
         if root_node.type==code:
@@ -1044,6 +1072,7 @@ def DFG_javascript(root_node,index_to_code,states):
             return [(code,idx,'comesFrom',[code],states[code].copy())],states
         else:
             if root_node.type=='identifier':
+                states=states.copy()
                 states[code]=[idx]
             return [(code,idx,'comesFrom',[],[])],states
     elif root_node.type in def_statement:
@@ -1052,23 +1081,25 @@ def DFG_javascript(root_node,index_to_code,states):
         DFG=[]
         if value is None:
             indexs=tree_to_variable_index(name,index_to_code)
+            states=states.copy()
             for index in indexs:
                 idx,code=index_to_code[index]
                 DFG.append((code,idx,'comesFrom',[],[]))
                 states[code]=[idx]
-            return sorted(DFG,key=lambda x:x[1]),states
+            return DFG,states
         else:
             name_indexs=tree_to_variable_index(name,index_to_code)
             value_indexs=tree_to_variable_index(value,index_to_code)
             temp,states=DFG_javascript(value,index_to_code,states)
             DFG+=temp            
+            states=states.copy()
             for index1 in name_indexs:
                 idx1,code1=index_to_code[index1]
                 for index2 in value_indexs:
                     idx2,code2=index_to_code[index2]
                     DFG.append((code1,idx1,'comesFrom',[code2],[idx2]))
                 states[code1]=[idx1]   
-            return sorted(DFG,key=lambda x:x[1]),states
+            return DFG,states
     elif root_node.type in assignment:
         left_nodes=root_node.child_by_field_name('left')
         right_nodes=root_node.child_by_field_name('right')
@@ -1077,26 +1108,28 @@ def DFG_javascript(root_node,index_to_code,states):
         DFG+=temp            
         name_indexs=tree_to_variable_index(left_nodes,index_to_code)
         value_indexs=tree_to_variable_index(right_nodes,index_to_code)        
+        states=states.copy()
         for index1 in name_indexs:
             idx1,code1=index_to_code[index1]
             for index2 in value_indexs:
                 idx2,code2=index_to_code[index2]
                 DFG.append((code1,idx1,'computedFrom',[code2],[idx2]))
             states[code1]=[idx1]   
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in increment_statement:
         DFG=[]
         indexs=tree_to_variable_index(root_node,index_to_code)
+        states=states.copy()
         for index1 in indexs:
             idx1,code1=index_to_code[index1]
             for index2 in indexs:
                 idx2,code2=index_to_code[index2]
                 DFG.append((code1,idx1,'computedFrom',[code2],[idx2]))
             states[code1]=[idx1]
-        return sorted(DFG,key=lambda x:x[1]),states   
+        return DFG,states   
     elif root_node.type in if_statement:
         DFG=[]
-        current_states=states.copy()
+        current_states=states
         others_states=[]
         flag=False
         tag=False
@@ -1130,7 +1163,7 @@ def DFG_javascript(root_node,index_to_code,states):
                 new_states[key]+=states[key]
         for key in new_states:
             new_states[key]=sorted(list(set(new_states[key])))
-        return sorted(DFG,key=lambda x:x[1]),new_states
+        return DFG,new_states
     elif root_node.type in for_statement:
         DFG=[]
         for child in root_node.children:
@@ -1151,7 +1184,7 @@ def DFG_javascript(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
     elif root_node.type in while_statement:  
         DFG=[]
         for i in range(2):
@@ -1166,7 +1199,7 @@ def DFG_javascript(root_node,index_to_code,states):
                 dic[(x[0],x[1],x[2])][0]=list(set(dic[(x[0],x[1],x[2])][0]+x[3]))
                 dic[(x[0],x[1],x[2])][1]=sorted(list(set(dic[(x[0],x[1],x[2])][1]+x[4])))
         DFG=[(x[0],x[1],x[2],y[0],y[1]) for x,y in sorted(dic.items(),key=lambda t:t[0][1])]
-        return sorted(DFG,key=lambda x:x[1]),states    
+        return DFG,states    
     else:
         DFG=[]
         for child in root_node.children:
@@ -1178,7 +1211,7 @@ def DFG_javascript(root_node,index_to_code,states):
                 temp,states=DFG_javascript(child,index_to_code,states)
                 DFG+=temp
         
-        return sorted(DFG,key=lambda x:x[1]),states
+        return DFG,states
 
 
      
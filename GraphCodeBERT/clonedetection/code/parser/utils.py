@@ -7,7 +7,7 @@ def remove_comments_and_docstrings(source,lang):
         Returns 'source' minus comments and docstrings.
         """
         io_obj = StringIO(source)
-        out = ""
+        out = []
         prev_toktype = tokenize.INDENT
         last_lineno = -1
         last_col = 0
@@ -20,7 +20,7 @@ def remove_comments_and_docstrings(source,lang):
             if start_line > last_lineno:
                 last_col = 0
             if start_col > last_col:
-                out += (" " * (start_col - last_col))
+                out.append(" " * (start_col - last_col))
             # Remove comments:
             if token_type == tokenize.COMMENT:
                 pass
@@ -30,14 +30,14 @@ def remove_comments_and_docstrings(source,lang):
             # This is likely a docstring; double-check we're not inside an operator:
                     if prev_toktype != tokenize.NEWLINE:
                         if start_col > 0:
-                            out += token_string
+                            out.append(token_string)
             else:
-                out += token_string
+                out.append(token_string)
             prev_toktype = token_type
             last_col = end_col
             last_lineno = end_line
         temp=[]
-        for x in out.split('\n'):
+        for x in ''.join(out).split('\n'):
             if x.strip()!="":
                 temp.append(x)
         return '\n'.join(temp)
@@ -60,28 +60,39 @@ def remove_comments_and_docstrings(source,lang):
                 temp.append(x)
         return '\n'.join(temp)
 
+def _is_token_node(node):
+    return (node.child_count==0 or node.type=='string') and node.type!='comment'
+
+def _walk_token_nodes(root_node):
+    # iterative pre-order walk with a TreeCursor, yielding the token nodes in
+    # source order (comments are skipped, strings are kept whole)
+    cursor=root_node.walk()
+    while True:
+        node=cursor.node
+        if _is_token_node(node):
+            yield node
+        elif cursor.goto_first_child():
+            continue
+        while not cursor.goto_next_sibling():
+            if not cursor.goto_parent():
+                return
+
 def tree_to_token_index(root_node):
-    if (len(root_node.children)==0 or root_node.type=='string') and root_node.type!='comment':
-        return [(root_node.start_point,root_node.end_point)]
-    else:
-        code_tokens=[]
-        for child in root_node.children:
-            code_tokens+=tree_to_token_index(child)
-        return code_tokens
+    code_tokens=[]
+    append=code_tokens.append
+    for node in _walk_token_nodes(root_node):
+        append((node.start_point,node.end_point))
+    return code_tokens
     
 def tree_to_variable_index(root_node,index_to_code):
-    if (len(root_node.children)==0 or root_node.type=='string') and root_node.type!='comment':
-        index=(root_node.start_point,root_node.end_point)
+    code_tokens=[]
+    append=code_tokens.append
+    for node in _walk_token_nodes(root_node):
+        index=(node.start_point,node.end_point)
         _,code=index_to_code[index]
-        if root_node.type!=code:
-            return [(root_node.start_point,root_node.end_point)]
-        else:
-            return []
-    else:
-        code_tokens=[]
-        for child in root_node.children:
-            code_tokens+=tree_to_variable_index(child,index_to_code)
-        return code_tokens    
+        if node.type!=code:
+            append(index)
+    return code_tokens
 
 def index_to_code_token(index,code):
     start_point=index[0]
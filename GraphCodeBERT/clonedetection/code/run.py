@@ -21,6 +21,7 @@ using a masked language modeling (MLM) loss.
 
 from __future__ import absolute_import, division, print_function
 
+import sys
 import argparse
 import glob
 import logging
@@ -38,7 +39,10 @@ from transformers import (WEIGHTS_NAME, AdamW, get_linear_schedule_with_warmup,
                           RobertaConfig, RobertaForSequenceClassification, RobertaTokenizer)
 from tqdm import tqdm, trange
 import multiprocessing
+sys.path.append('../../../')
+sys.path.append('../../../python_parser')
 from model import Model
+from utils import get_graph_attn_index, get_graph_attn_mask_from_index
 
 cpu_cont = 16
 logger = logging.getLogger(__name__)
@@ -91,6 +95,7 @@ def extract_dataflow(code, parser,lang):
             DFG,_=parser[1](root_node,index_to_code,{}) 
         except:
             DFG=[]
+        #the DFG functions leave the edges in traversal order, sort them once here
         DFG=sorted(DFG,key=lambda x:x[1])
         indexs=set()
         for d in DFG:
@@ -272,64 +277,28 @@ class TextDataset(Dataset):
                 logger.info("position_idx_2: {}".format(example.position_idx_2))
                 logger.info("dfg_to_code_2: {}".format(' '.join(map(str, example.dfg_to_code_2))))
                 logger.info("dfg_to_dfg_2: {}".format(' '.join(map(str, example.dfg_to_dfg_2))))
-
+        #the graphs of every example are indexed once, not on every access
+        self.attn_index_1=[get_graph_attn_index(x.input_ids_1, x.position_idx_1, x.dfg_to_code_1, x.dfg_to_dfg_1) for x in self.examples]
+        self.attn_index_2=[get_graph_attn_index(x.input_ids_2, x.position_idx_2, x.dfg_to_code_2, x.dfg_to_dfg_2) for x in self.examples]
 
     def __len__(self):
         return len(self.examples)
     
     def __getitem__(self, item):
         #calculate graph-guided masked function
-        attn_mask_1= np.zeros((self.args.code_length+self.args.data_flow_length,
-                        self.args.code_length+self.args.data_flow_length),dtype=np.bool)
-        #calculate begin index of node and max length of input
-        node_index=sum([i>1 for i in self.examples[item].position_idx_1])
-        max_length=sum([i!=1 for i in self.examples[item].position_idx_1])
-        #sequence can attend to sequence
-        attn_mask_1[:node_index,:node_index]=True
-        #special tokens attend to all tokens
-        for idx,i in enumerate(self.examples[item].input_ids_1):
-            if i in [0,2]:
-                attn_mask_1[idx,:max_length]=True
-        #nodes attend to code tokens that are identified from
-        for idx,(a,b) in enumerate(self.examples[item].dfg_to_code_1):
-            if a<node_index and b<node_index:
-                attn_mask_1[idx+node_index,a:b]=True
-                attn_mask_1[a:b,idx+node_index]=True
-        #nodes attend to adjacent nodes 
-        for idx,nodes in enumerate(self.examples[item].dfg_to_dfg_1):
-            for a in nodes:
-                if a+node_index<len(self.examples[item].position_idx_1):
-                    attn_mask_1[idx+node_index,a+node_index]=True  
+        attn_mask_1=get_graph_attn_mask_from_index(self.attn_index_1[item],
+                                                   self.args.code_length+self.args.data_flow_length)
                     
         #calculate graph-guided masked function
-        attn_mask_2= np.zeros((self.args.code_length+self.args.data_flow_length,
-                        self.args.code_length+self.args.data_flow_length),dtype=np.bool)
-        #calculate begin index of node and max length of input
-        node_index=sum([i>1 for i in self.examples[item].position_idx_2])
-        max_length=sum([i!=1 for i in self.examples[item].position_idx_2])
-        #sequence can attend to sequence
-        attn_mask_2[:node_index,:node_index]=True
-        #special tokens attend to all tokens
-        for idx,i in enumerate(self.examples[item].input_ids_2):
-            if i in [0,2]:
-                attn_mask_2[idx,:max_length]=True
-        #nodes attend to code tokens that are identified from
-        for idx,(a,b) in enumerate(self.examples[item].dfg_to_code_2):
-            if a<node_index and b<node_index:
-                attn_mask_2[idx+node_index,a:b]=True
-                attn_mask_2[a:b,idx+node_index]=True
-        #nodes attend to adjacent nodes 
-        for idx,nodes in enumerate(self.examples[item].dfg_to_dfg_2):
-            for a in nodes:
-                if a+node_index<len(self.examples[item].position_idx_2):
-                    attn_mask_2[idx+node_index,a+node_index]=True                      
+        attn_mask_2=get_graph_attn_mask_from_index(self.attn_index_2[item],
+                                                   self.args.code_length+self.args.data_flow_length)
                     
         return (torch.tensor(self.examples[item].input_ids_1),
                 torch.tensor(self.examples[item].position_idx_1),
-                torch.tensor(attn_mask_1), 
+                torch.from_numpy(attn_mask_1), 
                 torch.tensor(self.examples[item].input_ids_2),
                 torch.tensor(self.examples[item].position_idx_2),
-                torch.tensor(attn_mask_2),                 
+                torch.from_numpy(attn_mask_2),                 
                 torch.tensor(self.examples[item].label))
 
 
@@ -0,0 +1,124 @@
+'''
+Per-call latency of the batches Model.get_results iterates over: the
+DataLoader(num_workers=4) it used to build on every call against the
+in-process BatchPredictor of utils.py. One call predicts `batch_size` items,
+like one greedy/GA/MHM query. Everything runs on CPU, no model is needed.
+
+Examples:
+    python bench_predictor.py
+    python bench_predictor.py --task graphcodebert --graph_task clone --tokenizer_name microsoft/graphcodebert-base \
+        --data_file CodeXGLUE/Clone-detection-BigCloneBench/dataset/test_subs_0_500.jsonl
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, SequentialSampler, TensorDataset
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python_parser'))
+
+
+def codebert_dataset(size, block_size):
+    # what CodeDataset/TextDataset return: (input_ids, label)
+    generator = torch.Generator().manual_seed(0)
+    input_ids = torch.randint(3, 50000, (size, block_size), generator=generator)
+    labels = torch.randint(0, 2, (size,), generator=generator)
+    return TensorDataset(input_ids, labels), None
+
+
+def graphcodebert_dataset(size, args):
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'GraphCodeBERT'))
+    from bench_attn_mask import load_codes, build_features
+    from transformers import RobertaTokenizer
+    from utils import GraphCodeDataset, CodePairDataset, collate_graph_batch
+    tokenizer = RobertaTokenizer.from_pretrained(args.tokenizer_name)
+    codes = load_codes(os.path.abspath(args.data_file), size)
+    codes = (codes * (size // len(codes) + 1))[:size]
+    features = build_features(args.graph_task, codes, tokenizer, args)
+    if args.graph_task == 'clone':
+        return CodePairDataset(features, args), collate_graph_batch
+    return GraphCodeDataset(features, args), collate_graph_batch
+
+
+def dataloader_batches(dataset, batch_size, collate_fn):
+    # the DataLoader Model.get_results built before
+    kwargs = {} if collate_fn is None else {'collate_fn': collate_fn}
+    eval_dataloader = DataLoader(dataset, sampler=SequentialSampler(dataset), batch_size=batch_size,
+                                 num_workers=4, pin_memory=False, **kwargs)
+    return list(eval_dataloader)
+
+
+def predictor_batches(dataset, batch_size, collate_fn):
+    from utils import BatchPredictor
+    predictor = BatchPredictor(device='cpu') if collate_fn is None else BatchPredictor(collate_fn, device='cpu')
+    return list(predictor.batches(dataset, batch_size))
+
+
+def same_batches(batches_1, batches_2):
+    if len(batches_1) != len(batches_2):
+        return False
+    for batch_1, batch_2 in zip(batches_1, batches_2):
+        for value_1, value_2 in zip(batch_1, batch_2):
+            values_1 = value_1 if isinstance(value_1, tuple) else (value_1,)
+            values_2 = value_2 if isinstance(value_2, tuple) else (value_2,)
+            if not all(torch.equal(x, y) for x, y in zip(values_1, values_2)):
+                return False
+    return True
+
+
+def bench(dataset, collate_fn, batch_size, repeat):
+    from torch.utils.data import Subset
+    calls = Subset(dataset, range(batch_size))
+    assert same_batches(dataloader_batches(calls, batch_size, collate_fn), predictor_batches(calls, batch_size, collate_fn))
+    results = {}
+    for name, batches in [('dataloader', dataloader_batches), ('predictor', predictor_batches)]:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            batches(calls, batch_size, collate_fn)
+            times.append(time.perf_counter() - start)
+        results[name] = 1000 * np.array(times)
+    print("batch size %3d: dataloader mean %.2f ms (p50 %.2f), predictor mean %.2f ms (p50 %.2f), x%.1f" % \
+        (batch_size, results['dataloader'].mean(), np.median(results['dataloader']),
+        results['predictor'].mean(), np.median(results['predictor']),
+        results['dataloader'].mean() / results['predictor'].mean()), flush=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--task", default="codebert", type=str, choices=['codebert', 'graphcodebert'],
+                        help="codebert: random (input_ids, label) items, graphcodebert: features built from data_file.")
+    parser.add_argument("--graph_task", default="defect", type=str, choices=['defect', 'authorship', 'clone'],
+                        help="GraphCodeBERT task whose features are built.")
+    parser.add_argument("--tokenizer_name", default="microsoft/graphcodebert-base", type=str,
+                        help="Tokenizer of the GraphCodeBERT model.")
+    parser.add_argument("--data_file", default=None, type=str,
+                        help="jsonl file with a \"func\", \"code1\"/\"code2\" or \"code\" field.")
+    parser.add_argument("--batch_sizes", nargs='+', default=[1, 16, 64], type=int,
+                        help="Number of items predicted by one call.")
+    parser.add_argument("--repeat", default=20, type=int,
+                        help="Number of timed calls per batch size.")
+    parser.add_argument("--block_size", default=512, type=int,
+                        help="Length of the CodeBERT inputs.")
+    parser.add_argument("--code_length", default=512, type=int,
+                        help="Maximum number of code tokens.")
+    parser.add_argument("--data_flow_length", default=128, type=int,
+                        help="Maximum number of data flow nodes.")
+    args = parser.parse_args()
+
+    size = max(args.batch_sizes)
+    if args.task == 'codebert':
+        dataset, collate_fn = codebert_dataset(size, args.block_size)
+    else:
+        dataset, collate_fn = graphcodebert_dataset(size, args)
+    for batch_size in args.batch_sizes:
+        bench(dataset, collate_fn, batch_size, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+'''
+Micro-benchmarks for the parsing hot path. No model is needed, everything
+runs on CPU.
+
+Examples:
+    python python_parser/bench_parser.py --bench tree_walk
+    python python_parser/bench_parser.py --bench tree_walk \
+        --data_file CodeXGLUE/Defect-detection/preprocess/dataset/test_subs_0_400.jsonl --lang c
+    python python_parser/bench_parser.py --bench dfg --reference_rev HEAD~1 --lang java \
+        --data_file CodeXGLUE/Clone-detection-BigCloneBench/dataset/test_subs_0_500.jsonl
+    python python_parser/bench_parser.py --bench import_time
+
+The suite benchmark reports the per-call latency percentiles and throughput
+of the parsing API, and can be checked against a previous run:
+    python python_parser/bench_parser.py --bench suite --lang python --limit 200 \
+        --data_file CodeXGLUE/Authorship-Attribution/dataset/data_folder/processed_gcjpy/valid.txt \
+        --save_json suite.json
+    python python_parser/bench_parser.py --bench suite --lang java --data_file data.jsonl \
+        --pairs_file CodeXGLUE/Clone-detection-BigCloneBench/dataset/test_sampled_0_500.txt \
+        --baseline suite.json
+'''
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append('.')
+sys.path.append('../')
+
+import run_parser
+from run_parser import parsers, codes, dfg_function
+from parser_folder import tree_to_token_index, tree_to_variable_index, index_to_code_token
+
+
+def recursive_tree_to_token_index(root_node):
+    # the recursive implementation tree_to_token_index replaced, kept as reference
+    if (len(root_node.children)==0 or root_node.type=='string') and root_node.type!='comment':
+        return [(root_node.start_point,root_node.end_point)]
+    else:
+        code_tokens=[]
+        for child in root_node.children:
+            code_tokens+=recursive_tree_to_token_index(child)
+        return code_tokens
+
+def recursive_tree_to_variable_index(root_node,index_to_code):
+    if root_node:
+        if (len(root_node.children)==0 or root_node.type=='string') and root_node.type!='comment':
+            index=(root_node.start_point,root_node.end_point)
+            _,code=index_to_code[index]
+            if root_node.type!=code:
+                return [(root_node.start_point,root_node.end_point)]
+            else:
+                return []
+        else:
+            code_tokens=[]
+            for child in root_node.children:
+                code_tokens+=recursive_tree_to_variable_index(child,index_to_code)
+            return code_tokens
+    else:
+        return []
+
+
+def load_codes(data_file, lang, limit=None, pairs_file=None):
+    '''
+    Read codes from one of the data files of the repo:
+    *.jsonl with a "func", "code1" or "code" field (Devign, BigCloneBench,
+    the substitutes of gcjpy) or
+    the "<CODESPLIT>" txt files of the authorship attribution task.
+    With pairs_file (the BigCloneBench "id1\tid2\tlabel" files), data_file is
+    the data.jsonl of BigCloneBench and the functions of the pairs are read,
+    in order and once each.
+    '''
+    if data_file is None:
+        return [codes[lang]]
+    if pairs_file is not None:
+        url_to_code = {}
+        with open(data_file) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    js = json.loads(line)
+                    url_to_code[js['idx']] = js['func']
+        result = []
+        seen = set()
+        with open(pairs_file) as f:
+            for line in f:
+                for url in line.strip().split('\t')[:2]:
+                    if url in url_to_code and url not in seen:
+                        seen.add(url)
+                        result.append(url_to_code[url])
+                if limit is not None and len(result) >= limit:
+                    return result[:limit]
+        return result
+    result = []
+    with open(data_file) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if data_file.endswith('.jsonl'):
+                item = json.loads(line)
+                if 'func' in item:
+                    result.append(item['func'])
+                elif 'code1' in item:
+                    result.append(item['code1'])
+                else:
+                    result.append(item['code'].replace("\\n", "\n"))
+            else:
+                result.append(line.split(' <CODESPLIT> ')[0].replace("\\n", "\n"))
+            if limit is not None and len(result) >= limit:
+                break
+    return result
+
+
+def percentile(sorted_values, q):
+    # nearest-rank percentile of an already sorted list
+    rank = max(int(round(q / 100.0 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def timeit(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_tree_walk(code_list, lang, repeat):
+    '''Recursive vs. cursor based tree_to_token_index / tree_to_variable_index.'''
+    total_old = 0.0
+    total_new = 0.0
+    for code in code_list:
+        tree = parsers[lang][0].parse(bytes(code, 'utf8'))
+        root_node = tree.root_node
+        tokens_index = tree_to_token_index(root_node)
+        assert tokens_index == recursive_tree_to_token_index(root_node)
+        lines = code.split('\n')
+        index_to_code = {}
+        for idx, index in enumerate(tokens_index):
+            index_to_code[index] = (idx, index_to_code_token(index, lines))
+        assert tree_to_variable_index(root_node, index_to_code) == recursive_tree_to_variable_index(root_node, index_to_code)
+
+        total_old += timeit(lambda: recursive_tree_to_variable_index(root_node, index_to_code), repeat)
+        total_old += timeit(lambda: recursive_tree_to_token_index(root_node), repeat)
+        total_new += timeit(lambda: tree_to_variable_index(root_node, index_to_code), repeat)
+        total_new += timeit(lambda: tree_to_token_index(root_node), repeat)
+    print("tree_walk %s: %d codes, recursive %.3f ms/code, cursor %.3f ms/code, speedup x%.2f" % \
+        (lang, len(code_list),
+        1000 * total_old / len(code_list),
+        1000 * total_new / len(code_list),
+        total_old / max(total_new, 1e-12)), flush=True)
+
+
+def load_reference_package(rev, src_dir, names, package):
+    '''
+    Import the modules names of the package in src_dir as they are at the git
+    revision rev, as a package of its own called package. The modules stay
+    loaded once imported, the extracted files are removed.
+    '''
+    if package not in sys.modules:
+        with tempfile.TemporaryDirectory(prefix='dfg_ref_') as ref_dir:
+            open(os.path.join(ref_dir, '__init__.py'), 'w').close()
+            for name in names:
+                source = subprocess.run(['git', 'show', '%s:./%s.py' % (rev, name)],
+                                        cwd=src_dir, check=True, stdout=subprocess.PIPE).stdout
+                with open(os.path.join(ref_dir, name + '.py'), 'wb') as f:
+                    f.write(source)
+            spec = importlib.util.spec_from_file_location(package, os.path.join(ref_dir, '__init__.py'),
+                                                          submodule_search_locations=[ref_dir])
+            sys.modules[package] = importlib.util.module_from_spec(spec)
+            try:
+                spec.loader.exec_module(sys.modules[package])
+                for name in names:
+                    importlib.import_module('%s.%s' % (package, name))
+            except BaseException:
+                for name in [name for name in sys.modules if name.split('.')[0] == package]:
+                    del sys.modules[name]
+                raise
+    return sys.modules[package]
+
+
+def load_reference_dfg(rev, lang):
+    '''
+    Import the DFG function of lang as it is at the git revision rev, to check
+    the current one against it.
+    '''
+    parser_folder_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_folder')
+    # every (lang, rev) gets a package of its own
+    package = 'ref_parser_folder_%s_%s' % (lang, re.sub(r'\W', '_', rev))
+    load_reference_package(rev, parser_folder_dir, ['utils', 'DFG_%s' % lang], package)
+    return getattr(sys.modules['%s.DFG_%s' % (package, lang)], 'DFG_%s' % lang)
+
+
+def bench_dfg(code_list, lang, repeat, reference_rev=None):
+    '''
+    DFG build time per function. With reference_rev, the edges are also
+    checked against the DFG function of that git revision.
+    '''
+    dfg_func = dfg_function[lang]
+    ref_func = load_reference_dfg(reference_rev, lang) if reference_rev is not None else None
+    total_new = 0.0
+    total_ref = 0.0
+    nb_diff = 0
+    for code in code_list:
+        root_node = parsers[lang][0].parse(bytes(code, 'utf8')).root_node
+        lines = code.split('\n')
+        index_to_code = {}
+        for idx, index in enumerate(tree_to_token_index(root_node)):
+            index_to_code[index] = (idx, index_to_code_token(index, lines))
+        build = lambda: sorted(dfg_func(root_node, index_to_code, {})[0], key=lambda x: x[1])
+        total_new += timeit(build, repeat)
+        if ref_func is not None:
+            build_ref = lambda: sorted(ref_func(root_node, index_to_code, {})[0], key=lambda x: x[1])
+            if build() != build_ref():
+                nb_diff += 1
+            total_ref += timeit(build_ref, repeat)
+    print("dfg %s: %d codes, %.3f ms/code" % (lang, len(code_list), 1000 * total_new / len(code_list)), flush=True)
+    if ref_func is not None:
+        print("dfg %s: %s %.3f ms/code, speedup x%.2f, %d codes differ" % \
+            (lang, reference_rev, 1000 * total_ref / len(code_list),
+            total_ref / max(total_new, 1e-12), nb_diff), flush=True)
+    return nb_diff == 0
+
+
+def remove_comments(code, lang):
+    # as in extract_dataflow, the codes tokenize fails on are kept as they are
+    try:
+        return run_parser.remove_comments_and_docstrings(code, lang)
+    except Exception:
+        return code
+
+
+def suite_calls(code, lang):
+    '''
+    The calls of the suite for one code, as (name, thunk). The renaming calls
+    use the first identifiers of the code, renamed with a suffix.
+    '''
+    identifiers = [x[0] for x in run_parser.get_identifiers(code, lang)[0]]
+    calls = [
+        ('remove_comments', lambda: remove_comments(code, lang)),
+        ('extract_dataflow', lambda: run_parser.extract_dataflow(code, lang)),
+        ('get_identifiers', lambda: run_parser.get_identifiers(code, lang)),
+    ]
+    if identifiers:
+        tgt_word = identifiers[0]
+        chromesome = dict((x, x + '_1') for x in identifiers[:3])
+        calls.append(('get_example', lambda: run_parser.get_example(code, tgt_word, tgt_word + '_1', lang)))
+        calls.append(('get_example_batch', lambda: run_parser.get_example_batch(code, chromesome, lang)))
+    return calls
+
+
+def bench_suite(code_list, lang, repeat):
+    '''
+    Per-call latency percentiles and throughput of the parsing API. The on-disk
+    and in-memory parse caches are off, so every call parses.
+    '''
+    cache_enabled = run_parser.dataflow_cache.enabled
+    run_parser.dataflow_cache.enabled = False
+    latencies = {}
+    try:
+        for code in code_list:
+            run_parser.clear_parse_cache()
+            for name, call in suite_calls(code, lang):
+                times = latencies.setdefault(name, [])
+                for _ in range(repeat):
+                    run_parser.clear_parse_cache()
+                    start = time.perf_counter()
+                    call()
+                    times.append(time.perf_counter() - start)
+    finally:
+        run_parser.dataflow_cache.enabled = cache_enabled
+    results = {}
+    for name, times in latencies.items():
+        times.sort()
+        results[name] = {
+            'calls': len(times),
+            'p50_ms': 1000 * percentile(times, 50),
+            'p90_ms': 1000 * percentile(times, 90),
+            'p99_ms': 1000 * percentile(times, 99),
+            'max_ms': 1000 * times[-1],
+            'calls_per_s': len(times) / max(sum(times), 1e-12),
+        }
+        print("%s %-17s %6d calls, p50 %8.3f ms, p90 %8.3f ms, p99 %8.3f ms, max %8.3f ms, %9.1f calls/s" % \
+            ((lang, name) + tuple(results[name][k] for k in ['calls', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'calls_per_s'])),
+            flush=True)
+    return results
+
+
+def check_regressions(results, baseline, max_regression):
+    '''
+    Compare the p50 latencies of a suite run with a saved one. Returns False
+    when a call got slower than the baseline by more than max_regression.
+    '''
+    ok = True
+    for lang, lang_results in results.items():
+        for name, stats in lang_results.items():
+            old = baseline.get(lang, {}).get(name)
+            if old is None:
+                continue
+            ratio = stats['p50_ms'] / max(old['p50_ms'], 1e-9)
+            if ratio > 1 + max_regression:
+                ok = False
+                print("REGRESSION %s %s: p50 %.3f ms -> %.3f ms (x%.2f)" % \
+                    (lang, name, old['p50_ms'], stats['p50_ms'], ratio), flush=True)
+    return ok
+
+
+def bench_import_time(repeat, target_ms):
+    '''
+    Wall time of `import run_parser` in a fresh interpreter, minus the start up
+    of the interpreter itself. Parsers are built lazily, so this must stay small.
+    '''
+    python_parser_dir = os.path.dirname(os.path.abspath(__file__))
+    def run(statement):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=python_parser_dir, check=True)
+        return time.perf_counter() - start
+    baseline = sorted(run('pass') for _ in range(repeat))[repeat // 2]
+    with_import = sorted(run('import run_parser') for _ in range(repeat))[repeat // 2]
+    import_ms = 1000 * (with_import - baseline)
+    print("import run_parser: %.1f ms (median of %d, target %.1f ms) %s" % \
+        (import_ms, repeat, target_ms, 'OK' if import_ms <= target_ms else 'SLOW'), flush=True)
+    return import_ms <= target_ms
+
+
+BENCHES = {
+    'tree_walk': bench_tree_walk,
+    'dfg': bench_dfg,
+    'suite': bench_suite,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bench", default="tree_walk", type=str, choices=list(BENCHES.keys()) + ['import_time'],
+                        help="Which benchmark to run.")
+    parser.add_argument("--lang", default=None, type=str,
+                        help="Language of the codes. Default: all the sample codes of run_parser.")
+    parser.add_argument("--data_file", default=None, type=str,
+                        help="Optional data file to draw the codes from.")
+    parser.add_argument("--pairs_file", default=None, type=str,
+                        help="BigCloneBench pairs file, whose functions are read from data_file (data.jsonl).")
+    parser.add_argument("--limit", default=None, type=int,
+                        help="Maximum number of codes read from data_file.")
+    parser.add_argument("--repeat", default=10, type=int,
+                        help="Number of timed runs per code.")
+    parser.add_argument("--import_target_ms", default=150.0, type=float,
+                        help="Budget for `import run_parser`, checked by the import_time benchmark.")
+    parser.add_argument("--reference_rev", default=None, type=str,
+                        help="Git revision whose DFG functions the dfg benchmark checks the current ones against.")
+    parser.add_argument("--save_json", default=None, type=str,
+                        help="Where to save the results of the suite benchmark.")
+    parser.add_argument("--baseline", default=None, type=str,
+                        help="Results of a previous suite run to check for regressions.")
+    parser.add_argument("--max_regression", default=0.2, type=float,
+                        help="Largest relative p50 slowdown over the baseline accepted by the suite benchmark.")
+    args = parser.parse_args()
+    if args.bench == 'import_time':
+        sys.exit(0 if bench_import_time(args.repeat, args.import_target_ms) else 1)
+    if args.data_file is not None and args.lang is None:
+        parser.error("--lang is required with --data_file")
+
+    langs = [args.lang] if args.lang is not None else list(codes.keys())
+    ok = True
+    suite_results = {}
+    for lang in langs:
+        code_list = load_codes(args.data_file, lang, args.limit, args.pairs_file)
+        if args.bench == 'dfg':
+            ok = bench_dfg(code_list, lang, args.repeat, args.reference_rev) and ok
+        elif args.bench == 'suite':
+            suite_results[lang] = bench_suite(code_list, lang, args.repeat)
+        else:
+            BENCHES[args.bench](code_list, lang, args.repeat)
+    if args.save_json is not None:
+        with open(args.save_json, 'w') as f:
+            json.dump(suite_results, f, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            ok = check_regressions(suite_results, json.load(f), args.max_regression) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+'''
+Which names count as renamable identifiers, for every language.
+
+The keyword, macro and special-id lists used to be copied in utils.py and
+run_parser.py and scanned with `in` for every candidate. They now live here
+only, and each language gets one IdentifierPolicy built from frozensets:
+
+    policy = get_identifier_policy('c')
+    policy.is_valid('buf')                    # memoized
+    policy.filter(candidates)                 # a whole candidate pool at once
+
+mhm_uid_policy is the (C oriented) isUID check of the MHM attack.
+'''
+from functools import lru_cache
+from keyword import kwlist
+
+python_keywords = ['import', '', '[', ']', ':', ',', '.', '(', ')', '{', '}', 'not', 'is', '=', "+=", '-=', "<", ">",
+                   '+', '-', '*', '/', 'False', 'None', 'True', 'and', 'as', 'assert', 'async', 'await', 'break',
+                   'class', 'continue', 'def', 'del', 'elif', 'else', 'except', 'finally', 'for', 'from', 'global',
+                   'if', 'import', 'in', 'is', 'lambda', 'nonlocal', 'not', 'or', 'pass', 'raise', 'return', 'try',
+                   'while', 'with', 'yield']
+java_keywords = ["abstract", "assert", "boolean", "break", "byte", "case", "catch", "do", "double", "else", "enum",
+                 "extends", "final", "finally", "float", "for", "goto", "if", "implements", "import", "instanceof",
+                 "int", "interface", "long", "native", "new", "package", "private", "protected", "public", "return",
+                 "short", "static", "strictfp", "super", "switch", "throws", "transient", "try", "void", "volatile",
+                 "while"]
+java_special_ids = ["main", "args", "Math", "System", "Random", "Byte", "Short", "Integer", "Long", "Float", "Double", "Character",
+                    "Boolean", "Data", "ParseException", "SimpleDateFormat", "Calendar", "Object", "String", "StringBuffer",
+                    "StringBuilder", "DateFormat", "Collection", "List", "Map", "Set", "Queue", "ArrayList", "HashSet", "HashMap"]
+c_keywords = ["auto", "break", "case", "char", "const", "continue",
+                 "default", "do", "double", "else", "enum", "extern",
+                 "float", "for", "goto", "if", "inline", "int", "long",
+                 "register", "restrict", "return", "short", "signed",
+                 "sizeof", "static", "struct", "switch", "typedef",
+                 "union", "unsigned", "void", "volatile", "while",
+                 "_Alignas", "_Alignof", "_Atomic", "_Bool", "_Complex",
+                 "_Generic", "_Imaginary", "_Noreturn", "_Static_assert",
+                 "_Thread_local", "__func__"]
+
+c_macros = ["NULL", "_IOFBF", "_IOLBF", "BUFSIZ", "EOF", "FOPEN_MAX", "TMP_MAX",  # <stdio.h> macro
+              "FILENAME_MAX", "L_tmpnam", "SEEK_CUR", "SEEK_END", "SEEK_SET",
+              "NULL", "EXIT_FAILURE", "EXIT_SUCCESS", "RAND_MAX", "MB_CUR_MAX"]     # <stdlib.h> macro
+c_special_ids = ["main",  # main function
+                   "stdio", "cstdio", "stdio.h",                                # <stdio.h> & <cstdio>
+                   "size_t", "FILE", "fpos_t", "stdin", "stdout", "stderr",     # <stdio.h> types & streams
+                   "remove", "rename", "tmpfile", "tmpnam", "fclose", "fflush", # <stdio.h> functions
+                   "fopen", "freopen", "setbuf", "setvbuf", "fprintf", "fscanf",
+                   "printf", "scanf", "snprintf", "sprintf", "sscanf", "vprintf",
+                   "vscanf", "vsnprintf", "vsprintf", "vsscanf", "fgetc", "fgets",
+                   "fputc", "getc", "getchar", "putc", "putchar", "puts", "ungetc",
+                   "fread", "fwrite", "fgetpos", "fseek", "fsetpos", "ftell",
+                   "rewind", "clearerr", "feof", "ferror", "perror", "getline"
+                   "stdlib", "cstdlib", "stdlib.h",                             # <stdlib.h> & <cstdlib>
+                   "size_t", "div_t", "ldiv_t", "lldiv_t",                      # <stdlib.h> types
+                   "atof", "atoi", "atol", "atoll", "strtod", "strtof", "strtold",  # <stdlib.h> functions
+                   "strtol", "strtoll", "strtoul", "strtoull", "rand", "srand",
+                   "aligned_alloc", "calloc", "malloc", "realloc", "free", "abort",
+                   "atexit", "exit", "at_quick_exit", "_Exit", "getenv",
+                   "quick_exit", "system", "bsearch", "qsort", "abs", "labs",
+                   "llabs", "div", "ldiv", "lldiv", "mblen", "mbtowc", "wctomb",
+                   "mbstowcs", "wcstombs",
+                   "string", "cstring", "string.h",                                 # <string.h> & <cstring>
+                   "memcpy", "memmove", "memchr", "memcmp", "memset", "strcat",     # <string.h> functions
+                   "strncat", "strchr", "strrchr", "strcmp", "strncmp", "strcoll",
+                   "strcpy", "strncpy", "strerror", "strlen", "strspn", "strcspn",
+                   "strpbrk" ,"strstr", "strtok", "strxfrm",
+                   "memccpy", "mempcpy", "strcat_s", "strcpy_s", "strdup",      # <string.h> extension functions
+                   "strerror_r", "strlcat", "strlcpy", "strsignal", "strtok_r",
+                   "iostream", "istream", "ostream", "fstream", "sstream",      # <iostream> family
+                   "iomanip", "iosfwd",
+                   "ios", "wios", "streamoff", "streampos", "wstreampos",       # <iostream> types
+                   "streamsize", "cout", "cerr", "clog", "cin",
+                   "boolalpha", "noboolalpha", "skipws", "noskipws", "showbase",    # <iostream> manipulators
+                   "noshowbase", "showpoint", "noshowpoint", "showpos",
+                   "noshowpos", "unitbuf", "nounitbuf", "uppercase", "nouppercase",
+                   "left", "right", "internal", "dec", "oct", "hex", "fixed",
+                   "scientific", "hexfloat", "defaultfloat", "width", "fill",
+                   "precision", "endl", "ends", "flush", "ws", "showpoint",
+                   "sin", "cos", "tan", "asin", "acos", "atan", "atan2", "sinh",    # <math.h> functions
+                   "cosh", "tanh", "exp", "sqrt", "log", "log10", "pow", "powf",
+                   "ceil", "floor", "abs", "fabs", "cabs", "frexp", "ldexp",
+                   "modf", "fmod", "hypot", "ldexp", "poly", "matherr"]
+
+special_char = ['[', ']', ':', ',', '.', '(', ')', '{', '}', 'not', 'is', '=', "+=", '-=', "<", ">", '+', '-', '*', '/',
+                '|']
+
+c_ops = ["...", ">>=", "<<=", "+=", "-=", "*=", "/=", "%=", "&=", "^=", "|=",
+         ">>", "<<", "++", "--", "->", "&&", "||", "<=", ">=", "==", "!=", ";",
+         "{", "<%", "}", "%>", ",", ":", "=", "(", ")", "[", "<:", "]", ":>",
+         ".", "&", "!", "~", "-", "+", "*", "/", "%", "<", ">", "^", "|", "?"]
+
+
+class IdentifierPolicy():
+    '''
+    name is a valid identifier if check(name) holds and name is not reserved.
+    The answers are cached: the same substitutes are checked again and again
+    during an attack.
+    '''
+    def __init__(self, reserved, check=str.isidentifier, cache_size=1 << 18):
+        self.reserved = frozenset(reserved)
+        self._check = check
+        self.is_valid = lru_cache(maxsize=cache_size)(self._is_valid)
+
+    def _is_valid(self, name):
+        return name not in self.reserved and self._check(name)
+
+    def filter(self, names, key=None):
+        '''
+        The items of names that are valid identifiers, in order. key maps an
+        item to the name checked, e.g. str.strip.
+        '''
+        is_valid = self.is_valid
+        if key is None:
+            return [name for name in names if is_valid(name)]
+        return [name for name in names if is_valid(key(name))]
+
+
+def is_uid_text(text):
+    # isUID of MHM: the keyword/op/macro/special-id lists are checked by the policy
+    if " " in text or "\n" in text or "\r" in text:
+        return False
+    elif text[0].lower() in "0123456789":
+        return False
+    elif "'" in text or '"' in text:
+        return False
+    elif text[0].lower() in "abcdefghijklmnopqrstuvwxyz_":
+        for _c in text[1:-1]:
+            if _c.lower() not in "0123456789abcdefghijklmnopqrstuvwxyz_":
+                return False
+    else:
+        return False
+    return True
+
+
+class UIDPolicy(IdentifierPolicy):
+    '''
+    The tokens are stripped first, an empty token is not a UID.
+    '''
+    def _is_valid(self, name):
+        name = name.strip()
+        return name != '' and name not in self.reserved and self._check(name)
+
+
+identifier_policies = {
+    'python': IdentifierPolicy(kwlist),
+    'java': IdentifierPolicy(java_keywords + java_special_ids),
+    'c': IdentifierPolicy(c_keywords + c_macros + c_special_ids),
+}
+
+mhm_uid_policy = UIDPolicy(c_keywords + c_ops + c_macros + c_special_ids, check=is_uid_text)
+
+
+def get_identifier_policy(lang):
+    return identifier_policies[lang]
+
+
+def is_valid_variable_python(name: str) -> bool:
+    return identifier_policies['python'].is_valid(name)
+
+def is_valid_variable_java(name: str) -> bool:
+    return identifier_policies['java'].is_valid(name)
+
+def is_valid_variable_c(name: str) -> bool:
+    return identifier_policies['c'].is_valid(name)
+
+def is_valid_variable_name(name: str, lang: str) -> bool:
+    # an unknown language has no valid identifier
+    policy = identifier_policies.get(lang)
+    return policy is not None and policy.is_valid(name)
@@ -0,0 +1,191 @@
+'''
+Persistent, content-addressed cache of extract_dataflow results.
+
+Entries are keyed by (sha1 of the code, lang, hash of the tree-sitter build
+and of the parser sources) and stored as one zlib-compressed pickle per code,
+so get_substitutes.py, the attack scripts and their reruns all reuse the same
+parses. Editing the DFG functions, the comment stripping or extract_dataflow
+changes the key, the entries of the old sources are never matched again.
+
+The cache lives in $PARSER_CACHE_DIR (default: python_parser/.parser_cache)
+and is turned off with PARSER_CACHE=0.
+
+Report size and hit rate, or clear it:
+    python parser_cache.py
+    python parser_cache.py --clear
+'''
+import argparse
+import atexit
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # windows: stats.json is updated without a lock
+    fcntl = None
+
+CACHE_VERSION = 2
+
+default_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.parser_cache')
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class DataflowCache():
+    def __init__(self, cache_dir=None, enabled=None):
+        if cache_dir is None:
+            cache_dir = os.environ.get('PARSER_CACHE_DIR', default_cache_dir)
+        if enabled is None:
+            enabled = os.environ.get('PARSER_CACHE', '1') != '0'
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.library_path = None
+        self.source_paths = []
+        self._build_hash = None
+        self.hits = 0
+        self.misses = 0
+        atexit.register(self.flush_stats)
+
+    def set_build(self, library_path, source_paths=()):
+        # entries of another tree-sitter build, or of other sources of the
+        # code that computes the cached results, are never matched
+        self.library_path = library_path
+        self.source_paths = list(source_paths)
+        self._build_hash = None
+
+    @property
+    def build_hash(self):
+        # hashing the library and the sources is done on first use, not at import time
+        if self._build_hash is None and self.library_path is not None:
+            h = hashlib.sha1()
+            for path in [self.library_path] + self.source_paths:
+                try:
+                    digest = file_hash(path)
+                except OSError:
+                    digest = 'missing'
+                h.update(('%s:%s\0' % (os.path.basename(path), digest)).encode('utf8'))
+            self._build_hash = h.hexdigest()
+        return self._build_hash
+
+    def _path(self, code, lang):
+        h = hashlib.sha1()
+        h.update(code.encode('utf8', 'surrogatepass'))
+        h.update(b'\0' + lang.encode('utf8') + b'\0' + str(self.build_hash).encode('utf8'))
+        h.update(b'\0' + str(CACHE_VERSION).encode('utf8'))
+        key = h.hexdigest()
+        return os.path.join(self.cache_dir, key[:2], key + '.bin')
+
+    def get(self, code, lang):
+        if not self.enabled:
+            return None
+        try:
+            with open(self._path(code, lang), 'rb') as f:
+                dfg, index_list, code_tokens = pickle.loads(zlib.decompress(f.read()))
+        except (OSError, ValueError, EOFError, zlib.error, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        # index_table keys are always 0..n-1, only the values are stored
+        index_table = dict(enumerate(index_list))
+        return dfg, index_table, code_tokens
+
+    def put(self, code, lang, dfg, index_table, code_tokens):
+        if not self.enabled:
+            return
+        path = self._path(code, lang)
+        index_list = [index_table[idx] for idx in range(len(index_table))]
+        data = zlib.compress(pickle.dumps((dfg, index_list, code_tokens), protocol=pickle.HIGHEST_PROTOCOL))
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = '%s.%d.tmp' % (path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def flush_stats(self):
+        # accumulate the hit/miss counters of every process in stats.json.
+        # The read-modify-write holds stats.lock, so processes flushing at the
+        # same time do not lose each other's counts.
+        if not self.enabled or self.hits + self.misses == 0:
+            return
+        stats_path = os.path.join(self.cache_dir, 'stats.json')
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(os.path.join(self.cache_dir, 'stats.lock'), 'a') as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                stats = read_stats(self.cache_dir)
+                stats['hits'] += self.hits
+                stats['misses'] += self.misses
+                tmp_path = '%s.%d.tmp' % (stats_path, os.getpid())
+                with open(tmp_path, 'w') as f:
+                    json.dump(stats, f)
+                os.replace(tmp_path, stats_path)
+        except OSError:
+            return
+        self.hits = 0
+        self.misses = 0
+
+    def take_counts(self):
+        # hit/miss counters since the last call, for a worker process to hand
+        # them to its parent (atexit does not run in multiprocessing.Pool workers)
+        counts = (self.hits, self.misses)
+        self.hits = 0
+        self.misses = 0
+        return counts
+
+    def add_counts(self, hits, misses):
+        self.hits += hits
+        self.misses += misses
+
+
+def read_stats(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'stats.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'hits': 0, 'misses': 0}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache_dir", default=os.environ.get('PARSER_CACHE_DIR', default_cache_dir), type=str,
+                        help="Cache directory.")
+    parser.add_argument("--clear", action='store_true',
+                        help="Remove every entry of the cache.")
+    args = parser.parse_args()
+
+    if args.clear:
+        shutil.rmtree(args.cache_dir, ignore_errors=True)
+        print("Cleared %s" % args.cache_dir)
+        return
+
+    nb_entries = 0
+    nb_bytes = 0
+    for root, _, files in os.walk(args.cache_dir):
+        for name in files:
+            if name.endswith('.bin'):
+                nb_entries += 1
+                nb_bytes += os.path.getsize(os.path.join(root, name))
+    stats = read_stats(args.cache_dir)
+    total = stats['hits'] + stats['misses']
+    print("Cache dir: %s" % args.cache_dir)
+    print("Entries: %d (%.2f MB)" % (nb_entries, nb_bytes / (1 << 20)))
+    print("Hits: %d, Misses: %d, Hit rate: %.2f%%" % \
+        (stats['hits'], stats['misses'], 100.0 * stats['hits'] / total if total else 0.0))
+
+
+if __name__ == '__main__':
+    main()
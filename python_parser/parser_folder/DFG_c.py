@@ -16,7 +16,7 @@ def DFG_c(root_node, index_to_code, states):
     while_statement = ['while_statement']
     parameter_statement = ['parameter_declaration']
     do_first_statement = []
-    states = states.copy()
+    # states may be shared with the caller, it is copied before being written to
     if (len(root_node.children) == 0 or root_node.type == 'string') and root_node.type != 'comment':
         idx, code = index_to_code[(root_node.start_point, root_node.end_point)]
         if root_node.type == code or (root_node.parent.type == 'function_declarator' and root_node):
@@ -25,6 +25,7 @@ def DFG_c(root_node, index_to_code, states):
             return [(code, idx, 'comesFrom', [code], states[code].copy())], states
         elif root_node.type == 'identifier':
             if root_node.parent.type == 'declaration':
+                states = states.copy()
                 states[code]=[idx]
                 return [(code,idx,'comesFrom',[],[])],states
             return [], states
@@ -40,29 +41,31 @@ def DFG_c(root_node, index_to_code, states):
                 if child.type not in do_first_statement:
                     temp, states = DFG_c(child, index_to_code, states)
                     DFG += temp
-            return sorted(DFG, key=lambda x: x[1]), states
+            return DFG, states
         name = root_node.child_by_field_name('declarator')
         value = root_node.child_by_field_name('value')
         DFG = []
         if value is None:
             indexs = tree_to_variable_index(name, index_to_code)
+            states = states.copy()
             for index in indexs:
                 idx, code = index_to_code[index]
                 DFG.append((code, idx, 'comesFrom', [], []))
                 states[code] = [idx]
-            return sorted(DFG, key=lambda x: x[1]), states
+            return DFG, states
         else:
             name_indexs = tree_to_variable_index(name, index_to_code)
             value_indexs = tree_to_variable_index(value, index_to_code)
             temp, states = DFG_c(value, index_to_code, states)
             DFG += temp
+            states = states.copy()
             for index1 in name_indexs:
                 idx1, code1 = index_to_code[index1]
                 for index2 in value_indexs:
                     idx2, code2 = index_to_code[index2]
                     DFG.append((code1, idx1, 'comesFrom', [code2], [idx2]))
                 states[code1] = [idx1]
-            return sorted(DFG, key=lambda x: x[1]), states
+            return DFG, states
     elif root_node.type in assignment:
         # left_nodes = root_node.child_by_field_name('left')
         # right_nodes = root_node.child_by_field_name('right')
@@ -88,16 +91,17 @@ def DFG_c(root_node, index_to_code, states):
     elif root_node.type in increment_statement:
         DFG = []
         indexs = tree_to_variable_index(root_node, index_to_code)
+        states = states.copy()
         for index1 in indexs:
             idx1, code1 = index_to_code[index1]
             for index2 in indexs:
                 idx2, code2 = index_to_code[index2]
                 DFG.append((code1, idx1, 'computedFrom', [code2], [idx2]))
             states[code1] = [idx1]
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
     elif root_node.type in if_statement:
         DFG = []
-        current_states = states.copy()
+        current_states = states
         others_states = []
         flag = False
         tag = False
@@ -131,7 +135,7 @@ def DFG_c(root_node, index_to_code, states):
                 new_states[key] += states[key]
         for key in new_states:
             new_states[key] = sorted(list(set(new_states[key])))
-        return sorted(DFG, key=lambda x: x[1]), new_states
+        return DFG, new_states
     elif root_node.type in for_statement:
         DFG = []
         for child in root_node.children:
@@ -152,7 +156,7 @@ def DFG_c(root_node, index_to_code, states):
                 dic[(x[0], x[1], x[2])][0] = list(set(dic[(x[0], x[1], x[2])][0] + x[3]))
                 dic[(x[0], x[1], x[2])][1] = sorted(list(set(dic[(x[0], x[1], x[2])][1] + x[4])))
         DFG = [(x[0], x[1], x[2], y[0], y[1]) for x, y in sorted(dic.items(), key=lambda t: t[0][1])]
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
     elif root_node.type in while_statement:
         DFG = []
         for i in range(2):
@@ -167,7 +171,7 @@ def DFG_c(root_node, index_to_code, states):
                 dic[(x[0], x[1], x[2])][0] = list(set(dic[(x[0], x[1], x[2])][0] + x[3]))
                 dic[(x[0], x[1], x[2])][1] = sorted(list(set(dic[(x[0], x[1], x[2])][1] + x[4])))
         DFG = [(x[0], x[1], x[2], y[0], y[1]) for x, y in sorted(dic.items(), key=lambda t: t[0][1])]
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
     elif root_node.type in parameter_statement:
         child = root_node.child_by_field_name('declarator')
         if not child:
@@ -180,6 +184,7 @@ def DFG_c(root_node, index_to_code, states):
             if not child:
                 return [], states
         idx,code=index_to_code[(child.start_point,child.end_point)]
+        states = states.copy()
         states[code]=[idx]
         return [(code,idx,'comesFrom',[],[])],states
     else:
@@ -188,4 +193,4 @@ def DFG_c(root_node, index_to_code, states):
             if child.type not in do_first_statement:
                 temp, states = DFG_c(child, index_to_code, states)
                 DFG += temp
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
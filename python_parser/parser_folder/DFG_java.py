@@ -16,7 +16,7 @@ def DFG_java(root_node, index_to_code, states):
     for_statement = ['for_statement']
     enhanced_for_statement = ['enhanced_for_statement']
     while_statement = ['while_statement']
-    states = states.copy()
+    # states may be shared with the caller, it is copied before being written to
     if (len(root_node.children) == 0 or root_node.type == 'string') and root_node.type != 'comment':
         idx, code = index_to_code[(root_node.start_point, root_node.end_point)]
         if root_node.type == code or root_node.type == 'string':
@@ -24,6 +24,7 @@ def DFG_java(root_node, index_to_code, states):
         elif code in states:
             return [(code, idx, 'comesFrom', [code], states[code].copy())], states
         elif root_node.type == 'identifier' and root_node.parent.type == 'formal_parameter':
+            states = states.copy()
             states[code]=[idx]
             return [(code,idx,'comesFrom',[],[])],states
         else:
@@ -34,23 +35,25 @@ def DFG_java(root_node, index_to_code, states):
         DFG = []
         if value is None:
             indexs = tree_to_variable_index(name, index_to_code)
+            states = states.copy()
             for index in indexs:
                 idx, code = index_to_code[index]
                 DFG.append((code, idx, 'comesFrom', [], []))
                 states[code] = [idx]
-            return sorted(DFG, key=lambda x: x[1]), states
+            return DFG, states
         else:
             name_indexs = tree_to_variable_index(name, index_to_code)
             value_indexs = tree_to_variable_index(value, index_to_code)
             temp, states = DFG_java(value, index_to_code, states)
             DFG += temp
+            states = states.copy()
             for index1 in name_indexs:
                 idx1, code1 = index_to_code[index1]
                 for index2 in value_indexs:
                     idx2, code2 = index_to_code[index2]
                     DFG.append((code1, idx1, 'comesFrom', [code2], [idx2]))
                 states[code1] = [idx1]
-            return sorted(DFG, key=lambda x: x[1]), states
+            return DFG, states
     elif root_node.type in assignment:
         left_nodes = root_node.child_by_field_name('left')
         right_nodes = root_node.child_by_field_name('right')
@@ -59,26 +62,28 @@ def DFG_java(root_node, index_to_code, states):
         DFG += temp
         name_indexs = tree_to_variable_index(left_nodes, index_to_code)
         value_indexs = tree_to_variable_index(right_nodes, index_to_code)
+        states = states.copy()
         for index1 in name_indexs:
             idx1, code1 = index_to_code[index1]
             for index2 in value_indexs:
                 idx2, code2 = index_to_code[index2]
                 DFG.append((code1, idx1, 'computedFrom', [code2], [idx2]))
             states[code1] = [idx1]
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
     elif root_node.type in increment_statement:
         DFG = []
         indexs = tree_to_variable_index(root_node, index_to_code)
+        states = states.copy()
         for index1 in indexs:
             idx1, code1 = index_to_code[index1]
             for index2 in indexs:
                 idx2, code2 = index_to_code[index2]
                 DFG.append((code1, idx1, 'computedFrom', [code2], [idx2]))
             states[code1] = [idx1]
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
     elif root_node.type in if_statement:
         DFG = []
-        current_states = states.copy()
+        current_states = states
         others_states = []
         flag = False
         tag = False
@@ -107,7 +112,7 @@ def DFG_java(root_node, index_to_code, states):
                     new_states[key] += dic[key]
         for key in new_states:
             new_states[key] = sorted(list(set(new_states[key])))
-        return sorted(DFG, key=lambda x: x[1]), new_states
+        return DFG, new_states
     elif root_node.type in for_statement:
         DFG = []
         for child in root_node.children:
@@ -128,7 +133,7 @@ def DFG_java(root_node, index_to_code, states):
                 dic[(x[0], x[1], x[2])][0] = list(set(dic[(x[0], x[1], x[2])][0] + x[3]))
                 dic[(x[0], x[1], x[2])][1] = sorted(list(set(dic[(x[0], x[1], x[2])][1] + x[4])))
         DFG = [(x[0], x[1], x[2], y[0], y[1]) for x, y in sorted(dic.items(), key=lambda t: t[0][1])]
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
     elif root_node.type in enhanced_for_statement:
         name = root_node.child_by_field_name('name')
         value = root_node.child_by_field_name('value')
@@ -139,6 +144,7 @@ def DFG_java(root_node, index_to_code, states):
             DFG += temp
             name_indexs = tree_to_variable_index(name, index_to_code)
             value_indexs = tree_to_variable_index(value, index_to_code)
+            states = states.copy()
             for index1 in name_indexs:
                 idx1, code1 = index_to_code[index1]
                 for index2 in value_indexs:
@@ -155,7 +161,7 @@ def DFG_java(root_node, index_to_code, states):
                 dic[(x[0], x[1], x[2])][0] = list(set(dic[(x[0], x[1], x[2])][0] + x[3]))
                 dic[(x[0], x[1], x[2])][1] = sorted(list(set(dic[(x[0], x[1], x[2])][1] + x[4])))
         DFG = [(x[0], x[1], x[2], y[0], y[1]) for x, y in sorted(dic.items(), key=lambda t: t[0][1])]
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
     elif root_node.type in while_statement:
         DFG = []
         for i in range(2):
@@ -170,7 +176,7 @@ def DFG_java(root_node, index_to_code, states):
                 dic[(x[0], x[1], x[2])][0] = list(set(dic[(x[0], x[1], x[2])][0] + x[3]))
                 dic[(x[0], x[1], x[2])][1] = sorted(list(set(dic[(x[0], x[1], x[2])][1] + x[4])))
         DFG = [(x[0], x[1], x[2], y[0], y[1]) for x, y in sorted(dic.items(), key=lambda t: t[0][1])]
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
     elif root_node.type in method_expression and root_node.child_by_field_name('object') is not None:
         DFG = []
         obj_node = root_node.child_by_field_name('object')
@@ -179,13 +185,13 @@ def DFG_java(root_node, index_to_code, states):
         DFG += temp
         temp, states = DFG_java(arg_node, index_to_code, states)
         DFG += temp
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
 
     else:
         DFG = []
         for child in root_node.children:
             temp, states = DFG_java(child, index_to_code, states)
             DFG += temp
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
 
 
@@ -15,7 +15,7 @@ def DFG_python(root_node, index_to_code, states):
     while_statement = ['while_statement']
     do_first_statement = ['for_in_clause']
     def_statement = ['default_parameter']
-    states = states.copy()
+    # states may be shared with the caller, it is copied before being written to
     if (len(root_node.children) == 0 or root_node.type == 'string') and root_node.type != 'comment':
         idx, code = index_to_code[(root_node.start_point, root_node.end_point)]
         if root_node.type == code or root_node.type == 'string':
@@ -23,6 +23,7 @@ def DFG_python(root_node, index_to_code, states):
         elif code in states:
             return [(code, idx, 'comesFrom', [code], states[code].copy())], states
         elif root_node.type == 'identifier' and root_node.parent.type == 'parameters':
+            states = states.copy()
             states[code]=[idx]
             return [(code,idx,'comesFrom',[],[])],states
         else:
@@ -33,23 +34,25 @@ def DFG_python(root_node, index_to_code, states):
         DFG = []
         if value is None:
             indexs = tree_to_variable_index(name, index_to_code)
+            states = states.copy()
             for index in indexs:
                 idx, code = index_to_code[index]
                 DFG.append((code, idx, 'comesFrom', [], []))
                 states[code] = [idx]
-            return sorted(DFG, key=lambda x: x[1]), states
+            return DFG, states
         else:
             name_indexs = tree_to_variable_index(name, index_to_code)
             value_indexs = tree_to_variable_index(value, index_to_code)
             temp, states = DFG_python(value, index_to_code, states)
             DFG += temp
+            states = states.copy()
             for index1 in name_indexs:
                 idx1, code1 = index_to_code[index1]
                 for index2 in value_indexs:
                     idx2, code2 = index_to_code[index2]
                     DFG.append((code1, idx1, 'comesFrom', [code2], [idx2]))
                 states[code1] = [idx1]
-            return sorted(DFG, key=lambda x: x[1]), states
+            return DFG, states
     elif root_node.type in assignment:
         if root_node.type == 'for_in_clause':
             right_nodes = [root_node.children[-1]]
@@ -71,6 +74,7 @@ def DFG_python(root_node, index_to_code, states):
             temp, states = DFG_python(node, index_to_code, states)
             DFG += temp
 
+        states = states.copy()
         for left_node, right_node in zip(left_nodes, right_nodes):
             left_tokens_index = tree_to_variable_index(left_node, index_to_code)
             right_tokens_index = tree_to_variable_index(right_node, index_to_code)
@@ -81,10 +85,10 @@ def DFG_python(root_node, index_to_code, states):
                              [index_to_code[x][0] for x in right_tokens_index]))
                 states[code1] = [idx1]
             DFG += temp
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
     elif root_node.type in if_statement:
         DFG = []
-        current_states = states.copy()
+        current_states = states
         others_states = []
         tag = False
         if 'else' in root_node.type:
@@ -111,7 +115,7 @@ def DFG_python(root_node, index_to_code, states):
                     new_states[key] += dic[key]
         for key in new_states:
             new_states[key] = sorted(list(set(new_states[key])))
-        return sorted(DFG, key=lambda x: x[1]), new_states
+        return DFG, new_states
     elif root_node.type in for_statement:
         DFG = []
         for i in range(2):
@@ -127,6 +131,7 @@ def DFG_python(root_node, index_to_code, states):
             for node in right_nodes:
                 temp, states = DFG_python(node, index_to_code, states)
                 DFG += temp
+            states = states.copy()
             for left_node, right_node in zip(left_nodes, right_nodes):
                 left_tokens_index = tree_to_variable_index(left_node, index_to_code)
                 right_tokens_index = tree_to_variable_index(right_node, index_to_code)
@@ -148,7 +153,7 @@ def DFG_python(root_node, index_to_code, states):
                 dic[(x[0], x[1], x[2])][0] = list(set(dic[(x[0], x[1], x[2])][0] + x[3]))
                 dic[(x[0], x[1], x[2])][1] = sorted(list(set(dic[(x[0], x[1], x[2])][1] + x[4])))
         DFG = [(x[0], x[1], x[2], y[0], y[1]) for x, y in sorted(dic.items(), key=lambda t: t[0][1])]
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
     elif root_node.type in while_statement:
         DFG = []
         for i in range(2):
@@ -163,7 +168,7 @@ def DFG_python(root_node, index_to_code, states):
                 dic[(x[0], x[1], x[2])][0] = list(set(dic[(x[0], x[1], x[2])][0] + x[3]))
                 dic[(x[0], x[1], x[2])][1] = sorted(list(set(dic[(x[0], x[1], x[2])][1] + x[4])))
         DFG = [(x[0], x[1], x[2], y[0], y[1]) for x, y in sorted(dic.items(), key=lambda t: t[0][1])]
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
     else:
         DFG = []
         for child in root_node.children:
@@ -175,4 +180,4 @@ def DFG_python(root_node, index_to_code, states):
                 temp, states = DFG_python(child, index_to_code, states)
                 DFG += temp
 
-        return sorted(DFG, key=lambda x: x[1]), states
+        return DFG, states
@@ -1,4 +1,9 @@
 import argparse
+import hashlib
+import multiprocessing
+import os
+from collections import OrderedDict
+from functools import partial
 from os import replace
 import sys
 
@@ -8,6 +13,12 @@ from parser_folder.DFG_java import DFG_java
 from parser_folder import (remove_comments_and_docstrings,
                            tree_to_token_index,
                            index_to_code_token,)
+from parser_cache import DataflowCache
+from identifier_policy import (python_keywords, java_keywords, java_special_ids,
+                               c_keywords, c_macros, c_special_ids, special_char,
+                               is_valid_variable_python, is_valid_variable_java,
+                               is_valid_variable_c, is_valid_variable_name,
+                               c_ops, get_identifier_policy, mhm_uid_policy)
 from tree_sitter import Language, Parser
 sys.path.append('..')
 sys.path.append('../../../')
@@ -15,114 +26,10 @@ sys.path.append('../../../')
 sys.path.append('.')
 sys.path.append('../')
 
-python_keywords = ['import', '', '[', ']', ':', ',', '.', '(', ')', '{', '}', 'not', 'is', '=', "+=", '-=', "<", ">",
-                   '+', '-', '*', '/', 'False', 'None', 'True', 'and', 'as', 'assert', 'async', 'await', 'break',
-                   'class', 'continue', 'def', 'del', 'elif', 'else', 'except', 'finally', 'for', 'from', 'global',
-                   'if', 'import', 'in', 'is', 'lambda', 'nonlocal', 'not', 'or', 'pass', 'raise', 'return', 'try',
-                   'while', 'with', 'yield']
-java_keywords = ["abstract", "assert", "boolean", "break", "byte", "case", "catch", "do", "double", "else", "enum",
-                 "extends", "final", "finally", "float", "for", "goto", "if", "implements", "import", "instanceof",
-                 "int", "interface", "long", "native", "new", "package", "private", "protected", "public", "return",
-                 "short", "static", "strictfp", "super", "switch", "throws", "transient", "try", "void", "volatile",
-                 "while"]
-java_special_ids = ["main", "args", "Math", "System", "Random", "Byte", "Short", "Integer", "Long", "Float", "Double", "Character",
-                    "Boolean", "Data", "ParseException", "SimpleDateFormat", "Calendar", "Object", "String", "StringBuffer",
-                    "StringBuilder", "DateFormat", "Collection", "List", "Map", "Set", "Queue", "ArrayList", "HashSet", "HashMap"]
-c_keywords = ["auto", "break", "case", "char", "const", "continue",
-                 "default", "do", "double", "else", "enum", "extern",
-                 "float", "for", "goto", "if", "inline", "int", "long",
-                 "register", "restrict", "return", "short", "signed",
-                 "sizeof", "static", "struct", "switch", "typedef",
-                 "union", "unsigned", "void", "volatile", "while",
-                 "_Alignas", "_Alignof", "_Atomic", "_Bool", "_Complex",
-                 "_Generic", "_Imaginary", "_Noreturn", "_Static_assert",
-                 "_Thread_local", "__func__"]
-
-c_macros = ["NULL", "_IOFBF", "_IOLBF", "BUFSIZ", "EOF", "FOPEN_MAX", "TMP_MAX",  # <stdio.h> macro
-              "FILENAME_MAX", "L_tmpnam", "SEEK_CUR", "SEEK_END", "SEEK_SET",
-              "NULL", "EXIT_FAILURE", "EXIT_SUCCESS", "RAND_MAX", "MB_CUR_MAX"]     # <stdlib.h> macro
-c_special_ids = ["main",  # main function
-                   "stdio", "cstdio", "stdio.h",                                # <stdio.h> & <cstdio>
-                   "size_t", "FILE", "fpos_t", "stdin", "stdout", "stderr",     # <stdio.h> types & streams
-                   "remove", "rename", "tmpfile", "tmpnam", "fclose", "fflush", # <stdio.h> functions
-                   "fopen", "freopen", "setbuf", "setvbuf", "fprintf", "fscanf",
-                   "printf", "scanf", "snprintf", "sprintf", "sscanf", "vprintf",
-                   "vscanf", "vsnprintf", "vsprintf", "vsscanf", "fgetc", "fgets",
-                   "fputc", "getc", "getchar", "putc", "putchar", "puts", "ungetc",
-                   "fread", "fwrite", "fgetpos", "fseek", "fsetpos", "ftell",
-                   "rewind", "clearerr", "feof", "ferror", "perror", "getline"
-                   "stdlib", "cstdlib", "stdlib.h",                             # <stdlib.h> & <cstdlib>
-                   "size_t", "div_t", "ldiv_t", "lldiv_t",                      # <stdlib.h> types
-                   "atof", "atoi", "atol", "atoll", "strtod", "strtof", "strtold",  # <stdlib.h> functions
-                   "strtol", "strtoll", "strtoul", "strtoull", "rand", "srand",
-                   "aligned_alloc", "calloc", "malloc", "realloc", "free", "abort",
-                   "atexit", "exit", "at_quick_exit", "_Exit", "getenv",
-                   "quick_exit", "system", "bsearch", "qsort", "abs", "labs",
-                   "llabs", "div", "ldiv", "lldiv", "mblen", "mbtowc", "wctomb",
-                   "mbstowcs", "wcstombs",
-                   "string", "cstring", "string.h",                                 # <string.h> & <cstring>
-                   "memcpy", "memmove", "memchr", "memcmp", "memset", "strcat",     # <string.h> functions
-                   "strncat", "strchr", "strrchr", "strcmp", "strncmp", "strcoll",
-                   "strcpy", "strncpy", "strerror", "strlen", "strspn", "strcspn",
-                   "strpbrk" ,"strstr", "strtok", "strxfrm",
-                   "memccpy", "mempcpy", "strcat_s", "strcpy_s", "strdup",      # <string.h> extension functions
-                   "strerror_r", "strlcat", "strlcpy", "strsignal", "strtok_r",
-                   "iostream", "istream", "ostream", "fstream", "sstream",      # <iostream> family
-                   "iomanip", "iosfwd",
-                   "ios", "wios", "streamoff", "streampos", "wstreampos",       # <iostream> types
-                   "streamsize", "cout", "cerr", "clog", "cin",
-                   "boolalpha", "noboolalpha", "skipws", "noskipws", "showbase",    # <iostream> manipulators
-                   "noshowbase", "showpoint", "noshowpoint", "showpos",
-                   "noshowpos", "unitbuf", "nounitbuf", "uppercase", "nouppercase",
-                   "left", "right", "internal", "dec", "oct", "hex", "fixed",
-                   "scientific", "hexfloat", "defaultfloat", "width", "fill",
-                   "precision", "endl", "ends", "flush", "ws", "showpoint",
-                   "sin", "cos", "tan", "asin", "acos", "atan", "atan2", "sinh",    # <math.h> functions
-                   "cosh", "tanh", "exp", "sqrt", "log", "log10", "pow", "powf",
-                   "ceil", "floor", "abs", "fabs", "cabs", "frexp", "ldexp",
-                   "modf", "fmod", "hypot", "ldexp", "poly", "matherr"]
-
-special_char = ['[', ']', ':', ',', '.', '(', ')', '{', '}', 'not', 'is', '=', "+=", '-=', "<", ">", '+', '-', '*', '/',
-                '|']
-
-from keyword import iskeyword
-def is_valid_variable_python(name: str) -> bool:
-    return name.isidentifier() and not iskeyword(name)
-
-def is_valid_variable_java(name: str) -> bool:
-    if not name.isidentifier():
-        return False
-    elif name in java_keywords:
-        return False
-    elif name in java_special_ids:
-        return False
-    return True
-
-def is_valid_variable_c(name: str) -> bool:
-
-    if not name.isidentifier():
-        return False
-    elif name in c_keywords:
-        return False
-    elif name in c_macros:
-        return False
-    elif name in c_special_ids:
-        return False
-    return True
-
-def is_valid_variable_name(name: str, lang: str) -> bool:
-    # check if matches language keywords
-    if lang == 'python':
-        return is_valid_variable_python(name)
-    elif lang == 'c':
-        return is_valid_variable_c(name)
-    elif lang == 'java':
-        return is_valid_variable_java(name)
-    else:
-        return False
-
-path = '../../../python_parser/parser_folder/my-languages.so'
-# path = 'parser_folder/my-languages.so'
+# the tree-sitter library built by parser_folder/build.sh, found relative to
+# this file so scripts can be launched from any directory
+path = os.environ.get('TREE_SITTER_LIB',
+                      os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_folder', 'my-languages.so'))
 
 c_code = """
 static int bit8x8_c(MpegEncContext *s, uint8_t *src1, uint8_t *src2,\n\n                    ptrdiff_t stride, int h)\n\n{\n\n    const uint8_t *scantable = s->intra_scantable.permutated;\n\n    LOCAL_ALIGNED_16(int16_t, temp, [64]);\n\n    int i, last, run, bits, level, start_i;\n\n    const int esc_length = s->ac_esc_length;\n\n    uint8_t *length, *last_length;\n\n\n\n    av_assert2(h == 8);\n\n\n\n    s->pdsp.diff_pixels(temp, src1, src2, stride);\n\n\n\n    s->block_last_index[0 /* FIXME */] =\n\n    last                               =\n\n        s->fast_dct_quantize(s, temp, 0 /* FIXME */, s->qscale, &i);\n\n\n\n    bits = 0;\n\n\n\n    if (s->mb_intra) {\n\n        start_i     = 1;\n\n        length      = s->intra_ac_vlc_length;\n\n        last_length = s->intra_ac_vlc_last_length;\n\n        bits       += s->luma_dc_vlc_length[temp[0] + 256]; // FIXME: chroma\n\n    } else {\n\n        start_i     = 0;\n\n        length      = s->inter_ac_vlc_length;\n\n        last_length = s->inter_ac_vlc_last_length;\n\n    }\n\n\n\n    if (last >= start_i) {\n\n        run = 0;\n\n        for (i = start_i; i < last; i++) {\n\n            int j = scantable[i];\n\n            level = temp[j];\n\n\n\n            if (level) {\n\n                level += 64;\n\n                if ((level & (~127)) == 0)\n\n                    bits += length[UNI_AC_ENC_INDEX(run, level)];\n\n                else\n\n                    bits += esc_length;\n\n                run = 0;\n\n            } else\n\n                run++;\n\n        }\n\n        i = scantable[last];\n\n\n\n        level = temp[i] + 64;\n\n\n\n        av_assert2(level - 64);\n\n\n\n        if ((level & (~127)) == 0)\n\n            bits += last_length[UNI_AC_ENC_INDEX(run, level)];\n\n        else\n\n            bits += esc_length;\n\n    }\n\n\n\n    return bits;\n\n}\n"""
@@ -139,14 +46,32 @@ dfg_function = {
     'c': DFG_c,
 }
 
+class LazyParsers(dict):
+    '''
+    lang -> [tree-sitter parser, DFG function], built on first use of each
+    language and then kept for the rest of the process.
+    '''
+    def __missing__(self, lang):
+        if lang not in dfg_function:
+            raise KeyError(lang)
+        LANGUAGE = Language(path, lang)
+        parser = Parser()
+        parser.set_language(LANGUAGE)
+        parser = [parser, dfg_function[lang]]
+        self[lang] = parser
+        return parser
+
 # load parsers
-parsers = {}
-for lang in dfg_function:
-    LANGUAGE = Language(path, lang)
-    parser = Parser()
-    parser.set_language(LANGUAGE)
-    parser = [parser, dfg_function[lang]]
-    parsers[lang] = parser
+parsers = LazyParsers()
+
+# on-disk cache of extract_dataflow, see parser_cache.py
+# the results depend on the library, extract_dataflow and the parser_folder
+# modules, all of them are hashed (lazily, on the first lookup) into the key
+parser_folder_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_folder')
+dataflow_cache = DataflowCache()
+dataflow_cache.set_build(path, [os.path.abspath(__file__)] +
+                         [os.path.join(parser_folder_dir, name) for name in sorted(os.listdir(parser_folder_dir))
+                          if name.endswith('.py')])
 
 codes = {}
 codes = {
@@ -161,6 +86,10 @@ def get_code_tokens(code, lang):
     return code_tokens
 
 def extract_dataflow(code, lang):
+    cached = dataflow_cache.get(code, lang)
+    if cached is not None:
+        return cached
+    orig_code = code
     parser = parsers[lang]
     code = code.replace("\\n", "\n")
     # remove comments
@@ -168,7 +97,6 @@ def extract_dataflow(code, lang):
         code = remove_comments_and_docstrings(code, lang)
     except:
         pass
-    parser = parsers[lang]
     tree = parser[0].parse(bytes(code, 'utf8'))
     root_node = tree.root_node
     tokens_index = tree_to_token_index(root_node)
@@ -180,63 +108,192 @@ def extract_dataflow(code, lang):
         index_to_code[index] = (idx, code)
 
     index_table = {}
-    for idx, (index, code) in enumerate(zip(tokens_index, code_tokens)):
+    for idx, index in enumerate(tokens_index):
         index_table[idx] = index
 
     DFG, _ = parser[1](root_node, index_to_code, {})
 
+    # the DFG functions leave the edges in traversal order, sort them once here
     DFG = sorted(DFG, key=lambda x: x[1])
+    dataflow_cache.put(orig_code, lang, DFG, index_table, code_tokens)
     return DFG, index_table, code_tokens
 
-def get_example(code, tgt_word, substitute, lang):
-    parser = parsers[lang]
+class ParsedCode():
+    '''
+    Parse-once view of a code snippet: the tree-sitter tree, the token spans
+    and a map from every token string to its (line, start, end) spans, so that
+    renaming an identifier is a pure string splice.
+    '''
+    def __init__(self, code, lang, tree=None):
+        parser = parsers[lang]
+        self.lang = lang
+        if tree is None:
+            tree = parser[0].parse(bytes(code, 'utf8'))
+        self.tree = tree
+        self.is_ascii = code.isascii()
+        self.tokens_index = tree_to_token_index(self.tree.root_node)
+        self.lines = code.split('\n')
+        self.code_tokens = [index_to_code_token(x, self.lines) for x in self.tokens_index]
+        self.token_spans = {}
+        for index, code_token in zip(self.tokens_index, self.code_tokens):
+            self.token_spans.setdefault(code_token, []).append((index[0][0], index[0][1], index[1][1]))
+        self._segments = {}
+
+    def rename(self, tgt_word, substitute):
+        code = list(self.lines)
+        diff = len(substitute) - len(tgt_word)
+        replace_pos = {}
+        for line, start, end in self.token_spans.get(tgt_word, []):
+            replace_pos.setdefault(line, []).append((start, end))
+        for line in replace_pos.keys():
+            for index, pos in enumerate(replace_pos[line]):
+                code[line] = code[line][:pos[0]+index*diff] + substitute + code[line][pos[1]+index*diff:]
+        return "\n".join(code)
+
+    def renamed(self, tgt_word, substitute):
+        '''
+        Return the ParsedCode of the renamed code, reparsed incrementally from
+        a copy of the tree. This one is left as it is, it can be in the parse
+        cache and renamed again.
+        '''
+        new_code = self.rename(tgt_word, substitute)
+        # tree-sitter columns are byte offsets, the splice in rename uses them
+        # as character offsets; they only agree on ascii code
+        if not self.is_ascii or not new_code.isascii():
+            return ParsedCode(new_code, self.lang)
+        line_starts = [0]
+        for line in self.lines:
+            line_starts.append(line_starts[-1] + len(line) + 1)
+        old_len = len(tgt_word)
+        new_len = len(substitute)
+        parser = parsers[self.lang][0]
+        # Tree has no copy() in tree-sitter 0.20: reparsing the unchanged code
+        # on the old tree gives a new tree that reuses all of its nodes
+        tree = parser.parse(bytes("\n".join(self.lines), 'utf8'), self.tree)
+        # edit from the last span backwards so earlier offsets stay valid
+        for line, start, end in reversed(self.token_spans.get(tgt_word, [])):
+            start_byte = line_starts[line] + start
+            tree.edit(start_byte=start_byte,
+                      old_end_byte=start_byte + old_len,
+                      new_end_byte=start_byte + new_len,
+                      start_point=(line, start),
+                      old_end_point=(line, start + old_len),
+                      new_end_point=(line, start + new_len))
+        tree = parser.parse(bytes(new_code, 'utf8'), tree)
+        return ParsedCode(new_code, self.lang, tree)
+
+    def rename_segments(self, tgt_word):
+        # split the code once into the fixed pieces around the spans of tgt_word
+        segments = self._segments.get(tgt_word)
+        if segments is not None:
+            return segments
+        replace_pos = {}
+        for line, start, end in self.token_spans.get(tgt_word, []):
+            replace_pos.setdefault(line, []).append((start, end))
+        segments = []
+        current = []
+        for line_no, line in enumerate(self.lines):
+            if line_no > 0:
+                current.append("\n")
+            last = 0
+            for start, end in replace_pos.get(line_no, []):
+                current.append(line[last:start])
+                segments.append("".join(current))
+                current = []
+                last = end
+            current.append(line[last:])
+        segments.append("".join(current))
+        self._segments[tgt_word] = segments
+        return segments
+
+    def rename_many(self, tgt_word, substitutes):
+        segments = self.rename_segments(tgt_word)
+        return [substitute.join(segments) for substitute in substitutes]
+
+    def rename_batch(self, chromesome):
+        code = list(self.lines)
+        replace_pos = {}
+        for tgt_word in chromesome.keys():
+            diff = len(chromesome[tgt_word]) - len(tgt_word)
+            for line, start, end in self.token_spans.get(tgt_word, []):
+                replace_pos.setdefault(line, []).append((tgt_word, chromesome[tgt_word], diff, start, end))
+        for line in replace_pos.keys():
+            diff = 0
+            for index, pos in enumerate(replace_pos[line]):
+                code[line] = code[line][:pos[3]+diff] + pos[1] + code[line][pos[4]+diff:]
+                diff += pos[2]
+        return "\n".join(code)
+
+
+# LRU cache of ParsedCode, keyed by the hash of the (already unescaped) code
+parse_cache_size = 512
+_parse_cache = OrderedDict()
+_parse_cache_stats = {'hits': 0, 'misses': 0}
+
+def _parse_cache_key(code, lang):
+    return (lang, hashlib.sha1(code.encode('utf8')).hexdigest())
+
+def _parse_cache_put(key, parsed):
+    _parse_cache[key] = parsed
+    while len(_parse_cache) > parse_cache_size:
+        _parse_cache.popitem(last=False)
+
+def get_parsed_code(code, lang):
     code = code.replace("\\n", "\n")
-    parser = parsers[lang]
-    tree = parser[0].parse(bytes(code, 'utf8'))
-    root_node = tree.root_node
-    tokens_index = tree_to_token_index(root_node)
-    code = code.split('\n')
-    code_tokens = [index_to_code_token(x, code) for x in tokens_index]
-    replace_pos = {}
-    for index, code_token in enumerate(code_tokens):
-        if code_token == tgt_word:
-            try:
-                replace_pos[tokens_index[index][0][0]].append((tokens_index[index][0][1], tokens_index[index][1][1]))
-            except:
-                replace_pos[tokens_index[index][0][0]] = [(tokens_index[index][0][1], tokens_index[index][1][1])]
-    diff = len(substitute) - len(tgt_word)
-    for line in replace_pos.keys():
-        for index, pos in enumerate(replace_pos[line]):
-            code[line] = code[line][:pos[0]+index*diff] + substitute + code[line][pos[1]+index*diff:]
+    key = _parse_cache_key(code, lang)
+    parsed = _parse_cache.get(key)
+    if parsed is not None:
+        _parse_cache.move_to_end(key)
+        _parse_cache_stats['hits'] += 1
+        return parsed
+    _parse_cache_stats['misses'] += 1
+    parsed = ParsedCode(code, lang)
+    _parse_cache_put(key, parsed)
+    return parsed
+
+def parse_cache_info():
+    return {'hits': _parse_cache_stats['hits'],
+            'misses': _parse_cache_stats['misses'],
+            'size': len(_parse_cache),
+            'max_size': parse_cache_size}
+
+def clear_parse_cache():
+    _parse_cache.clear()
+    _parse_cache_stats['hits'] = 0
+    _parse_cache_stats['misses'] = 0
 
-    return "\n".join(code)
+def get_example(code, tgt_word, substitute, lang):
+    return get_parsed_code(code, lang).rename(tgt_word, substitute)
+
+def apply_rename(code, tgt_word, substitute, lang):
+    '''
+    Same result as get_example, for a rename that is kept (greedy / MHM
+    chains): the new code is reparsed incrementally from the old tree and
+    cached, so the next rename on it does not parse from scratch.
+    '''
+    parsed = get_parsed_code(code, lang).renamed(tgt_word, substitute)
+    new_code = "\n".join(parsed.lines)
+    _parse_cache_put(_parse_cache_key(new_code, lang), parsed)
+    return new_code
+
+def get_examples_many(code, tgt_word, substitutes, lang):
+    '''
+    Same as calling get_example for every substitute, but the code is split
+    around the spans of tgt_word only once and each variant is a single join.
+    '''
+    return get_parsed_code(code, lang).rename_many(tgt_word, substitutes)
+
+def get_rename_segments(code, tgt_word, lang):
+    '''
+    The fixed pieces of code around the spans of tgt_word, so that
+    get_example(code, tgt_word, substitute, lang) == substitute.join(segments).
+    The list is shared with the parse cache and must not be modified.
+    '''
+    return get_parsed_code(code, lang).rename_segments(tgt_word)
 
 
 def get_example_batch(code, chromesome, lang):
-    parser = parsers[lang]
-    code = code.replace("\\n", "\n")
-    parser = parsers[lang]
-    tree = parser[0].parse(bytes(code, 'utf8'))
-    root_node = tree.root_node
-    tokens_index = tree_to_token_index(root_node)
-    code = code.split('\n')
-    code_tokens = [index_to_code_token(x, code) for x in tokens_index]
-    replace_pos = {}
-    for tgt_word in chromesome.keys():
-        diff = len(chromesome[tgt_word]) - len(tgt_word)
-        for index, code_token in enumerate(code_tokens):
-            if code_token == tgt_word:
-                try:
-                    replace_pos[tokens_index[index][0][0]].append((tgt_word, chromesome[tgt_word], diff, tokens_index[index][0][1], tokens_index[index][1][1]))
-                except:
-                    replace_pos[tokens_index[index][0][0]] = [(tgt_word, chromesome[tgt_word], diff, tokens_index[index][0][1], tokens_index[index][1][1])]
-    for line in replace_pos.keys():
-        diff = 0
-        for index, pos in enumerate(replace_pos[line]):
-            code[line] = code[line][:pos[3]+diff] + pos[1] + code[line][pos[4]+diff:]
-            diff += pos[2]
-
-    return "\n".join(code)
+    return get_parsed_code(code, lang).rename_batch(chromesome)
 
 def unique(sequence):
     seen = set()
@@ -245,14 +302,72 @@ def unique(sequence):
 def get_identifiers(code, lang):
 
     dfg, index_table, code_tokens = extract_dataflow(code, lang)
-    ret = []
-    for d in dfg:
-        if is_valid_variable_name(d[0], lang):
-            ret.append(d[0])
+    ret = get_identifier_policy(lang).filter([d[0] for d in dfg])
     ret = unique(ret)
     ret = [ [i] for i in ret]
     return ret, code_tokens
 
+def _init_parse_worker():
+    # every worker builds its own tree-sitter parsers, once, on first use
+    parsers.clear()
+    _parse_cache.clear()
+    # the counters inherited from the parent are flushed by the parent
+    dataflow_cache.take_counts()
+
+def _counted_job(job_func, job):
+    # returns the dataflow cache hits/misses of the job along with its result,
+    # the parent adds them to its own counters and flushes them at exit
+    result = job_func(job)
+    return (result,) + dataflow_cache.take_counts()
+
+def _extract_dataflow_job(job):
+    code, lang = job
+    return extract_dataflow(code, lang)
+
+def _get_identifiers_job(job):
+    code, lang, remove_comments = job
+    # extract_dataflow unescapes "\\n" before it strips the comments, so a
+    # comment holding a literal \\n would leak its tail into the tokens: the
+    # comments of every language are stripped from the raw code first
+    if remove_comments:
+        try:
+            return get_identifiers(remove_comments_and_docstrings(code, lang), lang)
+        except:
+            pass
+    return get_identifiers(code, lang)
+
+def _run_parse_jobs(job_func, jobs, num_workers=None, chunksize=16):
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    # no need for more workers than chunks
+    num_workers = min(num_workers, (len(jobs) + chunksize - 1) // chunksize)
+    if num_workers <= 1:
+        return [job_func(job) for job in jobs]
+    results = []
+    with multiprocessing.Pool(num_workers, initializer=_init_parse_worker) as pool:
+        # imap keeps the input order
+        for result, hits, misses in pool.imap(partial(_counted_job, job_func), jobs, chunksize):
+            dataflow_cache.add_counts(hits, misses)
+            results.append(result)
+    return results
+
+def extract_dataflow_batch(codes, lang, num_workers=None, chunksize=16):
+    '''
+    extract_dataflow over a list of codes, sharded across a process pool.
+    Results are returned in the order of codes.
+    '''
+    return _run_parse_jobs(_extract_dataflow_job, [(code, lang) for code in codes], num_workers, chunksize)
+
+def get_identifiers_batch(codes, lang, num_workers=None, chunksize=16, remove_comments=False):
+    '''
+    get_identifiers over a list of codes, sharded across a process pool.
+    With remove_comments, comments (and python docstrings) are stripped from
+    the raw code first (falling back to the raw code when that fails), as
+    get_substitutes.py does.
+    Results are returned in the order of codes.
+    '''
+    return _run_parse_jobs(_get_identifiers_job, [(code, lang, remove_comments) for code in codes], num_workers, chunksize)
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--lang", default=None, type=str,
@@ -0,0 +1,62 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root_dir, 'python_parser'))
+sys.path.insert(0, root_dir)
+
+# the tests neither read nor fill the on-disk parser cache
+os.environ.setdefault('PARSER_CACHE', '0')
+
+# bundled data files, read with bench_parser.load_codes
+data_files = {
+    'c': os.path.join(root_dir, 'CodeXGLUE', 'Defect-detection', 'preprocess', 'dataset', 'test_subs_0_400.jsonl'),
+    'java': os.path.join(root_dir, 'CodeXGLUE', 'Clone-detection-BigCloneBench', 'dataset', 'test_subs_0_500.jsonl'),
+    'python': os.path.join(root_dir, 'CodeXGLUE', 'Authorship-Attribution', 'dataset', 'data_folder', 'processed_gcjpy', 'valid.txt'),
+}
+
+# the tokenizer of the target models, TOKENIZER_PATH points to a local copy
+tokenizer_path = os.environ.get('TOKENIZER_PATH', 'microsoft/codebert-base')
+
+
+def require_parser(lang):
+    # the tree-sitter library is built by parser_folder/build.sh (or found
+    # through TREE_SITTER_LIB), the parsing tests cannot run without it
+    from run_parser import parsers
+    try:
+        return parsers[lang]
+    except OSError as e:
+        pytest.skip("tree-sitter library not available: %s" % e)
+
+
+def load_codes(lang, limit=None):
+    from bench_parser import load_codes
+    return load_codes(data_files[lang], lang, limit)
+
+
+def load_attacker(task):
+    # model, run and attacker are the module names of every task, they are
+    # imported from CodeXGLUE/<task>/code and taken out of sys.modules again
+    names = ['model', 'run', 'attacker']
+    saved = {name: sys.modules.pop(name) for name in names if name in sys.modules}
+    code_dir = os.path.join(root_dir, 'CodeXGLUE', task, 'code')
+    sys.path.insert(0, code_dir)
+    try:
+        return importlib.import_module('attacker')
+    finally:
+        sys.path.remove(code_dir)
+        for name in names:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+
+
+@pytest.fixture(scope='session')
+def tokenizer():
+    from transformers import RobertaTokenizer
+    try:
+        return RobertaTokenizer.from_pretrained(tokenizer_path)
+    except Exception as e:
+        pytest.skip("tokenizer not available: %s" % e)
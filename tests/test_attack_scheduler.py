@@ -0,0 +1,118 @@
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import data_files, load_attacker, require_parser
+from utils import AttackScheduler, example_rng
+
+
+class FakeModel():
+    # every item is its own prediction
+    def __init__(self):
+        self.calls = 0
+
+    def get_results(self, dataset, batch_size):
+        self.calls += 1
+        return [[x] for x in dataset], [x for x in dataset]
+
+
+def fake_steps(index, nb_rounds, log, sleep=0.0):
+    log.append(('start', index))
+    total = 0
+    for round in range(nb_rounds):
+        time.sleep(sleep)
+        probs, preds = yield [index * 100 + round, index * 100 + round + 1]
+        total += sum(preds)
+    return index, total
+
+
+def test_scheduler_keeps_order_and_bounds_backlog():
+    log = []
+    nb_rounds = [30] + [1] * 20
+    model = FakeModel()
+    results = []
+    for index, result in enumerate(AttackScheduler(model, 8, 3).run(fake_steps(i, n, log) for i, n in enumerate(nb_rounds))):
+        log.append(('done', index))
+        results.append(result[:2])
+    assert results == [((i, sum(2 * (i * 100 + r) + 1 for r in range(n))), 2 * n) for i, n in enumerate(nb_rounds)]
+    # the first example is slow: only 3 examples wait for it, the others start after it is reported
+    started = [i for event, i in log if event == 'start']
+    assert log.index(('done', 0)) < log.index(('start', 7))
+    assert len(started) == len(nb_rounds)
+    assert model.calls < sum(nb_rounds)
+
+
+def test_scheduler_time_is_per_example():
+    log = []
+    jobs = [fake_steps(0, 5, log, sleep=0.02), fake_steps(1, 5, log)]
+    (_, _, slow), (_, _, fast) = AttackScheduler(FakeModel(), 8, 2).run(jobs)
+    assert slow >= 0.1
+    assert fast < 0.05
+
+
+def load_examples(indices, nb_subs):
+    # C functions of Devign, with a few of their substitutes
+    examples = {}
+    with open(data_files['c']) as f:
+        for index, line in enumerate(f):
+            if index in indices:
+                js = json.loads(line)
+                examples[index] = (js['func'], {k: v[:nb_subs] for k, v in list(js['substitutes'].items())[:4]})
+    return [examples[index][0] for index in indices], [examples[index][1] for index in indices]
+
+
+@pytest.fixture(scope='module')
+def defect_attack(tokenizer):
+    require_parser('c')
+    import torch
+    from transformers import RobertaConfig, RobertaForMaskedLM, RobertaForSequenceClassification
+    from utils import CodeDataset, build_vocab
+    from run_parser import get_identifiers
+    attacker = load_attacker('Defect-detection')
+    args = SimpleNamespace(block_size=128, eval_batch_size=8, importance_mode='occurrence', use_ga=True,
+                           prediction_cache_size=1 << 12)
+    config = RobertaConfig(vocab_size=tokenizer.vocab_size, hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                           intermediate_size=64, num_labels=1, max_position_embeddings=args.block_size + 4)
+    torch.manual_seed(0)
+    encoder = RobertaForSequenceClassification(config)
+    mlm = RobertaForMaskedLM(config)
+    # 54 to 87 subwords, and one function cut at block_size
+    codes, substitutes = load_examples([294, 237, 0, 128, 105, 86], 5)
+    model = attacker.Model(encoder, config, tokenizer, args)
+    # the examples are labelled with the prediction, so that they are attacked
+    _, preds = model.get_results(CodeDataset([attacker.convert_code_to_features(c, tokenizer, 0, args) for c in codes]), 8)
+    dataset = CodeDataset([attacker.convert_code_to_features(c, tokenizer, int(p), args) for c, p in zip(codes, preds)])
+    vocab = build_vocab([get_identifiers(c, 'c')[1] for c in codes], 5000)
+
+    def run(kind, concurrency):
+        model = attacker.Model(encoder, config, tokenizer, args)
+        if kind == 'ga':
+            ga = attacker.Attacker(args, model, tokenizer, mlm, tokenizer, use_bpe=1, threshold_pred_score=0)
+
+            def steps(index, example):
+                result, _ = yield from ga.greedy_attack_steps(example, codes[index], substitutes[index])
+                if result[6] == -1:
+                    result = yield from ga.ga_attack_steps(example, codes[index], substitutes[index],
+                                                           initial_replace=result[11], rng=example_rng(42, index))
+                return result
+        else:
+            mhm = attacker.MHM_Attacker(args, model, mlm, tokenizer, vocab[1], vocab[0])
+
+            def steps(index, example):
+                return (yield from mhm.mcmc_steps(tokenizer, substitutes[index], codes[index], _label=example[1].item(),
+                                                  _n_candi=5, _max_iter=5, _prob_threshold=1, rng=example_rng(42, index)))
+        jobs = (steps(index, example) for index, example in enumerate(dataset))
+        return [(repr(result), nb_queries) for result, nb_queries, _ in
+                AttackScheduler(model, args.eval_batch_size, concurrency).run(jobs)]
+    return run
+
+
+@pytest.mark.parametrize('kind', ['ga', 'mhm'])
+def test_concurrent_attacks_match_sequential(defect_attack, kind):
+    # the candidates of several examples share batches of different lengths,
+    # the results and query times are still the ones of one example at a time
+    sequential = defect_attack(kind, 1)
+    assert sum(nb_queries for _, nb_queries in sequential) > 0
+    assert defect_attack(kind, 3) == sequential
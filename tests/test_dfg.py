@@ -0,0 +1,197 @@
+import importlib.util
+import os
+import subprocess
+import sys
+
+import pytest
+from tree_sitter import Language, Parser
+
+from conftest import root_dir, load_codes, require_parser
+from parser_folder import tree_to_token_index, index_to_code_token
+
+# the revision before the copy-on-write DFG builders, the current ones are
+# checked against the builders of this revision
+reference_rev = os.environ.get('DFG_REFERENCE_REV', 'dc8cbb2')
+
+# the languages of GraphCodeBERT that have no bundled data
+snippets = {
+    'javascript': '''
+function total(items, rate) {
+    var sum = 0;
+    for (var i = 0; i < items.length; i++) {
+        if (items[i] > 10) { sum += items[i] * rate; } else { sum = sum - 1; }
+    }
+    while (sum > 100) { sum = sum / 2; }
+    let [a, b] = [sum, rate];
+    return a + b;
+}
+''',
+    'go': '''
+func total(items []int, rate int) int {
+    sum := 0
+    for i := 0; i < len(items); i++ {
+        if items[i] > 10 {
+            sum += items[i] * rate
+        } else {
+            sum = sum - 1
+        }
+    }
+    for _, x := range items {
+        sum, rate = sum + x, rate - 1
+    }
+    switch sum { case 1: sum = 2; default: sum = 3 }
+    return sum
+}
+''',
+    'ruby': '''
+def total(items, rate)
+  sum = 0
+  items.each do |x|
+    if x > 10
+      sum += x * rate
+    else
+      sum = sum - 1
+    end
+  end
+  while sum > 100
+    sum = sum / 2
+  end
+  for y in items do sum = sum + y end
+  a, b = sum, rate
+  return a + b
+end
+''',
+    'php': '''<?php
+function total($items, $rate) {
+    $sum = 0;
+    foreach ($items as $x) {
+        if ($x > 10) { $sum += $x * $rate; } else { $sum = $sum - 1; }
+    }
+    for ($i = 0; $i < 3; $i++) { $sum = $sum + $i; }
+    while ($sum > 100) { $sum = $sum / 2; }
+    return $sum;
+}
+?>''',
+    'c_sharp': '''
+public int Total(int[] items, int rate) {
+    int sum = 0;
+    for (int i = 0; i < items.Length; i++) {
+        if (items[i] > 10) { sum += items[i] * rate; } else { sum = sum - 1; }
+    }
+    foreach (var x in items) { sum = sum + x; }
+    while (sum > 100) { sum = sum / 2; }
+    return sum;
+}
+''',
+}
+
+graphcodebert_builders = {
+    'python': 'DFG_python',
+    'java': 'DFG_java',
+    'javascript': 'DFG_javascript',
+    'go': 'DFG_go',
+    'ruby': 'DFG_ruby',
+    'php': 'DFG_php',
+    'c_sharp': 'DFG_csharp',
+}
+
+
+def require_reference_rev():
+    if subprocess.run(['git', 'cat-file', '-e', reference_rev + '^{commit}'], cwd=root_dir,
+                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode != 0:
+        pytest.skip("git revision %s not available" % reference_rev)
+
+
+def graphcodebert_parser_dir(task_dir):
+    return os.path.join(root_dir, 'GraphCodeBERT', task_dir, 'code', 'parser')
+
+
+def tree_sitter_parser(task_dir, lang):
+    # the library GraphCodeBERT/<task>/code/parser/build.sh builds, with all
+    # the languages of DFG.py
+    path = os.path.join(graphcodebert_parser_dir(task_dir), 'my-languages.so')
+    try:
+        language = Language(path, lang)
+    except (OSError, AttributeError) as e:
+        pytest.skip("tree-sitter grammar of %s not available: %s" % (lang, e))
+    parser = Parser()
+    parser.set_language(language)
+    return parser
+
+
+def load_graphcodebert_parser(task_dir):
+    # GraphCodeBERT/<task>/code/parser, imported under a name of its own
+    package_dir = graphcodebert_parser_dir(task_dir)
+    name = 'graphcodebert_parser_%s' % task_dir.replace('-', '_')
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, os.path.join(package_dir, '__init__.py'),
+                                                      submodule_search_locations=[package_dir])
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+def load_reference_graphcodebert_parser(task_dir):
+    from bench_parser import load_reference_package
+    name = 'ref_graphcodebert_parser_%s' % task_dir.replace('-', '_')
+    return load_reference_package(reference_rev, graphcodebert_parser_dir(task_dir), ['utils', 'DFG'], name).DFG
+
+
+def dfg_edges(dfg_func, parser, code):
+    # the edges extract_dataflow keeps, or the exception the builder raised
+    root_node = parser.parse(bytes(code, 'utf8')).root_node
+    lines = code.split('\n')
+    index_to_code = {}
+    for idx, index in enumerate(tree_to_token_index(root_node)):
+        index_to_code[index] = (idx, index_to_code_token(index, lines))
+    try:
+        dfg, _ = dfg_func(root_node, index_to_code, {})
+    except Exception as e:
+        return type(e).__name__
+    return sorted(dfg, key=lambda x: x[1])
+
+
+def assert_same_dfg(dfg_func, ref_func, parser, codes):
+    nb_edges = 0
+    for index, code in enumerate(codes):
+        edges = dfg_edges(dfg_func, parser, code)
+        assert edges == dfg_edges(ref_func, parser, code), "code %d" % index
+        if isinstance(edges, list):
+            nb_edges += len(edges)
+    # the builders did produce data flow
+    assert nb_edges > 0
+
+
+@pytest.mark.parametrize('lang', ['c', 'java', 'python'])
+def test_python_parser_dfg_matches_reference(lang):
+    require_parser(lang)
+    require_reference_rev()
+    from run_parser import parsers
+    from bench_parser import load_reference_dfg
+    assert_same_dfg(parsers[lang][1], load_reference_dfg(reference_rev, lang), parsers[lang][0], load_codes(lang, 500))
+
+
+def test_bench_dfg_several_languages():
+    # every language imports the reference builders of its own
+    require_parser('c')
+    require_reference_rev()
+    bench_parser = os.path.join(root_dir, 'python_parser', 'bench_parser.py')
+    res = subprocess.run([sys.executable, bench_parser, '--bench', 'dfg', '--reference_rev', reference_rev, '--repeat', '1'],
+                         cwd=os.path.join(root_dir, 'python_parser'), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                         universal_newlines=True)
+    assert res.returncode == 0, res.stdout
+    for lang in ['python', 'java', 'c']:
+        assert "dfg %s: %s" % (lang, reference_rev) in res.stdout
+
+
+@pytest.mark.parametrize('task_dir', ['Authorship-Attribution', 'clonedetection'])
+@pytest.mark.parametrize('lang', list(graphcodebert_builders))
+def test_graphcodebert_dfg_matches_reference(task_dir, lang):
+    parser = tree_sitter_parser(task_dir, lang)
+    require_reference_rev()
+    name = graphcodebert_builders[lang]
+    dfg_func = getattr(load_graphcodebert_parser(task_dir), name)
+    ref_func = getattr(load_reference_graphcodebert_parser(task_dir), name)
+    codes = load_codes(lang, 500) if lang in ['python', 'java'] else [snippets[lang]]
+    assert_same_dfg(dfg_func, ref_func, parser, codes)
@@ -0,0 +1,37 @@
+import os
+
+from parser_cache import DataflowCache
+
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_edited_sources_are_not_matched(tmp_path):
+    library = str(tmp_path / 'my-languages.so')
+    source = str(tmp_path / 'DFG_c.py')
+    write(library, 'library')
+    write(source, 'def DFG_c(): pass')
+    cache_dir = str(tmp_path / 'cache')
+
+    def open_cache():
+        # a new process: the build hash is computed again
+        cache = DataflowCache(cache_dir, enabled=True)
+        cache.set_build(library, [source])
+        return cache
+
+    open_cache().put('int x;', 'c', [('x', 1, 'comesFrom', [], [])], {0: ((0, 0), (0, 3))}, ['int', 'x', ';'])
+    assert open_cache().get('int x;', 'c') is not None
+    write(source, 'def DFG_c(): return None')
+    assert open_cache().get('int x;', 'c') is None
+    write(library, 'another library')
+    write(source, 'def DFG_c(): pass')
+    assert open_cache().get('int x;', 'c') is None
+
+
+def test_run_parser_hashes_its_sources():
+    import run_parser
+    sources = [os.path.basename(path) for path in run_parser.dataflow_cache.source_paths]
+    for name in ['run_parser.py', 'DFG_c.py', 'DFG_java.py', 'DFG_python.py', 'utils.py']:
+        assert name in sources
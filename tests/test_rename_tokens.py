@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import load_attacker, load_codes, require_parser
+
+# one subword, many subwords, digits, non-ascii, and whitespace (not spliced)
+substitutes = ['a', 'x1', 'tmp', 'averyLongUnusualName_xyz42', 'ZZqq_09_kk', 'naïve', '_', 'i j', '']
+
+# names at the start of the code, after an opening bracket and after a newline
+snippets = {
+    'c': 'count = 0;\nint f(int count, char *buf) {\n(count)++;\nbuf[count] = count;return count+count; }',
+    'python': 'count = 0\ndef f(count, buf):\n    (count)\ncount += buf[count]\n\treturn count',
+}
+
+
+def rename_block_sizes(segments, tokenizer, normalize):
+    # block sizes that cut the code in front of, inside and after the first
+    # occurrence of the name, and one that keeps the whole code
+    prefix = ' '.join(segments[0].split()) if normalize else segments[0]
+    start = len(tokenizer.tokenize(prefix)) if prefix else 0
+    return [start + 2, start + 3, start + 4, 512]
+
+
+def check_renames(attacker, lang, code, tokenizer, nb_vars):
+    from run_parser import get_identifiers, get_example, get_rename_segments, apply_rename
+    normalize = lang != 'python'
+    variables = [v[0] for v in get_identifiers(code, lang)[0]][:nb_vars]
+    # several renames on the same example: every variable is renamed in the
+    # code where the ones before it were already renamed
+    for index, tgt_word in enumerate(variables):
+        for block_size in rename_block_sizes(get_rename_segments(code, tgt_word, lang), tokenizer, normalize):
+            args = SimpleNamespace(block_size=block_size)
+            features = attacker.convert_renames_to_features(code, tgt_word, substitutes, tokenizer, 1, args)
+            for substitute, feature in zip(substitutes, features):
+                expected = attacker.convert_code_to_features(get_example(code, tgt_word, substitute, lang), tokenizer, 1, args)
+                assert feature.input_tokens == expected.input_tokens, (tgt_word, substitute, block_size)
+                assert feature.input_ids == expected.input_ids, (tgt_word, substitute, block_size)
+        code = apply_rename(code, tgt_word, 'renamed_%d' % index, lang)
+
+
+@pytest.mark.parametrize('task,lang', [('Defect-detection', 'c'), ('Authorship-Attribution', 'python')])
+def test_rename_features_match_retokenized_code(task, lang, tokenizer):
+    require_parser(lang)
+    from utils import RenameTokens, can_splice_bpe
+    from run_parser import get_rename_segments
+    # the splice is what is compared, not the fallback to tokenize
+    assert can_splice_bpe(tokenizer)
+    assert RenameTokens(get_rename_segments(snippets[lang], 'count', lang), tokenizer, 510).splice
+    attacker = load_attacker(task)
+    check_renames(attacker, lang, snippets[lang], tokenizer, 2)
+    for code in load_codes(lang, 20):
+        check_renames(attacker, lang, code, tokenizer, 3)
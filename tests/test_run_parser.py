@@ -0,0 +1,48 @@
+from conftest import load_codes, require_parser
+from run_parser import get_identifiers, get_identifiers_batch, remove_comments_and_docstrings
+
+
+def baseline_identifiers(code, lang):
+    # what get_substitutes.py ran before get_identifiers_batch
+    return get_identifiers(remove_comments_and_docstrings(code, lang), lang)
+
+
+def test_comment_with_escaped_newline_does_not_leak():
+    # Devign item 63: `//printf("pos=%d\n", used_count);` holds a literal \n,
+    # which extract_dataflow unescapes before it strips the comments
+    require_parser('c')
+    code = load_codes('c', 64)[63]
+    result = get_identifiers_batch([code], 'c', num_workers=1, remove_comments=True)[0]
+    assert result == baseline_identifiers(code, 'c')
+    # without the pre-pass, the `"` closing the string of the comment is a token
+    assert get_identifiers(code, 'c')[1] != result[1]
+
+
+def test_get_identifiers_batch_matches_baseline():
+    require_parser('c')
+    codes = load_codes('c', 200)
+    results = get_identifiers_batch(codes, 'c', num_workers=2, chunksize=16, remove_comments=True)
+    for code, result in zip(codes, results):
+        assert result == baseline_identifiers(code, 'c')
+
+
+def test_renamed_leaves_the_cached_tree_intact():
+    # GA and MHM rename the same cached code again and again: every rename
+    # reparses from its tree, which must stay the tree of the original code
+    from run_parser import ParsedCode, get_parsed_code, tree_to_token_index
+
+    def layout(tree):
+        # sexp has no positions, an edited tree only differs in its spans
+        return tree.root_node.sexp(), tree_to_token_index(tree.root_node)
+    for lang in ['c', 'python']:
+        require_parser(lang)
+        for code in load_codes(lang, 50):
+            parsed = get_parsed_code(code, lang)
+            original = layout(parsed.tree)
+            for tgt_word in [x[0] for x in get_identifiers(code, lang)[0]][:2]:
+                for substitute in ['a', tgt_word + '_renamed']:
+                    new = parsed.renamed(tgt_word, substitute)
+                    fresh = ParsedCode('\n'.join(new.lines), lang)
+                    assert new.code_tokens == fresh.code_tokens
+                    assert layout(new.tree) == layout(fresh.tree)
+                    assert layout(parsed.tree) == original
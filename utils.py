@@ -5,100 +5,39 @@ import random
 import sys
 from tqdm import tqdm
 from torch.utils.data.dataset import Dataset
+from torch.utils.data.dataloader import default_collate
 import os
+import time
+import hashlib
 import numpy as np
 import csv
+from collections import OrderedDict
 from python_parser.run_parser import get_example, get_example_batch
+from python_parser.run_parser import (python_keywords, java_keywords, java_special_ids,
+                                      c_keywords, c_macros, c_special_ids, c_ops, special_char,
+                                      is_valid_variable_python, is_valid_variable_java,
+                                      is_valid_variable_c, is_valid_variable_name,
+                                      get_identifier_policy, mhm_uid_policy)
 
-python_keywords = ['import', '', '[', ']', ':', ',', '.', '(', ')', '{', '}', 'not', 'is', '=', "+=", '-=', "<", ">",
-                   '+', '-', '*', '/', 'False', 'None', 'True', 'and', 'as', 'assert', 'async', 'await', 'break',
-                   'class', 'continue', 'def', 'del', 'elif', 'else', 'except', 'finally', 'for', 'from', 'global',
-                   'if', 'import', 'in', 'is', 'lambda', 'nonlocal', 'not', 'or', 'pass', 'raise', 'return', 'try',
-                   'while', 'with', 'yield']
-java_keywords = ["abstract", "assert", "boolean", "break", "byte", "case", "catch", "do", "double", "else", "enum",
-                 "extends", "final", "finally", "float", "for", "goto", "if", "implements", "import", "instanceof",
-                 "int", "interface", "long", "native", "new", "package", "private", "protected", "public", "return",
-                 "short", "static", "strictfp", "super", "switch", "throws", "transient", "try", "void", "volatile",
-                 "while"]
-java_special_ids = ["main", "args", "Math", "System", "Random", "Byte", "Short", "Integer", "Long", "Float", "Double", "Character",
-                    "Boolean", "Data", "ParseException", "SimpleDateFormat", "Calendar", "Object", "String", "StringBuffer",
-                    "StringBuilder", "DateFormat", "Collection", "List", "Map", "Set", "Queue", "ArrayList", "HashSet", "HashMap"]
-c_keywords = ["auto", "break", "case", "char", "const", "continue",
-                 "default", "do", "double", "else", "enum", "extern",
-                 "float", "for", "goto", "if", "inline", "int", "long",
-                 "register", "restrict", "return", "short", "signed",
-                 "sizeof", "static", "struct", "switch", "typedef",
-                 "union", "unsigned", "void", "volatile", "while",
-                 "_Alignas", "_Alignof", "_Atomic", "_Bool", "_Complex",
-                 "_Generic", "_Imaginary", "_Noreturn", "_Static_assert",
-                 "_Thread_local", "__func__"]
-
-c_macros = ["NULL", "_IOFBF", "_IOLBF", "BUFSIZ", "EOF", "FOPEN_MAX", "TMP_MAX",  # <stdio.h> macro
-              "FILENAME_MAX", "L_tmpnam", "SEEK_CUR", "SEEK_END", "SEEK_SET",
-              "NULL", "EXIT_FAILURE", "EXIT_SUCCESS", "RAND_MAX", "MB_CUR_MAX"]     # <stdlib.h> macro
-c_special_ids = ["main",  # main function
-                   "stdio", "cstdio", "stdio.h",                                # <stdio.h> & <cstdio>
-                   "size_t", "FILE", "fpos_t", "stdin", "stdout", "stderr",     # <stdio.h> types & streams
-                   "remove", "rename", "tmpfile", "tmpnam", "fclose", "fflush", # <stdio.h> functions
-                   "fopen", "freopen", "setbuf", "setvbuf", "fprintf", "fscanf",
-                   "printf", "scanf", "snprintf", "sprintf", "sscanf", "vprintf",
-                   "vscanf", "vsnprintf", "vsprintf", "vsscanf", "fgetc", "fgets",
-                   "fputc", "getc", "getchar", "putc", "putchar", "puts", "ungetc",
-                   "fread", "fwrite", "fgetpos", "fseek", "fsetpos", "ftell",
-                   "rewind", "clearerr", "feof", "ferror", "perror", "getline"
-                   "stdlib", "cstdlib", "stdlib.h",                             # <stdlib.h> & <cstdlib>
-                   "size_t", "div_t", "ldiv_t", "lldiv_t",                      # <stdlib.h> types
-                   "atof", "atoi", "atol", "atoll", "strtod", "strtof", "strtold",  # <stdlib.h> functions
-                   "strtol", "strtoll", "strtoul", "strtoull", "rand", "srand",
-                   "aligned_alloc", "calloc", "malloc", "realloc", "free", "abort",
-                   "atexit", "exit", "at_quick_exit", "_Exit", "getenv",
-                   "quick_exit", "system", "bsearch", "qsort", "abs", "labs",
-                   "llabs", "div", "ldiv", "lldiv", "mblen", "mbtowc", "wctomb",
-                   "mbstowcs", "wcstombs",
-                   "string", "cstring", "string.h",                                 # <string.h> & <cstring>
-                   "memcpy", "memmove", "memchr", "memcmp", "memset", "strcat",     # <string.h> functions
-                   "strncat", "strchr", "strrchr", "strcmp", "strncmp", "strcoll",
-                   "strcpy", "strncpy", "strerror", "strlen", "strspn", "strcspn",
-                   "strpbrk" ,"strstr", "strtok", "strxfrm",
-                   "memccpy", "mempcpy", "strcat_s", "strcpy_s", "strdup",      # <string.h> extension functions
-                   "strerror_r", "strlcat", "strlcpy", "strsignal", "strtok_r",
-                   "iostream", "istream", "ostream", "fstream", "sstream",      # <iostream> family
-                   "iomanip", "iosfwd",
-                   "ios", "wios", "streamoff", "streampos", "wstreampos",       # <iostream> types
-                   "streamsize", "cout", "cerr", "clog", "cin",
-                   "boolalpha", "noboolalpha", "skipws", "noskipws", "showbase",    # <iostream> manipulators
-                   "noshowbase", "showpoint", "noshowpoint", "showpos",
-                   "noshowpos", "unitbuf", "nounitbuf", "uppercase", "nouppercase",
-                   "left", "right", "internal", "dec", "oct", "hex", "fixed",
-                   "scientific", "hexfloat", "defaultfloat", "width", "fill",
-                   "precision", "endl", "ends", "flush", "ws", "showpoint",
-                   "sin", "cos", "tan", "asin", "acos", "atan", "atan2", "sinh",    # <math.h> functions
-                   "cosh", "tanh", "exp", "sqrt", "log", "log10", "pow", "powf",
-                   "ceil", "floor", "abs", "fabs", "cabs", "frexp", "ldexp",
-                   "modf", "fmod", "hypot", "ldexp", "poly", "matherr"]
-
-special_char = ['[', ']', ':', ',', '.', '(', ')', '{', '}', 'not', 'is', '=', "+=", '-=', "<", ">", '+', '-', '*', '/',
-                '|']
-
-
-def select_parents(population):
+
+def select_parents(population, rng=random):
     length = range(len(population))
-    index_1 = random.choice(length)
-    index_2 = random.choice(length)
+    index_1 = rng.choice(length)
+    index_2 = rng.choice(length)
     chromesome_1 = population[index_1]
     chromesome_2 = population[index_2]
     return chromesome_1, index_1, chromesome_2, index_2
 
-def mutate(chromesome, variable_substitue_dict):
-    tgt_index = random.choice(range(len(chromesome)))
+def mutate(chromesome, variable_substitue_dict, rng=random):
+    tgt_index = rng.choice(range(len(chromesome)))
     tgt_word = list(chromesome.keys())[tgt_index]
-    chromesome[tgt_word] = random.choice(variable_substitue_dict[tgt_word])
+    chromesome[tgt_word] = rng.choice(variable_substitue_dict[tgt_word])
 
     return chromesome
 
-def crossover(csome_1, csome_2, r=None):
+def crossover(csome_1, csome_2, r=None, rng=random):
     if r is None:
-        r = random.choice(range(len(csome_1))) # 随机选择一个位置.
+        r = rng.choice(range(len(csome_1))) # 随机选择一个位置.
         # 但是不能选到0
 
     child_1 = {}
@@ -122,53 +61,394 @@ def map_chromesome(chromesome: dict, code: str, lang: str) -> str:
 input = ["0ab", "\ndsd", "说啊", "'z'", "for"]
 
 
-from keyword import iskeyword
-def is_valid_variable_python(name: str) -> bool:
-    return name.isidentifier() and not iskeyword(name)
+def is_valid_substitue(substitute: str, tgt_word: str, lang: str) -> bool:
+    '''
+    判断生成的substitues是否valid，如是否满足命名规范
+    '''
+    return is_valid_variable_name(substitute, lang)
 
-def is_valid_variable_java(name: str) -> bool:
-    if not name.isidentifier():
-        return False
-    elif name in java_keywords:
-        return False
-    elif name in java_special_ids:
-        return False
-    return True
 
-def is_valid_variable_c(name: str) -> bool:
+class VocabMask():
+    '''
+    每个(tokenizer, lang)只算一次: vocab里哪些subword能组成lang的合法变量名.
+    word: 去掉首尾空格后单独就是合法变量名
+    start: 可以作为多个subwords组成的变量名的第一个(关键字也可以, 比如for+mat)
+    inner: 可以不带空格接在变量名后面
+    mlm的logits在top-k之前先去掉不合法的subwords, 候选就不会浪费在标点和关键字上.
+    '''
+    NONE, WORD, START, INNER = range(4)
 
-    if not name.isidentifier():
-        return False
-    elif name in c_keywords:
-        return False
-    elif name in c_macros:
-        return False
-    elif name in c_special_ids:
-        return False
-    return True
-
-def is_valid_variable_name(name: str, lang: str) -> bool:
-    # check if matches language keywords
-    if lang == 'python':
-        return is_valid_variable_python(name)
-    elif lang == 'c':
-        return is_valid_variable_c(name)
-    elif lang == 'java':
-        return is_valid_variable_java(name)
-    else:
-        return False
+    def __init__(self):
+        self._masks = {}
+        self._tokenizers = {}
 
+    def _build(self, tokenizer, lang, vocab_size):
+        masks = torch.zeros((4, vocab_size), dtype=torch.bool)
+        masks[self.NONE] = True
+        tokens = tokenizer.convert_ids_to_tokens(list(range(min(len(tokenizer), vocab_size))))
+        special_tokens = set(get_special_tokens(tokenizer))
+        for i, token in enumerate(tokens):
+            if token is None or token in special_tokens:
+                continue
+            text = tokenizer.convert_tokens_to_string([token])
+            name = text.strip()
+            if not name:
+                continue
+            masks[self.WORD, i] = is_valid_variable_name(name, lang)
+            # 后面还要接subwords, 所以结尾不能有空格
+            masks[self.START, i] = name.isidentifier() and not text[-1].isspace()
+            # 比如0ab不能开头但可以接在后面
+            masks[self.INNER, i] = ('a' + text).isidentifier()
+        return masks
 
-def is_valid_substitue(substitute: str, tgt_word: str, lang: str) -> bool:
+    def get(self, tokenizer, lang, vocab_size, device='cpu'):
+        '''
+        (4, vocab_size)的bool tensor, 按NONE/WORD/START/INNER取行
+        '''
+        # the tokenizer is kept alive so that its id is never reused by another one
+        self._tokenizers[id(tokenizer)] = tokenizer
+        key = (id(tokenizer), lang, vocab_size)
+        if key not in self._masks:
+            self._masks[key] = {}
+        masks = self._masks[key]
+        device = str(device)
+        if device not in masks:
+            cpu_masks = masks.get('cpu')
+            if cpu_masks is None:
+                cpu_masks = masks['cpu'] = self._build(tokenizer, lang, vocab_size)
+            masks[device] = cpu_masks.to(device)
+        return masks[device]
+
+    def clear(self):
+        self._masks.clear()
+        self._tokenizers.clear()
+
+
+vocab_mask = VocabMask()
+
+
+def mask_invalid_substitutes(word_predictions, keys, tokenizer, lang):
     '''
-    判断生成的substitues是否valid，如是否满足命名规范
+    word_predictions: mlm对[cls] + sub_words + [sep]的logits, seq-len vocab.
+    keys是_tokenize得到的每个词的subwords范围: 只有一个subword的词只保留WORD,
+    多个subwords的词第一个保留START, 之后的保留INNER; cls/sep和截断的部分不变.
     '''
-    is_valid = True
+    seq_len, vocab_size = word_predictions.size()
+    masks = vocab_mask.get(tokenizer, lang, vocab_size, word_predictions.device)
+    row_kinds = [VocabMask.NONE] * seq_len
+    for start, end in keys:
+        # 第0行是cls
+        if end - start == 1:
+            kinds = [VocabMask.WORD]
+        else:
+            kinds = [VocabMask.START] + [VocabMask.INNER] * (end - start - 1)
+        for row, kind in zip(range(start + 1, min(end + 1, seq_len - 1)), kinds):
+            row_kinds[row] = kind
+    row_kinds = torch.tensor(row_kinds, dtype=torch.long, device=word_predictions.device)
+    return word_predictions.masked_fill(~masks[row_kinds], float('-inf'))
+
+
+class SubwordCache():
+    '''
+    LRU缓存: word -> tokenizer.tokenize(word), 整个进程共用一个.
+    代码里的词重复率很高(int, (, i, return), 所以_tokenize和convert_code_to_features
+    的tokenize大部分都能命中缓存.
+    '''
+    def __init__(self, max_size=200000):
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._tokenizers = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _register(self, tokenizer):
+        # the tokenizer is kept alive so that its id is never reused by another one
+        key = id(tokenizer)
+        if key not in self._tokenizers:
+            self._tokenizers[key] = (tokenizer, get_special_tokens(tokenizer))
+        return key
+
+    def tokenize_word(self, word, tokenizer):
+        key = (self._register(tokenizer), word)
+        sub = self._cache.get(key)
+        if sub is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return list(sub)
+        self.misses += 1
+        sub = tuple(tokenizer.tokenize(word))
+        self._cache[key] = sub
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return list(sub)
 
-    if not is_valid_variable_name(substitute, lang):
-        is_valid = False
+    def tokenize(self, text, tokenizer):
+        '''
+        Same as tokenizer.tokenize(text). For the byte-level BPE tokenizers
+        (RoBERTa/GPT-2) the text is split with the tokenizer's own pattern and
+        every piece goes through the cache; the BPE of a piece does not depend
+        on its neighbours.
+        '''
+        pat = getattr(tokenizer, 'pat', None)
+        if pat is None or getattr(tokenizer, 'add_prefix_space', False):
+            return tokenizer.tokenize(text)
+        _, special_tokens = self._tokenizers[self._register(tokenizer)]
+        if any(t in text for t in special_tokens):
+            return tokenizer.tokenize(text)
+        tokens = []
+        for piece in pat.findall(text):
+            tokens += self.tokenize_word(piece, tokenizer)
+        return tokens
 
-    return is_valid
+    def info(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._cache),
+                'max_size': self.max_size}
+
+    def report(self):
+        info = self.info()
+        return "Subword cache: %d hits, %d misses, hit rate %.2f%%, %d words" % \
+            (info['hits'], info['misses'], 100.0 * info['hit_rate'], info['size'])
+
+    def clear(self):
+        self._cache.clear()
+        self._tokenizers.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+subword_cache = SubwordCache()
+
+
+def cached_tokenize(text, tokenizer):
+    return subword_cache.tokenize(text, tokenizer)
+
+
+# pre-tokenization pattern of the byte-level BPE (GPT-2/RoBERTa) tokenizers
+bpe_pattern = r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
+
+
+def bpe_word_spans(text):
+    '''
+    Split text so that tokenizing every piece on its own gives the same
+    subwords as tokenizing the whole text: a piece of the BPE pattern never
+    crosses a whitespace run, except for the single space in front of a word.
+    Returns the (start, end) offsets of the pieces.
+    '''
+    import regex
+    spans = []
+    pos = 0
+    for m in regex.finditer(r'\S+', text):
+        start = m.start()
+        if start > pos:
+            if start - pos > 1:
+                spans.append((pos, start - 1))
+            if text[start - 1] == ' ':
+                start -= 1
+            else:
+                spans.append((start - 1, start))
+        spans.append((start, m.end()))
+        pos = m.end()
+    if pos < len(text):
+        spans.append((pos, len(text)))
+    return spans
+
+
+def split_bpe_words(text):
+    return [text[start:end] for start, end in bpe_word_spans(text)]
+
+
+def can_splice_bpe(tokenizer):
+    pat = getattr(tokenizer, 'pat', None)
+    return pat is not None and pat.pattern == bpe_pattern and \
+           not getattr(tokenizer, 'add_prefix_space', False)
+
+
+def get_special_tokens(tokenizer):
+    return [t for t in set(tokenizer.all_special_tokens) | set(tokenizer.get_added_vocab()) if t]
+
+
+class RenameTokens():
+    '''
+    convert_code_to_features的tokens和ids, 对同一个变量的所有替换只tokenize一次.
+    segments是变量名两边不变的代码(get_rename_segments), 替换后的代码是
+    substitute.join(segments). 不含变量名的词的subwords是固定的, 每个substitute
+    只需要tokenize含有变量名的那几个词, 再拼接起来.
+    get(substitute)和tokenize(substitute.join(segments))[:max_tokens]的结果完全一样,
+    normalize时代码先经过' '.join(code.split()).
+    '''
+    placeholder = '\0'
+
+    def __init__(self, segments, tokenizer, max_tokens, normalize=True):
+        self.segments = segments
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.normalize = normalize
+        self.splice = can_splice_bpe(tokenizer) and \
+                      not any(self.placeholder in segment for segment in segments)
+        if self.splice:
+            self.special_tokens = get_special_tokens(tokenizer)
+            self.blocks = self._build_blocks()
+
+    def _code(self, substitute):
+        code = substitute.join(self.segments)
+        if self.normalize:
+            code = ' '.join(code.split())
+        return code
+
+    def _build_blocks(self):
+        # runs of fixed words are tokenized here, the words with the
+        # substitute are kept as their parts around it
+        blocks = []
+        for word in split_bpe_words(self._code(self.placeholder)):
+            if self.placeholder in word:
+                blocks.append((False, word.split(self.placeholder), None))
+                continue
+            if any(t in word for t in self.special_tokens):
+                self.splice = False
+                return None
+            if not blocks or not blocks[-1][0]:
+                blocks.append((True, [], []))
+            blocks[-1][1].extend(subword_cache.tokenize_word(word, self.tokenizer))
+        for is_fixed, tokens, ids in blocks:
+            if is_fixed:
+                ids.extend(self.tokenizer.convert_tokens_to_ids(tokens))
+        return blocks
+
+    def _splice(self, substitute):
+        tokens = []
+        ids = []
+        for is_fixed, a, b in self.blocks:
+            if len(tokens) >= self.max_tokens:
+                break
+            if is_fixed:
+                tokens += a
+                ids += b
+                continue
+            word = substitute.join(a)
+            if any(t in word for t in self.special_tokens):
+                return None
+            sub = subword_cache.tokenize_word(word, self.tokenizer)
+            tokens += sub
+            ids += self.tokenizer.convert_tokens_to_ids(sub)
+        return tokens[:self.max_tokens], ids[:self.max_tokens]
+
+    def get(self, substitute):
+        # a substitute with whitespace would change the words around it
+        if self.splice and substitute and not any(c.isspace() for c in substitute):
+            res = self._splice(substitute)
+            if res is not None:
+                return res
+        tokens = cached_tokenize(self._code(substitute), self.tokenizer)[:self.max_tokens]
+        return tokens, self.tokenizer.convert_tokens_to_ids(tokens)
+
+
+class MaskedTokens():
+    '''
+    get_importance_score里每个位置被mask后的代码的tokens和ids, 不用每个位置都
+    重新tokenize整段代码: mask只会改变它和后面一个词的subwords, 其余的subwords
+    直接从原来代码的tokens里切出来.
+    get(pos)和tokenize(' '.join(words[:pos] + [mask_token] + words[pos+1:]))[:max_tokens]
+    的结果完全一样(normalize时先经过' '.join(code.split())), pos为None时是原来的代码,
+    pos为list时这些位置都被mask(按变量计算importance score时用).
+    '''
+    def __init__(self, words, tokenizer, max_tokens, mask_token='<unk>', normalize=False):
+        import regex
+        self.words = words
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.mask_token = mask_token
+        self.normalize = normalize
+
+        # offset of every word in the text, None if it is not a whole run of
+        # non-space characters there
+        text = ' '.join(words)
+        if normalize:
+            text = ' '.join(text.split())
+        self.text = text
+        self.runs = [m.span() for m in regex.finditer(r'\S+', text)]
+        run_index = {start: i for i, (start, _) in enumerate(self.runs)}
+        self.word_runs = []
+        offset = 0
+        nb_runs = 0
+        for word in words:
+            start = offset
+            if normalize:
+                start = self.runs[nb_runs][0] if nb_runs < len(self.runs) else -1
+                nb_runs += len(word.split())
+            else:
+                offset += len(word) + 1
+            i = run_index.get(start)
+            self.word_runs.append(i if i is not None and text[slice(*self.runs[i])] == word else None)
+
+        self.splice = can_splice_bpe(tokenizer) and \
+                      not any(t in text for t in get_special_tokens(tokenizer))
+        if self.splice:
+            self.tokens = []
+            self.token_offsets = {}
+            for start, end in bpe_word_spans(text):
+                self.token_offsets[start] = len(self.tokens)
+                self.tokens += subword_cache.tokenize_word(text[start:end], tokenizer)
+            self.token_offsets[len(text)] = len(self.tokens)
+            self.ids = tokenizer.convert_tokens_to_ids(self.tokens)
+        else:
+            self.tokens = cached_tokenize(text, tokenizer)
+            self.ids = tokenizer.convert_tokens_to_ids(self.tokens)
+
+    def _masked_text(self, pos):
+        if isinstance(pos, list):
+            words = list(self.words)
+            for p in pos:
+                words[p] = self.mask_token
+            code = ' '.join(words)
+        else:
+            code = ' '.join(self.words[:pos] + [self.mask_token] + self.words[pos + 1:])
+        if self.normalize:
+            code = ' '.join(code.split())
+        return code
+
+    def get(self, pos=None):
+        if pos is None:
+            return self.tokens[:self.max_tokens], self.ids[:self.max_tokens]
+        i = self.word_runs[pos] if not isinstance(pos, list) else None
+        if not self.splice or i is None:
+            tokens = cached_tokenize(self._masked_text(pos), self.tokenizer)[:self.max_tokens]
+            return tokens, self.tokenizer.convert_tokens_to_ids(tokens)
+        # the mask is tokenized with the whitespace around it and the next word,
+        # whatever the tokenizer strips next to a special token stays inside
+        start, end = self.runs[i]
+        left = self.runs[i - 1][1] if i > 0 else 0
+        right = self.runs[i + 1][1] if i + 1 < len(self.runs) else len(self.text)
+        left_end = self.token_offsets[left]
+        if left_end >= self.max_tokens:
+            return self.tokens[:self.max_tokens], self.ids[:self.max_tokens]
+        window = subword_cache.tokenize_word(self.text[left:start] + self.mask_token + self.text[end:right], self.tokenizer)
+        right_start = self.token_offsets[right]
+        rest = max(0, self.max_tokens - left_end - len(window))
+        tokens = self.tokens[:left_end] + window + self.tokens[right_start:right_start + rest]
+        ids = self.ids[:left_end] + self.tokenizer.convert_tokens_to_ids(window) + self.ids[right_start:right_start + rest]
+        return tokens[:self.max_tokens], ids[:self.max_tokens]
+
+
+# number of masked codes built and sent to the model at a time
+importance_chunk_size = 256
+
+
+def get_masked_inputs(masked, positions, tokenizer, block_size):
+    '''
+    <s> ids </s> <pad>... of masked.get(pos) for every pos, as a
+    (len(positions), block_size) LongTensor.
+    '''
+    inputs = torch.full((len(positions), block_size), tokenizer.pad_token_id, dtype=torch.long)
+    for row, pos in enumerate(positions):
+        _, ids = masked.get(pos)
+        inputs[row, 0] = tokenizer.cls_token_id
+        inputs[row, 1:len(ids) + 1] = torch.tensor(ids, dtype=torch.long)
+        inputs[row, len(ids) + 1] = tokenizer.sep_token_id
+    return inputs
 
 
 def _tokenize(seq, tokenizer):
@@ -180,7 +460,7 @@ def _tokenize(seq, tokenizer):
     index = 0
     for word in words:
         # 并非直接tokenize这句话，而是tokenize了每个splited words.
-        sub = tokenizer.tokenize(word)
+        sub = subword_cache.tokenize_word(word, tokenizer)
         sub_words += sub
         keys.append([index, index + len(sub)])
         # 将subwords对齐
@@ -189,26 +469,51 @@ def _tokenize(seq, tokenizer):
     return words, sub_words, keys
 
 
+class TokenPositions():
+    '''
+    倒排索引: token -> 它在tokens中的位置(升序), 只扫描一遍tokens.
+    rename会同时修改tokens和索引, 代价是O(出现次数)而不是O(代码长度).
+    '''
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.index = {}
+        for i, token in enumerate(tokens):
+            try:
+                self.index[token].append(i)
+            except KeyError:
+                self.index[token] = [i]
+
+    def get_positions(self, names: list) -> dict:
+        positions = {}
+        for name in names:
+            if name in self.index:
+                positions.setdefault(name, []).extend(self.index[name])
+        return positions
+
+    def rename(self, old_token, new_token):
+        # 和 for i in range(len(tokens)): if tokens[i] == old_token: tokens[i] = new_token 等价
+        if old_token == new_token or old_token not in self.index:
+            return
+        moved = self.index.pop(old_token)
+        for i in moved:
+            self.tokens[i] = new_token
+        if new_token in self.index:
+            self.index[new_token] = sorted(self.index[new_token] + moved)
+        else:
+            self.index[new_token] = moved
+
+
 def get_identifier_posistions_from_code(words_list: list, variable_names: list) -> dict:
     '''
     给定一串代码，以及variable的变量名，如: a
     返回这串代码中这些变量名对应的位置.
     '''
-    positions = {}
-    for name in variable_names:
-        for index, token in enumerate(words_list):
-            if name == token:
-                try:
-                    positions[name].append(index)
-                except:
-                    positions[name] = [index]
-
-    return positions
+    return TokenPositions(words_list).get_positions(variable_names)
 
 
-def get_bpe_substitues(substitutes, tokenizer, mlm_model):
+def get_bpe_candidates(substitutes):
     '''
-    得到substitues
+    一个位置所有可能的BPE组合(最多24个), list of list of token-id
     '''
     # substitutes L, k
 
@@ -227,54 +532,107 @@ def get_bpe_substitues(substitutes, tokenizer, mlm_model):
                 for j in substitutes[i]:
                     lev_i.append(all_sub + [int(j)])
             all_substitutes = lev_i
-    # all substitutes  list of list of token-id (all candidates)
-    c_loss = nn.CrossEntropyLoss(reduction='none')
-    word_list = []
-    # all_substitutes = all_substitutes[:24]
-    all_substitutes = torch.tensor(all_substitutes)  # [ N, L ]
-    all_substitutes = all_substitutes[:24].to('cuda')
     # 不是，这个总共不会超过24... 那之前生成那么多也没用....
-    N, L = all_substitutes.size()
-    word_predictions = mlm_model(all_substitutes)[0]  # N L vocab-size
-    ppl = c_loss(word_predictions.view(N * L, -1), all_substitutes.view(-1))  # [ N*L ]
-    ppl = torch.exp(torch.mean(ppl.view(N, L), dim=-1))  # N
-    _, word_list = torch.sort(ppl)
-    word_list = [all_substitutes[i] for i in word_list]
-    final_words = []
-    for word in word_list:
-        tokens = [tokenizer._convert_id_to_token(int(i)) for i in word]
-        text = tokenizer.convert_tokens_to_string(tokens)
-        final_words.append(text)
-    return final_words
+    return all_substitutes[:24]
+
+
+# number of BPE candidates scored by the mlm model at a time
+bpe_batch_size = 256
+
+
+def get_batch_bpe_substitues(substitutes_list, tokenizer, mlm_model, batch_size=bpe_batch_size):
+    '''
+    substitutes_list里每个位置的get_bpe_substitues. 所有位置的BPE组合pad到一起,
+    一次forward算perplexity(pad的部分不参与attention和loss), 每个位置的顺序不变.
+    '''
+    candidates = [get_bpe_candidates(substitutes) for substitutes in substitutes_list]
+    rows = [candidate for position_candidates in candidates for candidate in position_candidates]
+    # 按长度排序后再分batch, 少pad一些
+    order = sorted(range(len(rows)), key=lambda i: len(rows[i]))
+    device = next(mlm_model.parameters()).device
+    c_loss = nn.CrossEntropyLoss(reduction='none')
+    ppl = torch.zeros(len(rows))
+    for start in range(0, len(order), batch_size):
+        chunk_index = order[start:start + batch_size]
+        chunk = [rows[i] for i in chunk_index]
+        N, L = len(chunk), len(chunk[-1])
+        input_ids = torch.full((N, L), tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((N, L), dtype=torch.long)
+        for i, candidate in enumerate(chunk):
+            input_ids[i, :len(candidate)] = torch.tensor(candidate, dtype=torch.long)
+            attention_mask[i, :len(candidate)] = 1
+        input_ids = input_ids.to(device)
+        attention_mask = attention_mask.to(device)
+        with torch.no_grad():
+            word_predictions = mlm_model(input_ids, attention_mask=attention_mask)[0]  # N L vocab-size
+        loss = c_loss(word_predictions.view(N * L, -1), input_ids.view(-1)).view(N, L)  # [ N, L ]
+        loss = (loss * attention_mask).sum(-1) / attention_mask.sum(-1)
+        ppl[chunk_index] = torch.exp(loss).cpu()  # N
+
+    all_words = []
+    offset = 0
+    for position_candidates in candidates:
+        _, word_list = torch.sort(ppl[offset:offset + len(position_candidates)])
+        offset += len(position_candidates)
+        final_words = []
+        for i in word_list:
+            tokens = [tokenizer._convert_id_to_token(int(j)) for j in position_candidates[i]]
+            text = tokenizer.convert_tokens_to_string(tokens)
+            final_words.append(text)
+        all_words.append(final_words)
+    return all_words
+
+
+def get_bpe_substitues(substitutes, tokenizer, mlm_model):
+    '''
+    得到substitues
+    '''
+    return get_batch_bpe_substitues([substitutes], tokenizer, mlm_model)[0]
 
 
 def get_substitues(substitutes, tokenizer, mlm_model, use_bpe, substitutes_score=None, threshold=3.0):
     '''
     将生成的substitued subwords转化为words
     '''
-    # substitues L,k
-    # from this matrix to recover a word
-    words = []
-    sub_len, k = substitutes.size()  # sub-len, k
+    return get_batch_substitues([substitutes], tokenizer, mlm_model, use_bpe, [substitutes_score], threshold)[0]
 
-    if sub_len == 0:
-        # 比如空格对应的subwords就是[a,a]，长度为0
-        return words
 
-    elif sub_len == 1:
-        # subwords就是本身
-        for (i, j) in zip(substitutes[0], substitutes_score[0]):
-            if threshold != 0 and j < threshold:
-                break
-            words.append(tokenizer._decode([int(i)]))
-            # 将id转为token.
-    else:
-        # word被分解成了多个subwords
-        if use_bpe == 1:
-            words = get_bpe_substitues(substitutes, tokenizer, mlm_model)
+def get_batch_substitues(substitutes_list, tokenizer, mlm_model, use_bpe, substitutes_score_list=None, threshold=3.0):
+    '''
+    substitutes_list里每个位置的get_substitues, 所有被分解成多个subwords的位置
+    一起送进get_batch_bpe_substitues.
+    '''
+    if substitutes_score_list is None:
+        substitutes_score_list = [None] * len(substitutes_list)
+    all_words = [[] for _ in substitutes_list]
+    bpe_indices = []
+    for index, (substitutes, substitutes_score) in enumerate(zip(substitutes_list, substitutes_score_list)):
+        # substitues L,k
+        # from this matrix to recover a word
+        words = all_words[index]
+        sub_len, k = substitutes.size()  # sub-len, k
+
+        if sub_len == 0:
+            # 比如空格对应的subwords就是[a,a]，长度为0
+            continue
+
+        elif sub_len == 1:
+            # subwords就是本身
+            for (i, j) in zip(substitutes[0], substitutes_score[0]):
+                if threshold != 0 and j < threshold:
+                    break
+                words.append(tokenizer._decode([int(i)]))
+                # 将id转为token.
         else:
-            return words
-    return words
+            # word被分解成了多个subwords
+            if use_bpe == 1:
+                bpe_indices.append(index)
+
+    if len(bpe_indices) > 0:
+        bpe_words = get_batch_bpe_substitues([substitutes_list[index] for index in bpe_indices], tokenizer, mlm_model)
+        for index, words in zip(bpe_indices, bpe_words):
+            all_words[index] = words
+    return all_words
 
 
 def get_masked_code_by_position(tokens: list, positions: dict):
@@ -296,6 +654,25 @@ def get_masked_code_by_position(tokens: list, positions: dict):
     
     return masked_token_list, replace_token_positions
 
+def get_masked_code_by_variable(tokens: list, positions: dict):
+    '''
+    给定一段文本，以及每个变量出现的位置,每个变量返回一个masked后的text(所有出现的位置都被mask)
+    Example:
+        tokens: [a,b,a]
+        positions: {a: [0,2], b: [1]}
+        Return:
+            [<mask>, b, <mask>]
+            [a, <mask>, a]
+    '''
+    masked_token_list = []
+    for variable_name in positions.keys():
+        masked_tokens = list(tokens)
+        for pos in positions[variable_name]:
+            masked_tokens[pos] = '<unk>'
+        masked_token_list.append(masked_tokens)
+
+    return masked_token_list
+
 def build_vocab(codes, limit=5000):
     
     vocab_cnt = {"<str>": 0, "<char>": 0, "<int>": 0, "<fp>": 0}
@@ -350,63 +727,11 @@ def getTensor(batch, batchfirst=False):
     inputs = inputs.permute([1, 0])
     return inputs, labels
 
-__key_words__ = ["auto", "break", "case", "char", "const", "continue",
-                 "default", "do", "double", "else", "enum", "extern",
-                 "float", "for", "goto", "if", "inline", "int", "long",
-                 "register", "restrict", "return", "short", "signed",
-                 "sizeof", "static", "struct", "switch", "typedef",
-                 "union", "unsigned", "void", "volatile", "while",
-                 "_Alignas", "_Alignof", "_Atomic", "_Bool", "_Complex",
-                 "_Generic", "_Imaginary", "_Noreturn", "_Static_assert",
-                 "_Thread_local", "__func__"]
-__ops__ = ["...", ">>=", "<<=", "+=", "-=", "*=", "/=", "%=", "&=", "^=", "|=",
-           ">>", "<<", "++", "--", "->", "&&", "||", "<=", ">=", "==", "!=", ";",
-           "{", "<%", "}", "%>", ",", ":", "=", "(", ")", "[", "<:", "]", ":>",
-           ".", "&", "!", "~", "-", "+", "*", "/", "%", "<", ">", "^", "|", "?"]
-__macros__ = ["NULL", "_IOFBF", "_IOLBF", "BUFSIZ", "EOF", "FOPEN_MAX", "TMP_MAX",  # <stdio.h> macro
-              "FILENAME_MAX", "L_tmpnam", "SEEK_CUR", "SEEK_END", "SEEK_SET",
-              "NULL", "EXIT_FAILURE", "EXIT_SUCCESS", "RAND_MAX", "MB_CUR_MAX"]     # <stdlib.h> macro
-__special_ids__ = ["main",  # main function
-                   "stdio", "cstdio", "stdio.h",                                # <stdio.h> & <cstdio>
-                   "size_t", "FILE", "fpos_t", "stdin", "stdout", "stderr",     # <stdio.h> types & streams
-                   "remove", "rename", "tmpfile", "tmpnam", "fclose", "fflush", # <stdio.h> functions
-                   "fopen", "freopen", "setbuf", "setvbuf", "fprintf", "fscanf",
-                   "printf", "scanf", "snprintf", "sprintf", "sscanf", "vprintf",
-                   "vscanf", "vsnprintf", "vsprintf", "vsscanf", "fgetc", "fgets",
-                   "fputc", "getc", "getchar", "putc", "putchar", "puts", "ungetc",
-                   "fread", "fwrite", "fgetpos", "fseek", "fsetpos", "ftell",
-                   "rewind", "clearerr", "feof", "ferror", "perror", "getline"
-                   "stdlib", "cstdlib", "stdlib.h",                             # <stdlib.h> & <cstdlib>
-                   "size_t", "div_t", "ldiv_t", "lldiv_t",                      # <stdlib.h> types
-                   "atof", "atoi", "atol", "atoll", "strtod", "strtof", "strtold",  # <stdlib.h> functions
-                   "strtol", "strtoll", "strtoul", "strtoull", "rand", "srand",
-                   "aligned_alloc", "calloc", "malloc", "realloc", "free", "abort",
-                   "atexit", "exit", "at_quick_exit", "_Exit", "getenv",
-                   "quick_exit", "system", "bsearch", "qsort", "abs", "labs",
-                   "llabs", "div", "ldiv", "lldiv", "mblen", "mbtowc", "wctomb",
-                   "mbstowcs", "wcstombs",
-                   "string", "cstring", "string.h",                                 # <string.h> & <cstring>
-                   "memcpy", "memmove", "memchr", "memcmp", "memset", "strcat",     # <string.h> functions
-                   "strncat", "strchr", "strrchr", "strcmp", "strncmp", "strcoll",
-                   "strcpy", "strncpy", "strerror", "strlen", "strspn", "strcspn",
-                   "strpbrk" ,"strstr", "strtok", "strxfrm",
-                   "memccpy", "mempcpy", "strcat_s", "strcpy_s", "strdup",      # <string.h> extension functions
-                   "strerror_r", "strlcat", "strlcpy", "strsignal", "strtok_r",
-                   "iostream", "istream", "ostream", "fstream", "sstream",      # <iostream> family
-                   "iomanip", "iosfwd",
-                   "ios", "wios", "streamoff", "streampos", "wstreampos",       # <iostream> types
-                   "streamsize", "cout", "cerr", "clog", "cin",
-                   "boolalpha", "noboolalpha", "skipws", "noskipws", "showbase",    # <iostream> manipulators
-                   "noshowbase", "showpoint", "noshowpoint", "showpos",
-                   "noshowpos", "unitbuf", "nounitbuf", "uppercase", "nouppercase",
-                   "left", "right", "internal", "dec", "oct", "hex", "fixed",
-                   "scientific", "hexfloat", "defaultfloat", "width", "fill",
-                   "precision", "endl", "ends", "flush", "ws", "showpoint",
-                   "sin", "cos", "tan", "asin", "acos", "atan", "atan2", "sinh",    # <math.h> functions
-                   "cosh", "tanh", "exp", "sqrt", "log", "log10", "pow", "powf",
-                   "ceil", "floor", "abs", "fabs", "cabs", "frexp", "ldexp",
-                   "modf", "fmod", "hypot", "ldexp", "poly", "matherr"]
-                   
+__key_words__ = c_keywords
+__ops__ = c_ops
+__macros__ = c_macros
+__special_ids__ = c_special_ids
+
 __parser__ = None
 
 def tokens2seq(_tokens):
@@ -484,32 +809,8 @@ def isUID(_text=""):
     Return if a token is a UID.
     '''
     
-    _text = _text.strip()
-    if _text == '':
-        return False
+    return mhm_uid_policy.is_valid(_text)
 
-    if " " in _text or "\n" in _text or "\r" in _text:
-        return False
-    elif _text in __key_words__:
-        return False
-    elif _text in __ops__:
-        return False
-    elif _text in __macros__:
-        return False
-    elif _text in __special_ids__:
-        return False
-    elif _text[0].lower() in "0123456789":
-        return False
-    elif "'" in _text or '"' in _text:
-        return False
-    elif _text[0].lower() in "abcdefghijklmnopqrstuvwxyz_":
-        for _c in _text[1:-1]:
-            if _c.lower() not in "0123456789abcdefghijklmnopqrstuvwxyz_":
-                return False
-    else:
-        return False
-    return True
-    
 def getUID(_tokens=[], uids=[]):
     
     '''
@@ -517,12 +818,10 @@ def getUID(_tokens=[], uids=[]):
     '''
     
     ids = {}
-    for i, t in enumerate(_tokens):
-        if isUID(t) and t in uids[0].keys():
-            if t in ids.keys():
-                ids[t].append(i)
-            else:
-                ids[t] = [i]
+    # isUID is only checked once per distinct token
+    for t, positions in TokenPositions(_tokens).index.items():
+        if t in uids[0] and isUID(t):
+            ids[t] = positions
     return ids
     
 
@@ -537,41 +836,288 @@ class CodeDataset(Dataset):
     def __getitem__(self, i):       
         return torch.tensor(self.examples[i].input_ids),torch.tensor(self.examples[i].label)
 
+def get_graph_attn_index(input_ids, position_idx, dfg_to_code, dfg_to_dfg):
+    '''
+    GraphCodeBERT的graph-guided attention mask里和长度无关的部分:
+    (node_index, max_length, 特殊token的位置, 边的rows, 边的cols).
+    每个example只需要算一次, 之后用get_graph_attn_mask_from_index展开.
+    '''
+    input_ids = np.fromiter(input_ids, dtype=np.int64, count=len(input_ids))
+    position_idx = np.fromiter(position_idx, dtype=np.int64, count=len(position_idx))
+    #calculate begin index of node and max length of input
+    node_index = int((position_idx > 1).sum())
+    max_length = int((position_idx != 1).sum())
+    #special tokens attend to all tokens
+    special = np.nonzero((input_ids == 0) | (input_ids == 2))[0]
+    #nodes attend to code tokens that are identified from
+    spans = np.asarray(dfg_to_code, dtype=np.int64).reshape(-1, 2)
+    nodes = np.arange(len(spans)) + node_index
+    valid = (spans[:, 0] < node_index) & (spans[:, 1] < node_index) & (spans[:, 1] > spans[:, 0])
+    spans, nodes = spans[valid], nodes[valid]
+    lengths = spans[:, 1] - spans[:, 0]
+    span_nodes = np.repeat(nodes, lengths)
+    # a, a+1, ..., b-1 of every span
+    span_tokens = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths - spans[:, 0], lengths)
+    #nodes attend to adjacent nodes
+    lengths = np.fromiter((len(x) for x in dfg_to_dfg), dtype=np.int64, count=len(dfg_to_dfg))
+    dfg_rows = np.repeat(np.arange(len(dfg_to_dfg)), lengths) + node_index
+    dfg_cols = np.fromiter((a for x in dfg_to_dfg for a in x), dtype=np.int64, count=int(lengths.sum())) + node_index
+    valid = dfg_cols < len(position_idx)
+    rows = np.concatenate([span_nodes, span_tokens, dfg_rows[valid]])
+    cols = np.concatenate([span_tokens, span_nodes, dfg_cols[valid]])
+    return node_index, max_length, special, rows, cols
+
+
+def get_graph_attn_mask_from_index(attn_index, length):
+    '''
+    get_graph_attn_index的结果展开成(length, length)的bool矩阵.
+    '''
+    node_index, max_length, special, rows, cols = attn_index
+    attn_mask = np.zeros((length, length), dtype=bool)
+    #sequence can attend to sequence
+    attn_mask[:node_index, :node_index] = True
+    attn_mask[special, :max_length] = True
+    attn_mask[rows, cols] = True
+    return attn_mask
+
+
+def get_graph_attn_mask(input_ids, position_idx, dfg_to_code, dfg_to_dfg, length):
+    '''
+    GraphCodeBERT的graph-guided attention mask, (length, length)的bool矩阵.
+    用numpy的fancy indexing构造, 和逐个token/节点循环的结果完全一样.
+    '''
+    return get_graph_attn_mask_from_index(get_graph_attn_index(input_ids, position_idx, dfg_to_code, dfg_to_dfg), length)
+
+
+def collate_graph_attn_index(attn_indexes):
+    '''
+    一个batch的get_graph_attn_index拼成compact graph: (sizes, special, edges)
+        sizes: (batch, 2), 每个example的node_index和max_length
+        special: (S, 2), 特殊token的(example, 位置)
+        edges: (E, 3), 边的(example, row, col)
+    比(batch, length, length)的mask小得多, 在model的device上再用expand_graph_attn_mask展开.
+    '''
+    sizes = torch.tensor([[x[0], x[1]] for x in attn_indexes], dtype=torch.long)
+    special = np.concatenate([np.stack([np.full(len(x[2]), b), x[2]], 1) for b, x in enumerate(attn_indexes)])
+    edges = np.concatenate([np.stack([np.full(len(x[3]), b), x[3], x[4]], 1) for b, x in enumerate(attn_indexes)])
+    return (sizes,
+            torch.from_numpy(special.astype(np.int64)).view(-1, 2),
+            torch.from_numpy(edges.astype(np.int64)).view(-1, 3))
+
+
+def expand_graph_attn_mask(graph, length):
+    '''
+    collate_graph_attn_index的compact graph展开成(batch, length, length)的attention mask,
+    在graph所在的device上用index操作完成, 和get_graph_attn_mask的结果一样.
+    '''
+    sizes, special, edges = graph
+    positions = torch.arange(length, device=sizes.device)
+    #sequence can attend to sequence
+    in_sequence = positions[None, :] < sizes[:, 0:1]
+    attn_mask = in_sequence[:, :, None] & in_sequence[:, None, :]
+    #special tokens attend to all tokens
+    in_input = positions[None, :] < sizes[:, 1:2]
+    attn_mask[special[:, 0], special[:, 1]] = in_input[special[:, 0]]
+    #nodes attend to code tokens and adjacent nodes
+    attn_mask[edges[:, 0], edges[:, 1], edges[:, 2]] = True
+    return attn_mask
+
+
+def collate_graph_batch(batch):
+    '''
+    DataLoader的collate_fn: GraphCodeDataset/CodePairDataset返回的get_graph_attn_index
+    拼成compact graph, 其余的和default_collate一样.
+    '''
+    fields = []
+    for values in zip(*batch):
+        if isinstance(values[0], tuple):
+            fields.append(collate_graph_attn_index(values))
+        else:
+            fields.append(default_collate(values))
+    return fields
+
+
+def graph_batch_to(value, device):
+    '''tensor或者compact graph放到device上'''
+    if isinstance(value, tuple):
+        return tuple(x.to(device) for x in value)
+    return value.to(device)
+
+
+def input_length(item, pad_token_id=1):
+    '''CodeBERT样本(input_ids, label)里非padding token的个数'''
+    return int(item[0].ne(pad_token_id).sum())
+
+
+def graph_input_length(item):
+    '''GraphCodeDataset/CodePairDataset样本里最长的输入(get_graph_attn_index的max_length)'''
+    return max(value[1] for value in item if isinstance(value, tuple))
+
+
+def trim_padding(input_ids, pad_token_id=1):
+    '''
+    一个batch的input_ids在最后一维上裁到最长的非padding长度.
+    RoBERTa的attention_mask是input_ids.ne(pad), position ids也跳过padding,
+    所以裁掉的padding不改变输出, 只省掉它们的计算.
+    '''
+    not_pad = input_ids.ne(pad_token_id).reshape(-1, input_ids.size(-1)).any(0).nonzero()
+    length = int(not_pad.max()) + 1 if len(not_pad) else 1
+    return input_ids[..., :length]
+
+
+def graph_padding_length(attn_mask, position_idx):
+    '''
+    GraphCodeBERT的一个batch不含padding的长度. padding(position_idx为1)都在最后,
+    除了dfg_to_dfg指到padding上的边以外没有位置attend到它们, 这些边用到的位置也算进来.
+    '''
+    length = int(position_idx.ne(1).sum(-1).max())
+    if isinstance(attn_mask, tuple):
+        edges = attn_mask[2]
+        if len(edges):
+            length = max(length, int(edges[:, 1:].max()) + 1)
+        return length
+    used = (attn_mask.any(1) | attn_mask.any(2)).nonzero()
+    if len(used):
+        length = max(length, int(used[:, 1].max()) + 1)
+    return length
+
+
+def trim_graph_padding(inputs_ids, attn_mask, position_idx, length=None):
+    '''
+    GraphCodeBERT的一个batch裁到length, 默认是graph_padding_length.
+    attn_mask是compact graph时在expand_graph_attn_mask里按裁剪后的长度展开.
+    '''
+    if length is None:
+        length = graph_padding_length(attn_mask, position_idx)
+    if not isinstance(attn_mask, tuple):
+        attn_mask = attn_mask[:, :length, :length]
+    return inputs_ids[:, :length], attn_mask, position_idx[:, :length]
+
+
+def prediction_key(item):
+    '''
+    get_results的一个样本 -> 预测缓存的key: 除了最后的label, 所有字段
+    (input_ids, position_idx, compact graph ...)的sha1. label不影响模型的输出.
+    '''
+    h = hashlib.sha1()
+    for value in item[:-1]:
+        for x in (value if isinstance(value, tuple) else (value,)):
+            x = x.cpu().numpy() if torch.is_tensor(x) else np.asarray(x)
+            h.update(("%s%s" % (x.dtype, x.shape)).encode('utf8'))
+            h.update(np.ascontiguousarray(x).tobytes())
+    return h.digest()
+
+
+class PredictionCache():
+    '''
+    LRU缓存: prediction_key(样本) -> 模型对它的输出(float32), 每个Model一个.
+    GA的crossover/mutate和MHM经常生成已经预测过的代码, 这些样本不用再过一遍encoder.
+    key里没有模型参数, 所以Model.train()和load_state_dict会clear.
+    '''
+    def __init__(self, max_size=1 << 16):
+        self.max_size = max_size
+        self._cache = OrderedDict()
+
+    def get(self, key):
+        output = self._cache.get(key)
+        if output is not None:
+            self._cache.move_to_end(key)
+        return output
+
+    def put(self, key, output):
+        if self.max_size <= 0:
+            return
+        self._cache[key] = output
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        self._cache.clear()
+
+
+class BatchPredictor():
+    '''
+    Model.get_results用的batches: 按顺序在当前进程里collate并放到device上,
+    和DataLoader(SequentialSampler)给出的batches一样.
+    get_results一次通常只有1~30个样本, 每次调用都fork 4个worker进程比预测本身还慢.
+    predict只把缓存里没有的样本送进模型: queries是get_results收到的样本数,
+    forwards是真正过了encoder的样本数.
+    给了length_fn(样本 -> 非padding长度)时, 超过一个batch的样本先按长度排序再分batch,
+    长度相近的在同一个batch里, 裁掉padding(trim_padding/trim_graph_padding)后省得更多.
+    cache_size默认是0(不缓存), 只有攻击脚本通过--prediction_cache_size打开.
+    '''
+    def __init__(self, collate_fn=default_collate, device=None, cache_size=0, length_fn=None):
+        self.collate_fn = collate_fn
+        self.device = device
+        self.length_fn = length_fn
+        self.cache = PredictionCache(cache_size)
+        self.queries = 0
+        self.forwards = 0
+
+    def batches(self, dataset, batch_size, device=None):
+        # device: 一般是模型所在的device, 没给就用self.device
+        device = self.device if device is None else device
+        for start in range(0, len(dataset), batch_size):
+            batch = self.collate_fn([dataset[i] for i in range(start, min(start + batch_size, len(dataset)))])
+            yield [graph_batch_to(value, device) for value in batch]
+
+    def predict(self, dataset, batch_size, predict_batch, device=None):
+        '''
+        dataset里每个样本的模型输出, 按dataset的顺序stack成一个numpy array.
+        predict_batch: batches给出的一个batch -> 这个batch的输出(float32 numpy).
+        缓存里有的, 以及同一次调用里重复的样本都不再forward.
+        '''
+        items = [dataset[i] for i in range(len(dataset))]
+        keys = [prediction_key(item) for item in items]
+        outputs = {}
+        misses = []
+        for i, key in enumerate(keys):
+            if key in outputs:
+                continue
+            outputs[key] = self.cache.get(key)
+            if outputs[key] is None:
+                misses.append(i)
+        if self.length_fn is not None and len(misses) > batch_size:
+            # 长的在前, 显存不够的话第一个batch就会报错
+            misses.sort(key=lambda i: self.length_fn(items[i]), reverse=True)
+        if misses:
+            miss_outputs = np.concatenate([predict_batch(batch) for batch in
+                                           self.batches([items[i] for i in misses], batch_size, device)], 0)
+            for i, output in zip(misses, miss_outputs):
+                outputs[keys[i]] = output
+                self.cache.put(keys[i], output)
+        self.queries += len(keys)
+        self.forwards += len(misses)
+        return np.stack([outputs[key] for key in keys])
+
+    def report(self):
+        return "Prediction cache: %d queries, %d forwards (%.2f%% cached), %d entries" % \
+            (self.queries, self.forwards, 100.0 * (1 - self.forwards / self.queries) if self.queries else 0.0,
+            len(self.cache))
+
+
+def model_device(model):
+    return next(model.parameters()).device
+
+
 class GraphCodeDataset(Dataset):
     def __init__(self, examples, args):
         self.examples = examples
         self.args=args
+        #the graph of every example is indexed once, not on every access
+        self.attn_index=[get_graph_attn_index(x.input_ids, x.position_idx, x.dfg_to_code, x.dfg_to_dfg) for x in examples]
     
     def __len__(self):
         return len(self.examples)
 
     def __getitem__(self, item):
-        #calculate graph-guided masked function
-        attn_mask=np.zeros((self.args.code_length+self.args.data_flow_length,
-                            self.args.code_length+self.args.data_flow_length),dtype=np.bool)
-        #calculate begin index of node and max length of input
-        
-        node_index=sum([i>1 for i in self.examples[item].position_idx])
-        max_length=sum([i!=1 for i in self.examples[item].position_idx])
-        #sequence can attend to sequence
-        attn_mask[:node_index,:node_index]=True
-        #special tokens attend to all tokens
-        for idx,i in enumerate(self.examples[item].input_ids):
-            if i in [0,2]:
-                attn_mask[idx,:max_length]=True
-        #nodes attend to code tokens that are identified from
-        for idx,(a,b) in enumerate(self.examples[item].dfg_to_code):
-            if a<node_index and b<node_index:
-                attn_mask[idx+node_index,a:b]=True
-                attn_mask[a:b,idx+node_index]=True
-        #nodes attend to adjacent nodes 
-        for idx,nodes in enumerate(self.examples[item].dfg_to_dfg):
-            for a in nodes:
-                if a+node_index<len(self.examples[item].position_idx):
-                    attn_mask[idx+node_index,a+node_index]=True
-              
+        #graph-guided masked function, expanded on the device of the model
+        #(collate_graph_batch, expand_graph_attn_mask)
         return (torch.tensor(self.examples[item].input_ids),
-              torch.tensor(attn_mask),
+              self.attn_index[item],
               torch.tensor(self.examples[item].position_idx),
               torch.tensor(self.examples[item].label))
 
@@ -579,63 +1125,22 @@ class CodePairDataset(Dataset):
     def __init__(self, examples, args):
         self.examples = examples
         self.args=args
+        #the graphs of every example are indexed once, not on every access
+        self.attn_index_1=[get_graph_attn_index(x.input_ids_1, x.position_idx_1, x.dfg_to_code_1, x.dfg_to_dfg_1) for x in examples]
+        self.attn_index_2=[get_graph_attn_index(x.input_ids_2, x.position_idx_2, x.dfg_to_code_2, x.dfg_to_dfg_2) for x in examples]
     
     def __len__(self):
         return len(self.examples)
 
     def __getitem__(self, item):
-        #calculate graph-guided masked function
-        attn_mask_1= np.zeros((self.args.code_length+self.args.data_flow_length,
-                        self.args.code_length+self.args.data_flow_length),dtype=np.bool)
-        #calculate begin index of node and max length of input
-        node_index=sum([i>1 for i in self.examples[item].position_idx_1])
-        max_length=sum([i!=1 for i in self.examples[item].position_idx_1])
-        #sequence can attend to sequence
-        attn_mask_1[:node_index,:node_index]=True
-        #special tokens attend to all tokens
-        for idx,i in enumerate(self.examples[item].input_ids_1):
-            if i in [0,2]:
-                attn_mask_1[idx,:max_length]=True
-        #nodes attend to code tokens that are identified from
-        for idx,(a,b) in enumerate(self.examples[item].dfg_to_code_1):
-            if a<node_index and b<node_index:
-                attn_mask_1[idx+node_index,a:b]=True
-                attn_mask_1[a:b,idx+node_index]=True
-        #nodes attend to adjacent nodes 
-        for idx,nodes in enumerate(self.examples[item].dfg_to_dfg_1):
-            for a in nodes:
-                if a+node_index<len(self.examples[item].position_idx_1):
-                    attn_mask_1[idx+node_index,a+node_index]=True  
-                    
-        #calculate graph-guided masked function
-        attn_mask_2= np.zeros((self.args.code_length+self.args.data_flow_length,
-                        self.args.code_length+self.args.data_flow_length),dtype=np.bool)
-        #calculate begin index of node and max length of input
-        node_index=sum([i>1 for i in self.examples[item].position_idx_2])
-        max_length=sum([i!=1 for i in self.examples[item].position_idx_2])
-        #sequence can attend to sequence
-        attn_mask_2[:node_index,:node_index]=True
-        #special tokens attend to all tokens
-        for idx,i in enumerate(self.examples[item].input_ids_2):
-            if i in [0,2]:
-                attn_mask_2[idx,:max_length]=True
-        #nodes attend to code tokens that are identified from
-        for idx,(a,b) in enumerate(self.examples[item].dfg_to_code_2):
-            if a<node_index and b<node_index:
-                attn_mask_2[idx+node_index,a:b]=True
-                attn_mask_2[a:b,idx+node_index]=True
-        #nodes attend to adjacent nodes 
-        for idx,nodes in enumerate(self.examples[item].dfg_to_dfg_2):
-            for a in nodes:
-                if a+node_index<len(self.examples[item].position_idx_2):
-                    attn_mask_2[idx+node_index,a+node_index]=True                      
-                    
+        #graph-guided masked functions, expanded on the device of the model
+        #(collate_graph_batch, expand_graph_attn_mask)
         return (torch.tensor(self.examples[item].input_ids_1),
                 torch.tensor(self.examples[item].position_idx_1),
-                torch.tensor(attn_mask_1), 
+                self.attn_index_1[item], 
                 torch.tensor(self.examples[item].input_ids_2),
                 torch.tensor(self.examples[item].position_idx_2),
-                torch.tensor(attn_mask_2),                 
+                self.attn_index_2[item],                 
                 torch.tensor(self.examples[item].label))
 
 def set_seed(seed=42):
@@ -647,6 +1152,164 @@ def set_seed(seed=42):
     torch.backends.cudnn.deterministic = True
 
 
+dtypes = {'float32': torch.float32, 'float16': torch.float16, 'bfloat16': torch.bfloat16}
+
+
+def add_device_args(parser):
+    '''
+    攻击脚本和get_substitutes.py共用的device/dtype/线程数参数, 和setup_device一起用.
+    --prediction_cache_size只有攻击脚本的目标模型(Model)会用到, run.py没有这个参数, 不缓存.
+    '''
+    parser.add_argument("--device", default="cuda", type=str,
+                        help="Device of the target and MLM models, e.g. cuda, cuda:1 or cpu.")
+    parser.add_argument("--dtype", default="float32", type=str, choices=list(dtypes.keys()),
+                        help="Floating point type of the model weights. bfloat16 is the one to use on CPU.")
+    parser.add_argument("--num_threads", default=0, type=int,
+                        help="torch intra-op threads of this process. Default: the available cores divided by --num_shards.")
+    parser.add_argument("--num_interop_threads", default=0, type=int,
+                        help="torch inter-op threads of this process. Default: 1 when --num_shards > 1, else torch's default.")
+    parser.add_argument("--num_shards", default=1, type=int,
+                        help="Number of attack processes sharing this host, the cores are split between them.")
+    parser.add_argument("--prediction_cache_size", default=1 << 16, type=int,
+                        help="Number of predictions of the target model kept in memory, 0 turns the cache off.")
+    return parser
+
+
+def setup_device(args):
+    '''
+    把args.device/args.dtype换成torch的对象, 并设置torch的线程数.
+    同一台CPU机器上跑num_shards个进程时, 每个进程只用cores/num_shards个线程,
+    inter-op只用1个, 不会互相抢核. 要在模型forward之前调用.
+    '''
+    num_interop_threads = args.num_interop_threads
+    if num_interop_threads <= 0 and args.num_shards > 1:
+        num_interop_threads = 1
+    if num_interop_threads > 0:
+        torch.set_num_interop_threads(num_interop_threads)
+    num_threads = args.num_threads
+    if num_threads <= 0 and args.num_shards > 1:
+        # the cores this process may run on (taskset/cgroups), not all the cores of the host
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+        num_threads = max(1, cores // args.num_shards)
+    if num_threads > 0:
+        torch.set_num_threads(num_threads)
+    args.device = torch.device(args.device)
+    args.dtype = dtypes[args.dtype]
+    return args.device, args.dtype
+
+
+
+def run_attack_steps(steps, model, batch_size):
+    '''
+    按顺序跑完一个attack的step generator, 返回generator的返回值.
+    攻击方法(compute_fitness, get_importance_score, greedy_attack_steps, mcmc_steps等)
+    都写成step generator: 要预测的样本(一个dataset)yield给调用者, 调用者把
+    model.get_results的结果(probs, preds)send回来. 这里每个请求直接交给model.get_results,
+    AttackScheduler则把几个example的请求一起预测.
+    '''
+    try:
+        request = next(steps)
+        while True:
+            request = steps.send(model.get_results(request, batch_size))
+    except StopIteration as e:
+        return e.value
+
+
+def count_queries(steps):
+    '''
+    在step generator里yield from count_queries(steps):
+    返回(steps的返回值, steps请求预测的样本数).
+    '''
+    nb_queries = 0
+    try:
+        request = next(steps)
+        while True:
+            nb_queries += len(request)
+            request = steps.send((yield request))
+    except StopIteration as e:
+        return e.value, nb_queries
+
+
+def example_rng(seed, index):
+    '''
+    每个example自己的随机数生成器, 只由seed和index决定.
+    几个example交替进行时(AttackScheduler), GA/MHM的随机选择和一个一个跑完全一样.
+    '''
+    return random.Random("%d:%d" % (seed, index))
+
+
+class AttackScheduler():
+    '''
+    同时攻击最多concurrency个example: 每一轮把所有example等待中的预测请求拼起来,
+    只调用一次model.get_results, 这样每个batch都是满的, 再把结果分给各自的generator.
+    jobs里每个都是一个example的step generator(见run_attack_steps).
+    run按jobs的顺序给出(generator的返回值, 这个example的query次数, 用时(秒)).
+    用时只算这个example自己的steps, 加上每一轮预测时间里它的样本所占的份额,
+    不是几个example交替进行的墙上时间.
+    前面的example还没结束时, 最多有concurrency个结果在等它, 之后不再开始新的example.
+    '''
+    def __init__(self, model, batch_size, concurrency=1):
+        self.model = model
+        self.batch_size = batch_size
+        self.concurrency = max(1, concurrency)
+
+    def _advance(self, job, response=None):
+        # job: [steps, request, nb_queries, seconds]; 结束时返回True
+        start = time.time()
+        try:
+            job[1] = next(job[0]) if response is None else job[0].send(response)
+        except StopIteration as e:
+            job[1] = e.value
+            return True
+        finally:
+            job[3] += time.time() - start
+        job[2] += len(job[1])
+        return False
+
+    def run(self, jobs):
+        jobs = iter(jobs)
+        active = OrderedDict()
+        finished = {}
+        nb_started = 0
+        nb_done = 0
+        exhausted = False
+        while True:
+            while not exhausted and len(active) < self.concurrency and len(finished) < self.concurrency:
+                try:
+                    steps = next(jobs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                job = [steps, None, 0, 0.0]
+                if self._advance(job):
+                    finished[nb_started] = tuple(job[1:])
+                else:
+                    active[nb_started] = job
+                nb_started += 1
+            while nb_done in finished:
+                yield finished.pop(nb_done)
+                nb_done += 1
+            if not active:
+                if exhausted:
+                    return
+                continue
+            items = []
+            sizes = []
+            for job in active.values():
+                items.extend(job[1][i] for i in range(len(job[1])))
+                sizes.append(len(job[1]))
+            start_time = time.time()
+            probs, preds = self.model.get_results(items, self.batch_size) if items else ([], [])
+            predict_time = time.time() - start_time
+            start = 0
+            for (job_id, job), size in zip(list(active.items()), sizes):
+                response = (probs[start:start + size], preds[start:start + size])
+                start += size
+                job[3] += predict_time * size / len(items) if items else 0.0
+                if self._advance(job, response):
+                    del active[job_id]
+                    finished[job_id] = tuple(job[1:])
+
 
 class Recorder():
     def __init__(self, file_path: str) -> None: